@@ -0,0 +1,46 @@
+import hashlib
+import math
+import threading
+
+
+class BloomFilter:
+    """
+    Simple Bloom filter over strings. `key in bloom` can give false positives
+    (at roughly `error_rate` once `capacity` keys are added) but never false negatives.
+    Adds are serialized by a lock, so ingest threads can share one filter.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+        self._lock = threading.Lock()
+
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+
+    def _set_bits(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self._set_bits(key)
+
+
+    def add_many(self, keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._set_bits(key)
+
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
@@ -0,0 +1,94 @@
+from sqlalchemy import select, update, or_, case
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from typing import List, Optional
+import logging
+
+from app.database import SessionLocal
+from app.rule_store import RuleSet, rule_store
+import app.models as models
+
+
+RECATEGORIZE_BATCH_SIZE = 5000
+
+
+def map_receiver(receiver: str, rule_set: RuleSet = None) -> str:
+    rule_set = rule_set or rule_store.current()
+    return rule_set.matcher.match(receiver) or receiver
+
+
+def changed_patterns(old_rule_set: RuleSet, new_rule_set: RuleSet) -> List[str]:
+    """
+    Returns the patterns whose rows can get a different mapped_category after
+    moving from old_rule_set to new_rule_set: patterns of categories that were
+    changed, added or removed, or whose resolved label changed.
+    """
+    old_labels, new_labels = old_rule_set.matcher.labels, new_rule_set.matcher.labels
+    patterns = set()
+
+    for category in set(old_rule_set.rules) | set(new_rule_set.rules):
+        old_patterns = old_rule_set.rules.get(category, [])
+        new_patterns = new_rule_set.rules.get(category, [])
+
+        if old_patterns != new_patterns or old_labels.get(category) != new_labels.get(category):
+            patterns.update(old_patterns)
+            patterns.update(new_patterns)
+
+    return sorted(patterns)
+
+
+def recategorize_transactions(db: Session, rule_set: RuleSet, patterns: Optional[List[str]] = None) -> int:
+    """
+    Recomputes mapped_category for transactions whose receiver contains one of
+    `patterns` (all transactions when patterns is None). The new categories are
+    set by one UPDATE with a CASE on receiver, one statement per
+    RECATEGORIZE_BATCH_SIZE receivers to bound the number of bind parameters.
+    Returns the number of distinct receivers that were re-mapped.
+    """
+    transactions = models.Transaction.__table__
+
+    receivers_query = select(transactions.c.receiver).distinct()
+    if patterns is not None:
+        if not patterns:
+            return 0
+        receivers_query = receivers_query.where(
+            or_(*[transactions.c.receiver.contains(pattern, autoescape=True) for pattern in patterns])
+        )
+
+    receivers = db.execute(receivers_query).scalars().all()
+    if not receivers:
+        return 0
+
+    for start in range(0, len(receivers), RECATEGORIZE_BATCH_SIZE):
+        batch = receivers[start:start + RECATEGORIZE_BATCH_SIZE]
+        mapped_category = case(
+            {receiver: map_receiver(receiver, rule_set) for receiver in batch},
+            value=transactions.c.receiver
+        )
+        stmt = (
+            update(transactions)
+            .where(transactions.c.receiver.in_(batch))
+            .where(transactions.c.mapped_category.is_distinct_from(mapped_category))
+            .values(mapped_category=mapped_category)
+        )
+        db.execute(stmt)
+
+    db.commit()
+
+    logging.info(f"mapped_category recomputed for {len(receivers)} receivers (rules version {rule_set.version})")
+    return len(receivers)
+
+
+def recategorize_in_background(patterns: Optional[List[str]] = None) -> None:
+    """
+    Background task entry point, it opens its own session because the request
+    session is already closed when the task runs.
+    """
+    db = SessionLocal()
+    try:
+        recategorize_transactions(db, rule_store.current(), patterns)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"Recategorize job failed: {str(e)}")
+    finally:
+        db.close()
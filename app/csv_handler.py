@@ -1,12 +1,40 @@
+import numpy as np
 import pandas as pd
-import json
 import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from io import BytesIO
+from time import perf_counter
+from typing import List, Union
+
+from app.rule_store import rule_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+
+CHUNK_SIZE = 5000
+CSV_ENGINES = ('c', 'pyarrow')
+DEFAULT_CSV_ENGINE = os.environ.get('CSV_ENGINE', 'c')
+# pyarrow reads in byte blocks, a statement line is ~200 bytes
+ARROW_BYTES_PER_ROW = 200
+AMOUNT_PATTERN = r'^([+-]?)(\d+)(?:[.,](\d{1,2}))?$'
+STATEMENT_POOL_WORKERS = min(8, os.cpu_count() or 1)
+
+_statement_pool = None
+_statement_pool_lock = threading.Lock()
 
 
 class CSVHandler:
 
-    dict_of_rules = {}
-
     columns_to_keep = [
             'Data księgowania',
             'Nadawca / Odbiorca',
@@ -28,32 +56,22 @@ class CSVHandler:
 
         self._load_rules()
         self.df = df
+        self.timings = {}
+        self.rows_processed = 0
+        # ref_numbers of the statement seen so far, a repeated one is dropped in whichever chunk it falls
+        self._seen_ref_numbers = set()
+        self.duplicates_dropped = 0
         
         
         
         
     def _load_rules(self):
-        try:
-            with open('rules_dict.json', 'r') as file:
-                CSVHandler.dict_of_rules = json.load(file)
-        except FileNotFoundError as e:
-            logging.error(f" File not found: {str(e)}")
-
-        except json.JSONDecodeError as e:
-            logging.error(f" Error while decoding JSON: {str(e)}")
-
-        except Exception as e:
-            logging.error(f" Unexpected error loading rules: {str(e)}")
-
-    def save_rules(self):
-        try:
-            with open('rules_dict.json', 'w') as file:
-                json.dump(CSVHandler.dict_of_rules, file)
-                print(f'INFO: Rule JSON file saved succesfully')
-        except IOError as e:
-            logging.error(f"File I/O error: {str(e)}")
-        except Exception as e:
-            logging.error(f"Unexpected error saving rules: {str(e)}")
+        """
+        Takes the current snapshot of the shared rule store. The snapshot never
+        changes, so the handler sees one consistent rule set for its lifetime.
+        """
+        self.rule_set = rule_store.current()
+        self.dict_of_rules = self.rule_set.rules
 
 
     def load_csv(self):
@@ -66,6 +84,87 @@ class CSVHandler:
             return self.df
 
 
+    @contextmanager
+    def _stage(self, name):
+        """
+        Adds the time spent in a pipeline stage to self.timings (seconds, summed over chunks).
+        """
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + perf_counter() - started
+
+
+    def _read_chunks(self, file_obj, chunksize, engine):
+        """
+        Raw chunk reader. 'c' is the pandas C parser with object columns, 'pyarrow'
+        is the multithreaded Arrow reader: only the kept columns are converted, all
+        of them as Arrow strings, and the chunks are Arrow-backed DataFrames.
+        """
+        if engine not in CSV_ENGINES:
+            raise ValueError(f"Unknown CSV engine: {engine}, expected one of {CSV_ENGINES}")
+
+        if engine == 'c':
+            return pd.read_csv(file_obj, delimiter=';', chunksize=chunksize, encoding='utf-8', dtype={'Kwota operacji': str})
+
+        if pa is None:
+            raise ValueError("CSV engine 'pyarrow' requires the pyarrow package")
+
+        try:
+            reader = pa_csv.open_csv(
+                file_obj,
+                read_options=pa_csv.ReadOptions(block_size=chunksize * ARROW_BYTES_PER_ROW, use_threads=True),
+                parse_options=pa_csv.ParseOptions(delimiter=';'),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=self.columns_to_keep,
+                    column_types={column: pa.string() for column in self.columns_to_keep}
+                )
+            )
+        except KeyError as e:
+            logging.error(f"Missing columns in Dataframe: {str(e)}")
+            raise ValueError("Missing columns in Dataframe")
+
+        return (batch.to_pandas(types_mapper=pd.ArrowDtype) for batch in reader if batch.num_rows)
+
+
+    def iter_chunks(self, file_obj, chunksize=CHUNK_SIZE, engine=DEFAULT_CSV_ENGINE):
+        """
+        Streams a statement from a binary file object in chunks of `chunksize` rows
+        and yields every chunk after the full pipeline, so only one chunk is held in
+        memory at a time. Stages: read -> select_columns -> rename -> parse_dates ->
+        parse_amounts -> check_ref_numbers (drops repeated ref_numbers, counted in
+        duplicates_dropped) -> map_categories. Every column is parsed
+        once into its final dtype: date is datetime64, amount is int64 grosze.
+        With engine='pyarrow' the text columns stay Arrow strings.
+        """
+        reader = self._read_chunks(file_obj, chunksize, engine)
+
+        while True:
+            with self._stage('read'):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+
+            logging.debug(f'Processing chunk with {len(chunk)} rows')
+
+            new_df = self.create_df_for_db(chunk)
+            if new_df is None:
+                raise ValueError("Error processing DataFrame in create_df_for_db")
+
+            new_df = self.rename_columns(new_df)
+            if new_df is None:
+                raise ValueError("Error processing DataFrame in rename_columns")
+            if new_df.empty:
+                continue
+
+            with self._stage('map_categories'):
+                new_df['mapped_category'] = self.rule_set.matcher.categorize(new_df['receiver'])
+
+            self.rows_processed += len(new_df)
+            yield new_df
+
+
     def _check_missing_columns(self, df, columns):
         """
         Private helper method to check for missing columns in a DataFrame.
@@ -90,10 +189,12 @@ class CSVHandler:
 
     def create_df_for_db(self, base_df):
         try:
-            base_df.fillna("", inplace=True)
-            self._check_missing_columns(df=base_df, columns=self.columns_to_keep)
+            with self._stage('select_columns'):
+                self._check_missing_columns(df=base_df, columns=self.columns_to_keep)
 
-            new_df = base_df[self.columns_to_keep].copy()
+                new_df = base_df[self.columns_to_keep].copy()
+                text_columns = [column for column in self.columns_to_keep if column not in ('Data księgowania', 'Kwota operacji')]
+                new_df[text_columns] = new_df[text_columns].fillna("")
             
             logging.debug("New DataFrame after selecting columns:")
             logging.debug(f'{new_df.head()}')
@@ -107,17 +208,11 @@ class CSVHandler:
     def rename_columns(self, last_df):
         try:
             logging.info("RENAME COLUMNS FUNCTION")
-            self._check_missing_columns(df=last_df, columns=self.columns_to_keep)
-
-            columns_dict = dict(zip(self.columns_to_keep, self.new_column_names))
-            last_df.rename(columns=columns_dict, inplace=True)
-            
-            last_df['date'] = pd.to_datetime(last_df['date'], format='%d.%m.%Y', errors='coerce')
-            last_df['exec_month'] = last_df['date'].dt.strftime('%Y-%m')
+            with self._stage('rename'):
+                self._check_missing_columns(df=last_df, columns=self.columns_to_keep)
 
-            if last_df['exec_month'].isna().any():
-                logging.warning(f'Some "exec_month" values could not be parsed and are set to NaT.')
-                last_df['exec_month'] = last_df['exec_month'].fillna('Unknown')
+                columns_dict = dict(zip(self.columns_to_keep, self.new_column_names))
+                last_df.rename(columns=columns_dict, inplace=True)
             
             last_df = self.clean_and_format_df(last_df)
 
@@ -127,29 +222,104 @@ class CSVHandler:
         
         return last_df
     
-    
-    def clean_and_format_df(self, last_df):
-        try:
 
-            last_df.loc[:, 'date'] = pd.to_datetime(last_df['date'], format='%d.%m.%Y', errors='coerce')
+    def _parse_dates(self, last_df):
+        """
+        date -> datetime64 (dd.mm.YYYY, NaT when invalid), exec_month -> 'YYYY-MM'.
+        Statements repeat the same few dates, so each distinct date is parsed once
+        and each distinct month is formatted once.
+        """
+        if isinstance(last_df['date'].dtype, pd.ArrowDtype):
+            dates = pc.strptime(last_df['date'].array._pa_array, format='%d.%m.%Y', unit='s', error_is_null=True)
+            last_df['date'] = pd.Series(pd.arrays.ArrowExtensionArray(dates), index=last_df.index).astype('datetime64[ns]')
 
-            last_df['date'] = last_df['date'].astype('datetime64[ns]')
+        elif not pd.api.types.is_datetime64_any_dtype(last_df['date']):
+            codes, dates = pd.factorize(last_df['date'])
+            parsed = pd.DatetimeIndex(pd.to_datetime(dates, format='%d.%m.%Y', errors='coerce'))
+            last_df['date'] = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
 
-            if last_df['date'].isna().any():
-                logging.warning("Some dates could not be converted and are set to NaT")
+        if last_df['date'].isna().any():
+            logging.warning("Some dates could not be converted and are set to NaT")
 
-            
-            last_df['date'] = last_df['date'].fillna(pd.NaT).dt.strftime('%Y-%m-%d')
+        codes, months = pd.factorize(last_df['date'].dt.to_period('M'))
+        month_labels = np.append(months.strftime('%Y-%m').to_numpy(dtype=object), 'Unknown')
+        last_df['exec_month'] = month_labels[codes]
+
+
+    def _parse_amounts(self, last_df):
+        """
+        amount -> exact int64 grosze. Text like '-1 000,50' is split into sign, złote
+        and grosze without going through float, once per distinct amount.
+        """
+        if pd.api.types.is_numeric_dtype(last_df['amount']):
+            last_df['amount'] = (last_df['amount'] * 100).round().astype('int64')
+            return
+
+        if isinstance(last_df['amount'].dtype, pd.ArrowDtype) and self._parse_arrow_amounts(last_df):
+            return
+
+        codes, amounts = pd.factorize(last_df['amount'].astype(str))
+        parts = pd.Series(amounts).str.replace(' ', '', regex=False).str.replace('\xa0', '', regex=False).str.extract(AMOUNT_PATTERN)
+
+        invalid = parts[1].isna()
+        if invalid.any():
+            raise ValueError(f"The column amount contains invalid values: {amounts[invalid.to_numpy()]}")
+
+        zlote = parts[1].astype('int64').to_numpy()
+        grosze = parts[2].fillna('0').str.ljust(2, '0').astype('int64').to_numpy()
+        sign = np.where(parts[0] == '-', -1, 1)
+
+        last_df['amount'] = (sign * (zlote * 100 + grosze))[codes]
+
+
+    def _parse_arrow_amounts(self, last_df):
+        """
+        Same parse as _parse_amounts done with Arrow compute kernels through an
+        exact decimal cast. Returns False when some value does not match
+        AMOUNT_PATTERN, the caller then reports it.
+        """
+        amounts = last_df['amount'].array._pa_array
+        amounts = pc.replace_substring(pc.replace_substring(amounts, ' ', ''), '\xa0', '')
+
+        if not pc.all(pc.match_substring_regex(amounts, AMOUNT_PATTERN)).as_py():
+            return False
+
+        decimals = pc.cast(pc.replace_substring(amounts, ',', '.'), pa.decimal128(18, 2))
+        grosze = pc.cast(pc.multiply(decimals, pa.scalar(100, pa.decimal128(3, 0))), pa.int64())
+        last_df['amount'] = grosze.to_numpy()
+        return True
+
+    
+    def _drop_duplicate_ref_numbers(self, last_df):
+        """
+        Keeps the first row of every ref_number of the statement and drops the
+        repeats with a warning, the same whether they fall in one chunk or in
+        different ones, so the result does not depend on the chunk size.
+        """
+        ref_numbers = last_df['ref_number']
+        seen = self._seen_ref_numbers
+        duplicated = ref_numbers.duplicated().to_numpy() | np.fromiter((ref in seen for ref in ref_numbers), dtype=bool, count=len(ref_numbers))
+        seen.update(ref_numbers)
+
+        if duplicated.any():
+            duplicate_values = ref_numbers[duplicated].unique()
+            logging.warning(f"Dropped {int(duplicated.sum())} rows with duplicate ref_number values: {duplicate_values}")
+            self.duplicates_dropped += int(duplicated.sum())
+            last_df = last_df.loc[~duplicated].copy()
+
+        return last_df
 
-            last_df['amount'] = last_df['amount'].str.replace(',', '.').str.replace(' ', '').astype(float)
 
-            last_df['exec_month'] = last_df['exec_month'].astype(str)
+    def clean_and_format_df(self, last_df):
+        try:
+            with self._stage('parse_dates'):
+                self._parse_dates(last_df)
 
+            with self._stage('parse_amounts'):
+                self._parse_amounts(last_df)
 
-            if not last_df['ref_number'].is_unique:
-                duplicate_values = last_df['ref_number'][last_df['ref_number'].duplicated()].unique()
-                logging.error(f"Duplicate ref_number values found: {duplicate_values}")
-                raise ValueError(f"The column ref_number contains duplicate values: {duplicate_values}")
+            with self._stage('check_ref_numbers'):
+                last_df = self._drop_duplicate_ref_numbers(last_df)
 
             return last_df
         
@@ -163,35 +333,88 @@ class CSVHandler:
 
 
     def remove_dupl(self, df):
-        print(f'Printing dict of rules: {CSVHandler.dict_of_rules}')
-        for category, patterns in CSVHandler.dict_of_rules.items():
-            df['receiver'] = df['receiver'].apply(
-                lambda x: (print(f"Replacing '{x}' with '{category}'") or  category) if any (pattern in x for pattern in patterns) else x
-            )
+        if 'receiver' not in df:
+            logging.warning("remove_dupl called without 'receiver' column, nothing to replace")
+            return df
+
+        df['receiver'] = self.rule_set.matcher.categorize(df['receiver'])
         return df
     
     def add_rule(self, rule_key, rule_value):
         try:
-            if not isinstance(rule_value, str):
-                raise ValueError(f"Rule value must be a string. Got  {type(rule_value).__name__} instead")
-            CSVHandler.dict_of_rules.setdefault(rule_key, []).append(rule_value)
-            self.save_rules()
+            self.rule_set = rule_store.add_rule(rule_key, rule_value)
+            self.dict_of_rules = self.rule_set.rules
             logging.info(f"New rule added: {rule_key} -> {rule_value}")
         
         except Exception as e:
             logging.error(f"Error while adding new rule: {str(e)}")
-            raise 
-            
-        
-        
-       
-
-
-
-
+            raise
 
 
+def parse_statement(content: bytes, engine: str = DEFAULT_CSV_ENGINE) -> pd.DataFrame:
+    """
+    Runs the full CSVHandler pipeline on one statement. Module level so it can
+    be sent to the statement process pool.
+    """
+    handler = CSVHandler()
+    chunks = list(handler.iter_chunks(BytesIO(content), engine=engine))
 
+    if not chunks:
+        raise ValueError("Statement does not contain any rows")
 
+    return pd.concat(chunks, ignore_index=True)
 
 
+def get_statement_pool() -> ProcessPoolExecutor:
+    """
+    Lazily created process pool shared by the multi statement import. Uses
+    spawn so the workers do not inherit locks held by server threads.
+    """
+    global _statement_pool
+    with _statement_pool_lock:
+        if _statement_pool is None:
+            _statement_pool = ProcessPoolExecutor(
+                max_workers=STATEMENT_POOL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _statement_pool
+
+
+def _discard_statement_pool(pool: ProcessPoolExecutor) -> None:
+    """
+    Drops a broken pool so the next get_statement_pool starts a new one. Another
+    request may already have replaced it, only the broken pool itself is dropped.
+    """
+    global _statement_pool
+    with _statement_pool_lock:
+        if _statement_pool is pool:
+            _statement_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _result_or_error(future):
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return e
+
+
+def parse_statements(contents: List[bytes], engine: str = DEFAULT_CSV_ENGINE) -> List[Union[pd.DataFrame, Exception]]:
+    """
+    Parses the statements in the statement pool, returns per statement its
+    DataFrame or the exception it raised. A worker crash (OOM, a crash in the C
+    parser) breaks the whole pool: it is replaced and the statements resubmitted
+    once, BrokenProcessPool is raised when that fails too.
+    """
+    for attempt in (1, 2):
+        pool = get_statement_pool()
+        try:
+            futures = [pool.submit(parse_statement, content, engine) for content in contents]
+            return [_result_or_error(future) for future in futures]
+        except BrokenProcessPool:
+            logging.error(f"Statement pool broken by a crashed worker (attempt {attempt}), replacing it")
+            _discard_statement_pool(pool)
+            if attempt == 2:
+                raise
@@ -0,0 +1,138 @@
+"""
+Per-table data versions of this process. Every committed session that wrote to a
+table bumps its version, so caches can key their entries on the versions of the
+tables they read and never serve data older than the last commit.
+
+Versions live in process memory: with several uvicorn workers a write handled by
+one worker does not bump the versions seen by the others. SharedVersionStore
+keeps a copy in a DB table, bumped in the writing transaction itself, for
+consumers that must agree across workers (the HTTP ETags).
+"""
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+import threading
+
+
+_versions: Dict[str, int] = {}
+_lock = threading.Lock()
+_listeners: List[Callable[[Tuple[str, ...]], None]] = []
+
+PENDING_KEY = 'data_versions_pending'
+
+
+class SharedVersionStore:
+    """
+    Per-table versions in a (table_name, version) DB table, seen by every worker
+    process. Bumped with the tables a session wrote right before it commits, in
+    the same transaction, so a version never moves without its data.
+    """
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+
+    def versions(self, *tables: str) -> Tuple[int, ...]:
+        with self.engine.connect() as connection:
+            stored = dict(connection.execute(
+                select(self.table.c.table_name, self.table.c.version).where(self.table.c.table_name.in_(tables))
+            ).all())
+        return tuple(stored.get(table, 0) for table in tables)
+
+    def bump(self, connection, tables: Iterable[str]) -> None:
+        insert = sqlite_insert if connection.dialect.name == 'sqlite' else pg_insert
+        stmt = insert(self.table).values([{"table_name": table, "version": 1} for table in sorted(tables)])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['table_name'],
+            set_={"version": self.table.c.version + 1}
+        ))
+
+
+_shared_store: Optional[SharedVersionStore] = None
+
+
+def share_versions(store: Optional[SharedVersionStore]) -> None:
+    """
+    Makes every committing session also bump `store`, None stops it.
+    """
+    global _shared_store
+    _shared_store = store
+
+
+def version(table: str) -> int:
+    return _versions.get(table, 0)
+
+
+def versions(*tables: str) -> Tuple[int, ...]:
+    return tuple(_versions.get(table, 0) for table in tables)
+
+
+def on_bump(listener: Callable[[Tuple[str, ...]], None]) -> None:
+    """
+    Registers a callback called with the bumped table names after every bump.
+    """
+    _listeners.append(listener)
+
+
+def bump(*tables: str) -> None:
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+    logging.debug(f"Data versions bumped: {tables}")
+
+    for listener in _listeners:
+        listener(tables)
+
+
+def mark_written(session: Session, *tables: str) -> None:
+    """
+    Records tables written by the session, they are bumped once it commits.
+    """
+    session.info.setdefault(PENDING_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    objects = [*session.new, *session.dirty, *session.deleted]
+    mark_written(session, *{obj.__table__.name for obj in objects if hasattr(obj, '__table__')})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_execute(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+
+    table = getattr(orm_execute_state.statement, 'table', None)
+    name = getattr(table, 'name', None)
+    if name is None and orm_execute_state.bind_mapper is not None:
+        name = orm_execute_state.bind_mapper.local_table.name
+
+    if name:
+        mark_written(orm_execute_state.session, name)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_shared(session):
+    if _shared_store is None:
+        return
+
+    # commit flushes after this hook, flush first so the pending tables are complete
+    session.flush()
+    pending = session.info.get(PENDING_KEY)
+    if pending:
+        _shared_store.bump(session.connection(), pending)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        bump(*pending)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_on_rollback(session):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,68 @@
+"""
+Fast path for large list responses: Core row tuples of the columns of the
+response schema, encoded straight to JSON bytes with orjson. Rows come from
+typed DB columns, so they are trusted and not validated one by one through the
+response_model, which stays on the route for the OpenAPI docs.
+"""
+from fastapi import Response
+from sqlalchemy.engine import Result
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+from decimal import Decimal
+from typing import Any, Dict, List, Type
+
+import orjson
+from pydantic import BaseModel
+
+
+def _default(value):
+    # Numeric columns are float fields in the schemas
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response rendered by orjson. Bytes are sent as they are, so an already
+    encoded (e.g. cached) body is not encoded twice.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def schema_columns(model, schema: Type[BaseModel]) -> List:
+    """
+    Columns of `model` named like the fields of `schema`, in field order.
+    """
+    table = model.__table__
+    return [table.c[name] for name in schema.model_fields if name in table.c]
+
+
+def rows_to_dicts(result: Result) -> List[Dict[str, Any]]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+async def query_json(db: AsyncSession, query: Select) -> bytes:
+    """
+    Result of a Core SELECT as a JSON array of objects.
+    """
+    return dumps(rows_to_dicts(await db.execute(query)))
+
+
+def json_response(content: Any, response: Response) -> FastJSONResponse:
+    """
+    FastJSONResponse carrying the headers dependencies set on the injected
+    `response` (e.g. the ETag), FastAPI only merges them into responses it builds.
+    """
+    headers = {name: value for name, value in response.headers.items() if name not in ('content-length', 'content-type')}
+    return FastJSONResponse(content, headers=headers)
@@ -0,0 +1,90 @@
+"""
+Conditional GET for read endpoints (HTTP_ETAGS=1, the default). The ETag is
+built from the versions of the tables the endpoint reads, so it changes with
+every committed write to them, and a matching If-None-Match is answered with
+304 Not Modified before the endpoint runs.
+
+Where the versions come from (HTTP_ETAG_VERSIONS):
+- process: the in-process counters of app.data_versions, prefixed with the boot
+  id. No DB access at all, but only correct while this process handles every
+  write, i.e. a single uvicorn worker.
+- shared: the data_versions table, seen by all workers. Every conditional GET
+  costs one primary key lookup, and every committing write transaction one
+  extra INSERT ... ON CONFLICT DO UPDATE of its tables' version rows, which
+  also serializes concurrent writers to the same table on that row until commit.
+- auto (default): process when this is the only API process, shared when it is
+  one of several uvicorn workers (spawned with --workers or WEB_CONCURRENCY > 1).
+  Under another process manager (e.g. gunicorn) set shared explicitly.
+"""
+from fastapi import Depends, HTTPException, Request, Response, status
+import multiprocessing
+import os
+import uuid
+
+from app import data_versions
+from app.data_versions import SharedVersionStore
+from app.database import engine
+import app.models as models
+
+
+HTTP_ETAGS = os.environ.get("HTTP_ETAGS", "1") == "1"
+ETAG_VERSION_SOURCES = ('auto', 'process', 'shared')
+
+# Changes on every start, so process versions counted by an earlier process never match
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def etag_versions_source(setting: str = None) -> str:
+    """
+    Resolves HTTP_ETAG_VERSIONS to 'process' or 'shared'.
+    """
+    setting = setting or os.environ.get("HTTP_ETAG_VERSIONS", "auto")
+    if setting not in ETAG_VERSION_SOURCES:
+        raise ValueError(f"Unknown HTTP_ETAG_VERSIONS: {setting}, expected one of {ETAG_VERSION_SOURCES}")
+    if setting != 'auto':
+        return setting
+
+    # uvicorn --workers spawns the workers with multiprocessing, WEB_CONCURRENCY is its env equivalent
+    workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+    single_process = workers <= 1 and multiprocessing.parent_process() is None
+    return 'process' if single_process else 'shared'
+
+
+ETAG_VERSIONS = etag_versions_source()
+
+shared_versions = SharedVersionStore(engine, models.DataVersion.__table__)
+if HTTP_ETAGS and ETAG_VERSIONS == 'shared':
+    data_versions.share_versions(shared_versions)
+
+
+def current_etag(*tables: str, store: SharedVersionStore = None) -> str:
+    if store is None and ETAG_VERSIONS == 'process':
+        versions = ".".join(str(version) for version in data_versions.versions(*tables))
+        return f'W/"{BOOT_ID}-{versions}"'
+
+    store = store or shared_versions
+    return f'W/"{".".join(str(version) for version in store.versions(*tables))}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def etag_for(*tables: str):
+    """
+    Route dependency: adds the ETag of `tables` to the response and raises 304
+    when the client already has it.
+    """
+    def check_etag(request: Request, response: Response) -> None:
+        if not HTTP_ETAGS:
+            return
+
+        etag = current_etag(*tables)
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and etag_matches(if_none_match, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+
+    return Depends(check_etag)
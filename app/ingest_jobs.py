@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime
+from time import perf_counter
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+from app.csv_handler import CSVHandler
+from app.database import SessionLocal
+from app.transaction_service import TransactionService
+
+
+JOB_WORKERS = int(os.environ.get("INGEST_JOB_WORKERS", 2))
+MAX_JOBS = 200
+
+
+def new_job(filename: str, bytes_total: int) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "status": "queued",
+        "filename": filename,
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "bytes_total": bytes_total,
+        "progress": 0.0,
+        "rows_parsed": 0,
+        "inserted": 0,
+        "skipped": 0,
+        "timings": {"parse": 0.0, "insert": 0.0, "total": 0.0},
+        "errors": []
+    }
+
+
+class InMemoryJobStore:
+    """
+    Job registry living in the API process. Only the last MAX_JOBS jobs are kept.
+    """
+
+    def __init__(self) -> None:
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = json.loads(json.dumps(job))
+            while len(self._jobs) > MAX_JOBS:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return json.loads(json.dumps(job)) if job else None
+
+
+class SQLiteJobStore:
+    """
+    Job registry kept in a local SQLite file, so every uvicorn worker sees the
+    same jobs without an external broker.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS ingest_jobs (id TEXT PRIMARY KEY, created_at TEXT, data TEXT)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def save(self, job: dict) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingest_jobs (id, created_at, data) VALUES (?, ?, ?)",
+                (job["id"], job["created_at"], json.dumps(job))
+            )
+            conn.execute(
+                "DELETE FROM ingest_jobs WHERE id NOT IN (SELECT id FROM ingest_jobs ORDER BY created_at DESC LIMIT ?)",
+                (MAX_JOBS,)
+            )
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+def create_job_store():
+    path = os.environ.get("INGEST_JOB_STORE")
+    return SQLiteJobStore(path) if path else InMemoryJobStore()
+
+
+job_store = create_job_store()
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ingest")
+
+
+def run_ingest_job(job: dict, path: str) -> None:
+    """
+    Streams the spooled statement through CSVHandler.iter_chunks and ingests
+    every chunk, updating the job after each one.
+    """
+    db = SessionLocal()
+    started = perf_counter()
+    job["status"] = "running"
+    job_store.save(job)
+
+    try:
+        handler = CSVHandler()
+        transaction_service = TransactionService(db)
+
+        with open(path, 'rb') as file:
+            chunks = handler.iter_chunks(file)
+
+            while True:
+                stage_start = perf_counter()
+                chunk_df = next(chunks, None)
+                job["timings"]["parse"] += perf_counter() - stage_start
+
+                if chunk_df is None:
+                    break
+
+                stage_start = perf_counter()
+                result = transaction_service.ingest_transactions(chunk_df)
+                job["timings"]["insert"] += perf_counter() - stage_start
+
+                job["rows_parsed"] += len(chunk_df)
+                job["inserted"] += result["inserted"]
+                job["skipped"] += result["skipped"]
+                job["progress"] = round(file.tell() / job["bytes_total"], 4) if job["bytes_total"] else 1.0
+                job_store.save(job)
+
+        # Repeated ref_numbers of the file were dropped by the parser
+        job["skipped"] += handler.duplicates_dropped
+        job["status"] = "finished"
+        job["progress"] = 1.0
+
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Ingest job {job['id']} failed: {str(e)}")
+        job["status"] = "failed"
+        job["errors"].append(str(e))
+
+    finally:
+        db.close()
+        os.unlink(path)
+        job["timings"]["total"] = perf_counter() - started
+        job["finished_at"] = datetime.now().isoformat()
+        job_store.save(job)
+
+
+def submit_ingest_job(filename: str, path: str) -> dict:
+    job = new_job(filename, os.path.getsize(path))
+    job_store.save(job)
+    queued_job = job_store.get(job["id"])
+
+    _job_pool.submit(run_ingest_job, job, path)
+    logging.info(f"Ingest job {job['id']} queued for {filename}")
+    return queued_job
@@ -0,0 +1,92 @@
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, List, Sequence
+import csv
+import io
+import json
+
+import app.models as models
+
+
+TEXT_EXPORT_BATCH_SIZE = 1000
+
+# Tables of the full ledger export: transactions, wallet snapshots and the portfolio summary
+LEDGER_MODELS = {
+    'transactions': models.Transaction,
+    'etoro': models.Etoro,
+    'xtb': models.Xtb,
+    'vienna': models.Vienna,
+    'revolut': models.Revolut,
+    'obligacje': models.Obligacje,
+    'generali': models.Generali,
+    'nokia': models.Nokia,
+    'portfolio': models.PortfolioSummary,
+}
+
+
+def ledger_query(table_name: str) -> Select:
+    """
+    Core SELECT of a ledger table in (date, id) order. Raises ValueError for unknown tables.
+    """
+    if table_name not in LEDGER_MODELS:
+        raise ValueError(f"Unknown table: {table_name}, expected one of {list(LEDGER_MODELS)}")
+
+    table = LEDGER_MODELS[table_name].__table__
+    date_column = table.c.date if 'date' in table.c else table.c.Date
+    return select(table).order_by(date_column, table.c.id)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_partitions(db: Session, query: Select, batch_size: int = TEXT_EXPORT_BATCH_SIZE) -> Iterator[Sequence]:
+    """
+    Rows of `query` from a server-side cursor, `batch_size` rows at a time, so the
+    first rows are available before the query is fully read.
+    """
+    result = db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+    yield from result.partitions()
+
+
+def stream_ndjson(db: Session, query: Select, table_name: str = None, batch_size: int = TEXT_EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    One JSON object per line, Decimals as exact strings. With `table_name` every
+    object carries a "table" key, so several tables can share one stream.
+    """
+    columns = [column.name for column in query.selected_columns]
+    prefix = {"table": table_name} if table_name else {}
+
+    for rows in iter_partitions(db, query, batch_size):
+        lines = [json.dumps({**prefix, **dict(zip(columns, row))}, default=_json_default, ensure_ascii=False) for row in rows]
+        yield ("\n".join(lines) + "\n").encode('utf-8')
+
+
+def stream_csv(db: Session, query: Select, batch_size: int = TEXT_EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow([column.name for column in query.selected_columns])
+
+    for rows in iter_partitions(db, query, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_ledger(db: Session, table_names: List[str]) -> Iterator[bytes]:
+    """
+    NDJSON of several ledger tables one after another, each line tagged with its table.
+    """
+    for table_name in table_names:
+        yield from stream_ndjson(db, ledger_query(table_name), table_name)
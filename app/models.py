@@ -1,22 +1,44 @@
 from app.database import Base
 
 from sqlalchemy.sql.expression import text
-from sqlalchemy import Column, Integer, Text, String, Boolean, DateTime, Date, Numeric, Computed
+from sqlalchemy import Column, Integer, Text, String, Boolean, DateTime, Date, Numeric, Computed, Index, UniqueConstraint
 
 
 class Transaction(Base):
 
     __tablename__ = "transactions"
+    __table_args__ = (
+        # keyset pagination order, also serves the date range lookups
+        Index('ix_transactions_date_id', 'date', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False)
-    receiver = Column(String(255), nullable=False)
+    receiver = Column(String(255), nullable=False, index=True)
     title = Column(String(255), nullable=False)
     amount = Column(Numeric(10, 2), nullable=False)
     transaction_type = Column(String(100), nullable=False)
-    category = Column(String(100), nullable=False)
+    category = Column(String(100), nullable=False, index=True)
     ref_number = Column(String(100), nullable=False, unique=True)
+    exec_month = Column(String(255), nullable=False, index=True)
+    mapped_category = Column(String(255), nullable=True, index=True)
+
+
+class TransactionMonthlyRollup(Base):
+
+    __tablename__ = "transactions_monthly_rollup"
+    __table_args__ = (
+        UniqueConstraint('exec_month', 'category', name='uq_transactions_monthly_rollup_month_category'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
     exec_month = Column(String(255), nullable=False)
+    category = Column(String(100), nullable=False)
+    income = Column(Numeric(14, 2), nullable=False, server_default=text('0'))
+    expenses = Column(Numeric(14, 2), nullable=False, server_default=text('0'))
+    income_count = Column(Integer, nullable=False, server_default=text('0'))
+    expense_count = Column(Integer, nullable=False, server_default=text('0'))
+    count = Column(Integer, nullable=False, server_default=text('0'))
 
 
 class Etoro(Base):
@@ -24,7 +46,7 @@ class Etoro(Base):
     __tablename__ = "etoro"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -34,7 +56,7 @@ class Xtb(Base):
     __tablename__ = "xtb"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -45,7 +67,7 @@ class Vienna(Base):
     __tablename__ = "vienna"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
 
@@ -54,7 +76,7 @@ class Revolut(Base):
     __tablename__ = "revolut"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -64,7 +86,7 @@ class Obligacje(Base):
     __tablename__ = "obligacje"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -75,7 +97,7 @@ class Generali(Base):
     __tablename__ = "generali"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -85,7 +107,7 @@ class Nokia(Base):
     __tablename__ = "nokia"
 
     id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False, index=True)
     deposit_amount = Column(Numeric(10, 2), nullable=False)
     total_amount = Column(Numeric(10, 2), nullable=False)
     
@@ -100,4 +122,11 @@ class PortfolioSummary(Base):
     Total_Value = Column(Numeric(10, 2), nullable=False)
     Deposits = Column(Numeric(10, 2), nullable=False)
     Profit = Column(Numeric(10,2), Computed('"Total_Value" - "Deposits"', persisted=True), nullable=True)
-    
+
+
+class DataVersion(Base):
+
+    __tablename__ = "data_versions"
+
+    table_name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
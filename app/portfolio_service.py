@@ -0,0 +1,248 @@
+from sqlalchemy import select, func, literal, union_all, delete, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import Select
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app.database import dialect_insert
+import app.models as models
+
+
+# Wallet tables summed into the portfolio table
+WALLET_MODELS = {
+    'Etoro': models.Etoro,
+    'Xtb': models.Xtb,
+    'Vienna': models.Vienna,
+    'Revolut': models.Revolut,
+    'Obligacje': models.Obligacje,
+    'Generali': models.Generali,
+    'Nokia': models.Nokia
+}
+
+# pandas frequencies of the alignment calendars
+CALENDARS = {
+    'daily': 'D',
+    'weekly': 'W-SUN',
+    'monthly': 'ME'
+}
+SNAPSHOT_VALUES = ('total_amount', 'deposit_amount')
+
+
+def wallet_snapshots(wallets: Dict[str, Any] = WALLET_MODELS, dates: Optional[List[date]] = None) -> Select:
+    """
+    (wallet, date, total_amount, deposit_amount) of every wallet row as one UNION
+    ALL, only the rows of `dates` when given.
+    """
+    selects = []
+    for name, model in wallets.items():
+        query = select(literal(name).label('wallet'), model.date, model.total_amount, model.deposit_amount)
+        if dates is not None:
+            query = query.where(model.date.in_(dates))
+        selects.append(query)
+
+    return union_all(*selects)
+
+
+def latest_snapshots_query(wallets: Dict[str, Any] = WALLET_MODELS, as_of: Optional[date] = None) -> Select:
+    """
+    (wallet, date, total_amount) of the latest row of every wallet, on or before
+    `as_of` when given, as one UNION ALL of ORDER BY date DESC LIMIT 1 branches.
+    Each branch is a backward scan of the wallet's date index.
+    """
+    selects = []
+    for name, model in wallets.items():
+        query = select(literal(name).label('wallet'), model.date, model.total_amount)
+        if as_of is not None:
+            query = query.where(model.date <= as_of)
+        # Compound members cannot carry their own LIMIT on every dialect, wrap each in a subquery
+        latest = query.order_by(model.date.desc(), model.id.desc()).limit(1).subquery()
+        selects.append(select(*latest.c))
+
+    return union_all(*selects)
+
+
+def wallet_allocation(latest_rows) -> List[Dict[str, Any]]:
+    """
+    [{Wallet, Percentage}] of (wallet, date, total_amount) rows, percentages of
+    the summed totals rounded to 2 places. Wallets without a snapshot are left out.
+    """
+    totals = {wallet: float(total_amount) for wallet, _, total_amount in latest_rows}
+    portfolio_total = sum(totals.values())
+    if not portfolio_total:
+        return []
+
+    return [{"Wallet": wallet, "Percentage": round(amount / portfolio_total * 100, 2)} for wallet, amount in totals.items()]
+
+
+def portfolio_series_query(wallets: Dict[str, Any] = WALLET_MODELS, dates: Optional[List[date]] = None) -> Select:
+    """
+    Total value and deposits per snapshot date, summed over the wallets in one
+    GROUP BY instead of one query per wallet and row.
+    """
+    snapshots = wallet_snapshots(wallets, dates).subquery()
+    return (
+        select(
+            snapshots.c.date.label('Date'),
+            func.sum(snapshots.c.total_amount).label('Total_Value'),
+            func.sum(snapshots.c.deposit_amount).label('Deposits')
+        )
+        .group_by(snapshots.c.date)
+        .order_by(snapshots.c.date)
+    )
+
+
+def portfolio_series(db: Session, wallets: Dict[str, Any] = WALLET_MODELS) -> List[Dict[str, Any]]:
+    return [
+        {"Date": snapshot_date, "Total_Value": float(total_value), "Deposits": float(deposits)}
+        for snapshot_date, total_value, deposits in db.execute(portfolio_series_query(wallets))
+    ]
+
+
+def refresh_portfolio_dates(db: Session, dates: Iterable[date], wallets: Dict[str, Any] = WALLET_MODELS) -> None:
+    """
+    Recomputes the portfolio rows of the wallet snapshot dates a write touched
+    and upserts them, dates without any wallet row left are deleted from the
+    portfolio. Does not commit: call it after the wallet write, in the same
+    transaction, and commit once, so the portfolio never drifts from the wallets.
+    A failure rolls back the wallet write too.
+    """
+    dates = sorted({snapshot_date for snapshot_date in dates if snapshot_date is not None})
+    if not dates:
+        return
+
+    portfolio = models.PortfolioSummary.__table__
+
+    try:
+        # Sessions do not autoflush, the wallet write has to reach the DB before it is summed
+        db.flush()
+        rows = [
+            {"Date": snapshot_date, "Total_Value": total_value, "Deposits": deposits}
+            for snapshot_date, total_value, deposits in db.execute(portfolio_series_query(wallets, dates))
+        ]
+        if rows:
+            stmt = dialect_insert(db)(portfolio).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['Date'],
+                set_={"Total_Value": stmt.excluded.Total_Value, "Deposits": stmt.excluded.Deposits}
+            )
+            db.execute(stmt)
+
+        emptied = set(dates) - {row["Date"] for row in rows}
+        if emptied:
+            db.execute(delete(portfolio).where(portfolio.c.Date.in_(emptied)))
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"Portfolio refresh for {dates} failed: {str(e)}")
+        raise
+
+    logging.info(f"Portfolio refreshed for {len(dates)} dates")
+
+
+def rebuild_portfolio(db: Session, wallets: Dict[str, Any] = WALLET_MODELS) -> int:
+    """
+    Recomputes the whole portfolio table from the wallet tables, for when it
+    drifted (e.g. wallet rows changed outside the API). Returns the number of rows.
+    """
+    portfolio = models.PortfolioSummary.__table__
+
+    try:
+        db.execute(delete(portfolio))
+        db.execute(insert(portfolio).from_select(['Date', 'Total_Value', 'Deposits'], portfolio_series_query(wallets)))
+        rows = db.execute(select(func.count()).select_from(portfolio)).scalar()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"Portfolio rebuild failed: {str(e)}")
+        raise
+
+    logging.info(f"portfolio rebuilt with {rows} rows")
+    return rows
+
+
+def wallet_snapshot_frame(db: Session, wallets: Dict[str, Any] = WALLET_MODELS) -> pd.DataFrame:
+    """
+    All wallet rows as one DataFrame (wallet, date, total_amount, deposit_amount), read with one query.
+    """
+    rows = db.execute(wallet_snapshots(wallets)).all()
+    frame = pd.DataFrame(rows, columns=['wallet', 'date', *SNAPSHOT_VALUES])
+    frame['date'] = pd.to_datetime(frame['date'])
+    for column in SNAPSHOT_VALUES:
+        frame[column] = frame[column].astype('float64')
+    return frame
+
+
+def alignment_calendar(start, end, calendar: str = 'daily') -> pd.DatetimeIndex:
+    """
+    Dates of a daily, weekly (Sundays) or monthly (month ends) calendar from
+    `start` to `end`. `end` itself closes the calendar, so the latest snapshot
+    is always part of it.
+    """
+    if calendar not in CALENDARS:
+        raise ValueError(f"Unknown calendar: {calendar}, expected one of {list(CALENDARS)}")
+
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if start > end:
+        raise ValueError(f"start {start.date()} is after end {end.date()}")
+
+    dates = pd.date_range(start, end, freq=CALENDARS[calendar])
+    if len(dates) == 0 or dates[-1] < end:
+        dates = dates.append(pd.DatetimeIndex([end]))
+    return dates
+
+
+def align_wallets(snapshots: pd.DataFrame, calendar: str = 'daily', start=None, end=None,
+                  value: str = 'total_amount', wallets: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Date x wallet matrix of `value` with as-of semantics: every cell holds the
+    wallet's last snapshot on or before the calendar date (NaN before its first
+    snapshot), so wallets updated on different days line up. One binary search
+    per wallet over the sorted snapshot dates, no Python loop over dates.
+    Without snapshots the calendar of `start` to `end` is all NaN, or empty
+    when either bound is missing.
+    """
+    if value not in SNAPSHOT_VALUES:
+        raise ValueError(f"Unknown value: {value}, expected one of {list(SNAPSHOT_VALUES)}")
+
+    wallets = wallets if wallets is not None else list(dict.fromkeys(snapshots['wallet']))
+    if snapshots.empty and (start is None or end is None):
+        # No snapshot to take the missing bound from, an empty calendar
+        return pd.DataFrame(columns=wallets, index=pd.DatetimeIndex([]), dtype='float64')
+
+    start = snapshots['date'].min() if start is None else start
+    end = snapshots['date'].max() if end is None else end
+    dates = alignment_calendar(start, end, calendar)
+    calendar_values = dates.values
+
+    # Stable sort keeps the insertion order of rows sharing a date, the last one wins
+    snapshots = snapshots.sort_values('date', kind='stable')
+    snapshot_dates = snapshots['date'].values
+    snapshot_values = snapshots[value].values
+    matrix = np.full((len(dates), len(wallets)), np.nan)
+
+    for wallet, rows in snapshots.groupby('wallet', sort=False).indices.items():
+        if wallet not in wallets:
+            continue
+        positions = np.searchsorted(snapshot_dates[rows], calendar_values, side='right') - 1
+        observed = positions >= 0
+        matrix[observed, wallets.index(wallet)] = snapshot_values[rows][positions[observed]]
+
+    return pd.DataFrame(matrix, index=dates, columns=wallets)
+
+
+def aligned_portfolio(db: Session, calendar: str = 'daily', start=None, end=None,
+                      value: str = 'total_amount', wallets: Dict[str, Any] = WALLET_MODELS) -> List[Dict[str, Any]]:
+    """
+    [{date, <wallet>: value, ..., Total}] on the calendar, wallets carried
+    forward from their last snapshot. Wallets without a snapshot yet are None
+    and left out of Total.
+    """
+    matrix = align_wallets(wallet_snapshot_frame(db, wallets), calendar, start, end, value, list(wallets))
+    matrix['Total'] = matrix.sum(axis=1, min_count=1).round(2)
+    matrix.index = matrix.index.date
+    matrix = matrix.rename_axis('date').reset_index()
+    return matrix.astype(object).where(matrix.notna(), None).to_dict(orient='records')
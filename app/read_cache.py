@@ -0,0 +1,167 @@
+"""
+In-process cache for read endpoints. Entries are keyed by endpoint and
+parameters, tagged with the tables they were read from, evicted LRU once
+READ_CACHE_SIZE entries are stored and expire after READ_CACHE_TTL seconds.
+A committed write to a table (see app.data_versions) drops exactly the entries
+tagged with it.
+
+Like the data versions, the cache is per process: with several uvicorn workers
+a write only invalidates the cache of the worker that handled it, the others
+serve their entries until the TTL runs out.
+"""
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from time import monotonic
+import inspect
+import logging
+import os
+import threading
+
+from app import data_versions
+
+
+READ_CACHE_SIZE = int(os.environ.get("READ_CACHE_SIZE", 256))
+READ_CACHE_TTL = float(os.environ.get("READ_CACHE_TTL", 300))
+
+_MISSING = object()
+
+
+class ReadCache:
+
+    def __init__(self, maxsize: int = READ_CACHE_SIZE, ttl: float = READ_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_table = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+    def _drop(self, key) -> None:
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            self._keys_by_table[table].discard(key)
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return _MISSING
+
+
+    def set(self, key, value, tables, versions=None) -> bool:
+        """
+        Stores `value`, when `versions` is given only if the data versions of
+        `tables` still match them. The check runs under the lock the
+        invalidation takes, so a write committing meanwhile either fails the
+        check or drops the entry right after. Returns whether it was stored.
+        """
+        with self._lock:
+            if versions is not None and data_versions.versions(*tables) != versions:
+                return False
+
+            if key in self._entries:
+                self._drop(key)
+
+            self._entries[key] = (monotonic() + self.ttl, tuple(tables), value)
+            for table in tables:
+                self._keys_by_table[table].add(key)
+
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+
+    def invalidate_tables(self, tables) -> None:
+        with self._lock:
+            for table in tables:
+                for key in list(self._keys_by_table.get(table, ())):
+                    if key in self._entries:
+                        self._drop(key)
+                        self.invalidations += 1
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / requests, 4) if requests else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+
+read_cache = ReadCache()
+data_versions.on_bump(read_cache.invalidate_tables)
+
+
+def cached_read(*tables: str):
+    """
+    Caches the result of a read endpoint (sync or async) per parameters, the DB
+    session is not part of the key, until one of `tables` is written. A result
+    computed while a write committed is returned but not stored.
+    """
+    def decorator(func):
+        def cache_key(args, kwargs):
+            params = tuple(sorted((name, repr(value)) for name, value in kwargs.items() if not isinstance(value, (Session, AsyncSession))))
+            positional = tuple(repr(arg) for arg in args if not isinstance(arg, (Session, AsyncSession)))
+            return (func.__module__, func.__qualname__, func.__code__.co_firstlineno, positional, params)
+
+        def store(key, value, versions):
+            if not read_cache.set(key, value, tables, versions):
+                logging.debug(f"{func.__qualname__}: tables changed while reading, result not cached")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = cache_key(args, kwargs)
+                value = read_cache.get(key)
+                if value is not _MISSING:
+                    return value
+
+                versions = data_versions.versions(*tables)
+                value = await func(*args, **kwargs)
+                store(key, value, versions)
+                return value
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(args, kwargs)
+            value = read_cache.get(key)
+            if value is not _MISSING:
+                return value
+
+            versions = data_versions.versions(*tables)
+            value = func(*args, **kwargs)
+            store(key, value, versions)
+            return value
+
+        return wrapper
+    return decorator
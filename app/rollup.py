@@ -0,0 +1,136 @@
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, Tuple, List, Dict, Any, Optional
+import argparse
+import logging
+
+from app.database import SessionLocal, dialect_insert
+import app.models as models
+
+
+ROLLUP_FIELDS = ('income', 'expenses', 'income_count', 'expense_count', 'count')
+
+
+def rollup_deltas(added: Iterable[Tuple[str, str, Any]] = (), removed: Iterable[Tuple[str, str, Any]] = ()) -> List[Dict[str, Any]]:
+    """
+    (exec_month, category, amount) rows added to / removed from transactions ->
+    one delta per (exec_month, category).
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+
+    for sign, rows in ((1, added), (-1, removed)):
+        for exec_month, category, amount in rows:
+            amount = Decimal(str(amount))
+            delta = deltas[(exec_month, category)]
+            delta['count'] += sign
+            if amount > 0:
+                delta['income'] += sign * amount
+                delta['income_count'] += sign
+            elif amount < 0:
+                delta['expenses'] += sign * amount
+                delta['expense_count'] += sign
+
+    return [{'exec_month': exec_month, 'category': category, **delta} for (exec_month, category), delta in deltas.items()]
+
+
+def apply_rollup_delta(db: Session, added: Iterable[Tuple[str, str, Any]] = (), removed: Iterable[Tuple[str, str, Any]] = ()) -> None:
+    """
+    Moves transactions_monthly_rollup by the added and removed transaction rows
+    with one upsert. Does not commit, so it runs in the caller's transaction next
+    to the write it accounts for.
+    """
+    removed = list(removed)
+    deltas = rollup_deltas(added, removed)
+    if not deltas:
+        return
+
+    rollup = models.TransactionMonthlyRollup.__table__
+    stmt = dialect_insert(db)(rollup).values(deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['exec_month', 'category'],
+        set_={field: rollup.c[field] + stmt.excluded[field] for field in ROLLUP_FIELDS}
+    )
+    db.execute(stmt)
+
+    if removed:
+        db.execute(delete(rollup).where(rollup.c['count'] <= 0))
+
+
+def rebuild_rollup(db: Session) -> int:
+    """
+    Recomputes the whole rollup from the transactions table, for when it drifted
+    (e.g. rows changed outside the API). Returns the number of rollup rows.
+    """
+    transaction = models.Transaction
+    rollup = models.TransactionMonthlyRollup.__table__
+    amount = transaction.amount
+
+    grouped = select(
+        transaction.exec_month,
+        transaction.category,
+        func.coalesce(func.sum(amount).filter(amount > 0), 0),
+        func.coalesce(func.sum(amount).filter(amount < 0), 0),
+        func.count().filter(amount > 0),
+        func.count().filter(amount < 0),
+        func.count()
+    ).group_by(transaction.exec_month, transaction.category)
+
+    try:
+        db.execute(delete(rollup))
+        db.execute(insert(rollup).from_select(['exec_month', 'category', *ROLLUP_FIELDS], grouped))
+        rows = db.execute(select(func.count()).select_from(rollup)).scalar()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        logging.error(f"Rollup rebuild failed: {str(e)}")
+        raise
+
+    logging.info(f"transactions_monthly_rollup rebuilt with {rows} rows")
+    return rows
+
+
+def read_rollup(db: Session, exec_months: Optional[List[str]] = None) -> List[models.TransactionMonthlyRollup]:
+    query = select(models.TransactionMonthlyRollup)
+    if exec_months:
+        query = query.where(models.TransactionMonthlyRollup.exec_month.in_(exec_months))
+
+    query = query.order_by(models.TransactionMonthlyRollup.exec_month, models.TransactionMonthlyRollup.category)
+    return db.execute(query).scalars().all()
+
+
+def read_summary(db: Session, exec_months: Optional[List[str]] = None) -> Dict[str, Decimal]:
+    rollup = models.TransactionMonthlyRollup
+    query = select(func.coalesce(func.sum(rollup.income), 0), func.coalesce(func.sum(rollup.expenses), 0))
+    if exec_months:
+        query = query.where(rollup.exec_month.in_(exec_months))
+
+    income, expenses = db.execute(query).one()
+    return {"income": income, "expenses": expenses}
+
+
+def read_timeline(db: Session) -> List[Dict[str, Any]]:
+    """
+    [{exec_month, count}] sorted by month, summed over the categories of the rollup.
+    """
+    rollup = models.TransactionMonthlyRollup
+    query = (
+        select(rollup.exec_month, func.sum(rollup.count).label('count'))
+        .group_by(rollup.exec_month)
+        .order_by(rollup.exec_month)
+    )
+    return [{"exec_month": exec_month, "count": int(count)} for exec_month, count in db.execute(query)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="transactions_monthly_rollup maintenance")
+    parser.add_argument('command', choices=['rebuild'])
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"Rollup rebuilt: {rebuild_rollup(db)} rows")
+    finally:
+        db.close()
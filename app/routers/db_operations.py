@@ -1,125 +1,322 @@
-from fastapi import status, Depends, Body, HTTPException, APIRouter, UploadFile, File
-from sqlalchemy import func
+from fastapi import status, Depends, Body, HTTPException, APIRouter, UploadFile, File, BackgroundTasks, Query, Response
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from typing import List
-from io import StringIO
+from typing import List, Optional
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import logging
+import shutil
+import tempfile
 
-from app.csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.csv_handler import CSVHandler, parse_statements, DEFAULT_CSV_ENGINE
+from app.categorization import map_receiver, changed_patterns, recategorize_in_background
+from app.database import get_sql_db, get_async_db
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.ingest_jobs import job_store, submit_ingest_job
+from app.rollup import apply_rollup_delta, rebuild_rollup, read_rollup, read_summary, read_timeline
+from app.read_cache import cached_read
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
 
 
 
 
 router = APIRouter(tags=["db_operations"], prefix="/transactions")
 
-@router.get("/get_timeline", status_code=status.HTTP_200_OK)
-def get_timeline(db: Session = Depends(get_sql_db)):
+TRANSACTION_TABLES = ('transactions', 'transactions_monthly_rollup')
 
-       timelines = [value[0] for index, value in enumerate(db.query(models.Transaction.exec_month).distinct())]
-       return timelines
 
-@router.get("/get_summary", response_model=schemas.ReturnSummary, status_code=status.HTTP_200_OK)
-def get_summary(db: Session = Depends(get_sql_db)):
+@router.get("/get_timeline", response_model=List[schemas.TimelineMonth], status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+@cached_read(*TRANSACTION_TABLES)
+def get_timeline(db: Session = Depends(get_sql_db)):
+       """
+       Months with transactions, sorted, with their row counts. Read from the
+       monthly rollup and cached until the next committed write to transactions.
+       """
+       try:
+              return read_timeline(db)
+       except SQLAlchemyError as e:
+              logging.error(f"Database error in get_timeline: {str(e)}")
+              raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not retrieve timeline")
+
+@router.get("/get_summary", response_model=schemas.ReturnSummary, status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+async def get_summary(exec_month: Optional[List[str]] = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Income and expenses for the selected months (all months when exec_month is
+    not given), read from transactions_monthly_rollup.
+    """
     try:
-        income = db.query(func.sum(models.Transaction.amount)).filter(
-                models.Transaction.amount > 0).scalar()
-        expenses = db.query(func.sum(models.Transaction.amount)).filter(
-                models.Transaction.amount <0).scalar()
+        summary = await db.run_sync(read_summary, exec_month)
     except Exception as e:
            logging.error(f"Database error: {str(e)}")
            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal Server Error")
 
-    income_float = float(income) if income is not None else 0.0
-    expenses_float = float(expenses) if expenses is  not None else 0.0
-
     response = {
-           "income": income_float,
-           "expenses": expenses_float
+           "income": float(summary["income"]),
+           "expenses": float(summary["expenses"])
     }
 
     return response
 
 
-@router.post("/add_csv",response_model=schemas.ADDCSVResponse, status_code=status.HTTP_201_CREATED)
-def add_csv(file: UploadFile = File(...), db: Session = Depends(get_sql_db)):
+@router.get("/get_monthly_summary", response_model=List[schemas.MonthlyRollupSchema], status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+def get_monthly_summary(exec_month: Optional[List[str]] = Query(None), db: Session = Depends(get_sql_db)):
+    """
+    Income, expenses and counts per month and bank category, read from
+    transactions_monthly_rollup.
+    """
+    try:
+        return read_rollup(db, exec_months=exec_month)
+    except SQLAlchemyError as e:
+           logging.error(f"Database error in get_monthly_summary: {str(e)}")
+           raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not retrieve monthly summary")
+
+
+@router.post("/rollup/rebuild", status_code=status.HTTP_200_OK)
+def rebuild_monthly_rollup(db: Session = Depends(get_sql_db)):
+    """
+    Recomputes transactions_monthly_rollup from the transactions table. Same as
+    `python -m app.rollup rebuild`.
+    """
+    try:
+        rows = rebuild_rollup(db)
+    except SQLAlchemyError as e:
+           raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to rebuild monthly rollup")
 
-    added_month = None
+    return {"status": "success", "rollup_rows": rows}
+
+
+@router.post("/add_csv",response_model=schemas.ADDCSVResponse, status_code=status.HTTP_201_CREATED)
+def add_csv(file: UploadFile = File(...), engine: str = DEFAULT_CSV_ENGINE, db: Session = Depends(get_sql_db)):
+    """
+    Streams the uploaded statement chunk by chunk. Every chunk is cleaned and
+    flushed to the DB as soon as it is parsed, so memory use does not grow
+    with the size of the file. Re-uploading is safe, duplicates are skipped,
+    also ref_numbers repeated within the file. A bad chunk answers 400 with the
+    number of rows already imported from the chunks before it.
+    `engine` picks the CSV parser: 'c' (pandas) or 'pyarrow'.
+    """
 
     logging.info('Entering POST /add_csv request')
-    logging.debug('Loading CSV attempt...')
 
-    content = file.file.read().decode('utf-8')
-    logging.debug('Raw CSV content:')
-    logging.debug(content)
+    csv_instance = CSVHandler()
+    transaction_service = TransactionService(db)
 
-    df = pd.read_csv(StringIO(content), delimiter=';')
+    records_processed, records_inserted, records_skipped = 0, 0, 0
 
-    logging.debug(f'Loaded DataFrame head: {df.head(5)}')
+    try:
+        for chunk_df in csv_instance.iter_chunks(file.file, engine=engine):
+            result = transaction_service.ingest_transactions(chunk_df)
 
+            records_processed += len(chunk_df)
+            records_inserted += result["inserted"]
+            records_skipped += result["skipped"]
 
-    csv_instance = CSVHandler(df)
-    df = csv_instance.load_csv()
+    except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        # Chunks before the bad one are committed, re-uploading the fixed file skips them
+        logging.error(f"Error processing CSV after {records_inserted} committed rows: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Error processing CSV: {str(e)}. {records_inserted} rows of earlier chunks were imported")
 
-    if df is not None:
-        new_df = csv_instance.create_df_for_db(df)
-        if new_df is None:
-                logging.error("Error processing DataFrame in create_df_for_db")
-                raise HTTPException(status_code=500, detail="Error processing DataFrame in create_df_for_db")
-        
-        new_df = csv_instance.rename_columns(new_df)
-        if new_df is None:
-                logging.error("Error processing DataFrame in create_df_for_db")
-                raise HTTPException(status_code=500, detail="Error processing DataFrame in create_df_for_db")
+    except SQLAlchemyError as e:
+        logging.error(f"Database error in add_csv: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add transactions to the database")
 
-        
-    
-        try:
-            df_to_dict = new_df.to_dict(orient='index')
-            print('Dictionary representation of DataFrame:')
-            print(df_to_dict[0])
-        except Exception as e:
-            logging.error(f"Error converting DataFrame to dict: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error converting DataFrame to dict: {str(e)}")
-        
+    # Repeated ref_numbers of the file were dropped by the parser
+    records_processed += csv_instance.duplicates_dropped
+    records_skipped += csv_instance.duplicates_dropped
 
-        try:
-            transaction_service = TransactionService(db)
-            transaction_service.add_transactions(models.Transaction, list(df_to_dict.values()))
-            
+    logging.info(f'add_csv finished: {records_processed} processed, {records_inserted} inserted, {records_skipped} skipped')
 
-            return schemas.ADDCSVResponse(
-                status="success",
-                records_processed=len(df_to_dict)
-            )
-
-        except IntegrityError as e:
-               db.rollback()
-               raise HTTPException(
-                      status_code=status.HTTP_400_BAD_REQUEST,
-                      detail="Duplicate ref_number found. This transaction already exists in db"
-               )
-        
-    raise HTTPException(status_code=500, detail="Failed to add transactions to the database")
+    return schemas.ADDCSVResponse(
+        status="success",
+        records_processed=records_processed,
+        records_inserted=records_inserted,
+        records_skipped=records_skipped
+    )
+
+
+
+@router.post("/add_csv_async", response_model=schemas.IngestJobStatus, status_code=status.HTTP_202_ACCEPTED)
+def add_csv_async(file: UploadFile = File(...)):
+    """
+    Spools the upload to a temp file and ingests it in the background worker
+    pool. Returns the job right away, progress is available from /jobs/{job_id}.
+    """
+    with tempfile.NamedTemporaryFile(prefix="statement_", suffix=".csv", delete=False) as spooled:
+        shutil.copyfileobj(file.file, spooled)
 
+    return submit_ingest_job(file.filename, spooled.name)
 
 
-@router.get("/get_transactions", response_model=List[schemas.TransactionSchema], status_code=status.HTTP_200_OK)
-def get_transactions(db: Session = Depends(get_sql_db)):
+@router.get("/jobs/{job_id}", response_model=schemas.IngestJobStatus, status_code=status.HTTP_200_OK)
+def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Ingest job with id: {job_id} not found!')
+    return job
+
+
+@router.post("/add_csv_many", response_model=schemas.ADDCSVManyResponse, status_code=status.HTTP_201_CREATED)
+def add_csv_many(files: List[UploadFile] = File(...), db: Session = Depends(get_sql_db)):
+    """
+    Imports many statements in one request. Every file is parsed in the statement
+    process pool, the results are merged and deduplicated by ref_number across
+    files (first file wins) and written with a single bulk insert.
+    """
+    logging.info(f'Entering POST /add_csv_many request with {len(files)} files')
+
     try:
-        transactions = db.query(models.Transaction).all()
-        return transactions
+        parsed = parse_statements([file.file.read() for file in files])
+    except BrokenProcessPool as e:
+        # A crashed parser process, not a bad file: the pool failed twice in a row
+        logging.error(f"Statement pool failed in add_csv_many: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Statement parser pool failed, try again")
+
+    file_results, frames = [], []
+
+    for index, (file, df) in enumerate(zip(files, parsed)):
+        filename = file.filename
+        if isinstance(df, Exception):
+            logging.error(f"Error processing CSV {filename}: {str(df)}")
+            file_results.append(schemas.FileImportResult(filename=filename, status="error", detail=str(df)))
+            continue
+
+        df['source_file'] = index
+        frames.append(df)
+        file_results.append(schemas.FileImportResult(filename=filename, status="success", records_parsed=len(df)))
+
+    if not frames:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=[result.model_dump() for result in file_results])
+
+    merged_df = pd.concat(frames, ignore_index=True)
+    duplicated = merged_df['ref_number'].duplicated(keep='first')
+
+    for index, count in merged_df.loc[duplicated, 'source_file'].value_counts().items():
+        file_results[index].duplicates_across_files = int(count)
+
+    unique_df = merged_df.loc[~duplicated].drop(columns='source_file')
+
+    try:
+        transaction_service = TransactionService(db)
+        result = transaction_service.ingest_transactions(unique_df)
+    except SQLAlchemyError as e:
+        logging.error(f"Database error in add_csv_many: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to add transactions to the database")
+
+    return schemas.ADDCSVManyResponse(
+        status="success" if len(frames) == len(files) else "partial",
+        records_processed=len(merged_df),
+        records_inserted=result["inserted"],
+        records_skipped=result["skipped"] + int(duplicated.sum()),
+        files=file_results
+    )
+
+
+@router.post("/add_rule", status_code=status.HTTP_201_CREATED)
+def add_rule(rule: schemas.AddRuleSchema, background_tasks: BackgroundTasks):
+    """
+    Adds a receiver rule and recomputes mapped_category in the background,
+    only for the transactions whose receiver matches the affected patterns.
+    """
+    csv_instance = CSVHandler()
+    old_rule_set = csv_instance.rule_set
+
+    try:
+        csv_instance.add_rule(rule_key=rule.rule_key, rule_value=rule.rule_value)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to save rule: {str(e)}")
+
+    patterns = changed_patterns(old_rule_set, csv_instance.rule_set)
+    background_tasks.add_task(recategorize_in_background, patterns)
+
+    return {"status": "success", "rules_version": csv_instance.rule_set.version, "patterns": patterns}
+
+
+@router.post("/recategorize", status_code=status.HTTP_202_ACCEPTED)
+def recategorize(background_tasks: BackgroundTasks):
+    """
+    Recomputes mapped_category for the whole table, e.g. after editing rules_dict.json by hand.
+    """
+    background_tasks.add_task(recategorize_in_background, None)
+    return {"status": "accepted"}
+
+
+@router.get("/get_transactions", response_model=List[schemas.TransactionSchema], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+async def get_transactions(response: Response, db: AsyncSession = Depends(get_async_db)):
+    """
+    Every transaction as one bare list, the original shape of this endpoint,
+    kept for older clients. Reads the whole table: use /get_transactions_page.
+    """
+    try:
+        query = select(*schema_columns(models.Transaction, schemas.TransactionSchema)).order_by(models.Transaction.date.desc(), models.Transaction.id.desc())
+        return json_response(await query_json(db, query), response)
     except SQLAlchemyError as e:
            logging.error(f"Databas error: {str(e)}")
            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not retrieve transactions")
 
 
-@router.get("/get_transaction_by_id/{transaction_id}", response_model=schemas.ReturnedTransaction, status_code=status.HTTP_200_OK)
+@router.get("/get_transactions_page", response_model=schemas.TransactionPage, response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+async def get_transactions_page(
+        response: Response,
+        limit: int = Query(500, ge=1, le=5000),
+        cursor: Optional[str] = None,
+        exec_month: Optional[List[str]] = Query(None),
+        category: Optional[str] = None,
+        mapped_category: Optional[str] = None,
+        receiver: Optional[str] = None,
+        sign: Optional[str] = Query(None, pattern="^(income|expense)$"),
+        db: AsyncSession = Depends(get_async_db)):
+    """
+    Page of transactions, newest first. Pass next_cursor of the response as
+    `cursor` to get the following page, next_cursor is null on the last one.
+    Rows are read as Core tuples and encoded without per-row validation.
+    """
+    columns = schema_columns(models.Transaction, schemas.TransactionSchema)
+    keys = [column.name for column in columns]
+
+    try:
+        rows, next_cursor = await db.run_sync(lambda session: TransactionService(session).get_transactions_page(
+            limit=limit, cursor=cursor, exec_months=exec_month, category=category,
+            mapped_category=mapped_category, receiver=receiver, sign=sign, columns=columns
+        ))
+        # zip stops at the schema columns, the trailing cursor columns are dropped
+        items = [dict(zip(keys, row)) for row in rows]
+        return json_response({"items": items, "next_cursor": next_cursor}, response)
+    except ValueError as e:
+           raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SQLAlchemyError as e:
+           logging.error(f"Databas error: {str(e)}")
+           raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not retrieve transactions")
+
+
+@router.get("/aggregate", response_model=schemas.TransactionAggregate, status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
+def aggregate_transactions(
+        group_by: str = Query("mapped_category", pattern="^(receiver|mapped_category|category|transaction_type)$"),
+        exec_month: Optional[List[str]] = Query(None),
+        top_n: int = Query(10, ge=1, le=100),
+        db: Session = Depends(get_sql_db)):
+    """
+    Income and expense totals, counts and top_n per receiver, mapped category,
+    bank category or transaction type for the selected months (all months when
+    exec_month is not given).
+    """
+    try:
+        return TransactionService(db).aggregate_transactions(group_by=group_by, exec_months=exec_month, top_n=top_n)
+    except ValueError as e:
+           raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SQLAlchemyError as e:
+           logging.error(f"Database error in aggregate_transactions: {str(e)}")
+           raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not aggregate transactions")
+
+
+@router.get("/get_transaction_by_id/{transaction_id}", response_model=schemas.ReturnedTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for(*TRANSACTION_TABLES)])
 def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_sql_db)):
         try:
             logging.info(f"Fetching transaction with id {transaction_id}")
@@ -138,13 +335,15 @@ def get_transaction_by_id(transaction_id: int, db: Session = Depends(get_sql_db)
 @router.post("/add_transaction", response_model=schemas.TransactionSchema, status_code=status.HTTP_201_CREATED)
 def add_transaction(transaction_data: schemas.TransactionSchema, db: Session = Depends(get_sql_db)):
                     try:
-                        logging.info(f"Transaction added with ID {new_transaction.id}")
                         new_transaction = models.Transaction(
-                                **transaction_data.model_dump()
+                                **transaction_data.model_dump(exclude={"mapped_category"}),
+                                mapped_category=map_receiver(transaction_data.receiver)
                         )
                         db.add(new_transaction)
+                        apply_rollup_delta(db, added=[(new_transaction.exec_month, new_transaction.category, new_transaction.amount)])
                         db.commit()
                         db.refresh(new_transaction)
+                        logging.info(f"Transaction added with ID {new_transaction.id}")
 
                         
                         return new_transaction
@@ -166,12 +365,17 @@ def update_transaction(id: int, transaction_data: schemas.TransactionSchema = Bo
         
         logging.debug(f'Transaction_data for update: {transaction_data.model_dump()}')
 
+        update_data = transaction_data.model_dump()
+        update_data["mapped_category"] = map_receiver(transaction_data.receiver)
+        old_row = (transaction.exec_month, transaction.category, transaction.amount)
+
         try:
-            transaction_query.update(transaction_data.model_dump(), synchronize_session=False)
+            transaction_query.update(update_data, synchronize_session=False)
+            apply_rollup_delta(db, added=[(update_data["exec_month"], update_data["category"], update_data["amount"])], removed=[old_row])
             db.commit()
             db.refresh(transaction)
             return transaction
-        except SQLAlchemyError() as e:
+        except SQLAlchemyError as e:
                 logging.error(f"Error updating transaction with id {id}: {str(e)}")
                 db.rollback()
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Error occurred: {str(e)}')
@@ -190,12 +394,17 @@ def partial_update(id: int, transaction_data: schemas.UpdateTransactionSchema =
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Looked transaction not found id: {id}')
         
         transaction_body = transaction_data.model_dump(exclude_unset=True)
+        if transaction_body.get("receiver"):
+                transaction_body["mapped_category"] = map_receiver(transaction_body["receiver"])
         print(f'Printing content for PATCH request: {transaction_body}')
 
+        old_row = (transaction.exec_month, transaction.category, transaction.amount)
+
         try:
             for k,v in transaction_body.items():
                     setattr(transaction,k,v)
-            
+
+            apply_rollup_delta(db, added=[(transaction.exec_month, transaction.category, transaction.amount)], removed=[old_row])
             db.commit()
             db.refresh(transaction)
             return transaction
@@ -203,5 +412,23 @@ def partial_update(id: int, transaction_data: schemas.UpdateTransactionSchema =
             logging.error(f"Error partially updating transaction with id {id}: {str(e)}")
             db.rollback()
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to partially update transaction")
-              
-        
\ No newline at end of file
+
+
+@router.delete("/delete_transaction/{id}", status_code=status.HTTP_200_OK)
+def delete_transaction(id: int, db: Session = Depends(get_sql_db)):
+
+        transaction = db.query(models.Transaction).filter(models.Transaction.id == id).first()
+
+        if not transaction:
+                logging.warning(f"Transaction with id {id} not found for delete.")
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Transaction with id: {id} not found!')
+
+        try:
+            db.delete(transaction)
+            apply_rollup_delta(db, removed=[(transaction.exec_month, transaction.category, transaction.amount)])
+            db.commit()
+            return f'Transaction with id: {id} deleted succesfully!'
+        except SQLAlchemyError as e:
+            logging.error(f"Error deleting transaction with id {id}: {str(e)}")
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to delete transaction")
@@ -1,13 +1,19 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 from decimal import Decimal
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 
 router = APIRouter(tags=["etoro"], prefix="/etoro")
 
@@ -21,24 +27,38 @@ def return_df(db: Session = Depends(get_sql_db)):
 
 @router.put("/update_etoro/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_etoro(id: int, etoro_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_etoro/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = etoro_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.Etoro, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Etoro.date).filter(models.Etoro.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Etoro, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_etoro", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_etoro(db: Session = Depends(get_sql_db)):
-        etoro_entries = db.query(models.Etoro).order_by(asc(models.Etoro.date)).all()
-        return etoro_entries
+@router.get("/get_all_etoro", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("etoro")])
+async def get_all_etoro(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_etoro(db), response)
+
 
-@router.get("/get_id_etoro/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("etoro")
+async def read_all_etoro(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Etoro, schemas.PortfolioTransaction)).order_by(asc(models.Etoro.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_etoro/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("etoro")])
 def get_all_etoro(id: int, db: Session = Depends(get_sql_db)):
         id_etoro = db.query(models.Etoro).filter(models.Etoro.id == id).first()
         return id_etoro
@@ -51,13 +71,15 @@ def add_many_etoro(etoro_entries: List[schemas.PortfolioTransaction] ,db: Sessio
     etoro_dicts = []
     for entity in etoro_entries:
             
-            etoro_dict = entity.model_dump()
+            etoro_dict = entity.model_dump(exclude_none=True)
             etoro_dicts.append(etoro_dict)
             
     
-    transaction_service.add_transactions(models.Etoro, etoro_dicts)
+    result = transaction_service.bulk_add_transactions(models.Etoro, etoro_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in etoro_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -82,6 +104,7 @@ def add_etoro_transaction(etoro: schemas.PortfolioTransaction, db: Session = Dep
     
 
     db.add(etoro_entry)
+    refresh_portfolio_dates(db, [etoro_entry.date])
     db.commit()
     db.refresh(etoro_entry)
 
@@ -104,11 +127,14 @@ def delete_etoro(transaction_date: str, db: Session = Depends(get_sql_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'etoro with id: {id} has not been found')
       
     try:
+        deleted_date = etoro.date
         db.delete(etoro)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return f'Entry with date: {etoro} deleted succesfully!'
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
 
 
@@ -0,0 +1,106 @@
+from fastapi import status, HTTPException, APIRouter, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import List, Optional
+import logging
+
+from app.arrow_export import stream_export
+from app.database import SessionLocal
+from app.ledger_export import LEDGER_MODELS, ledger_query, stream_ndjson, stream_csv, stream_ledger
+from app.transaction_service import filter_transactions
+import app.models as models
+
+
+router = APIRouter(tags=["export"], prefix="/export")
+
+EXPORT_MEDIA_TYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+FORMAT_PATTERN = "^(arrow|parquet|ndjson|csv)$"
+
+
+def _stream_with_session(stream):
+    # The request session is closed before the body is streamed, the export opens its own
+    db = SessionLocal()
+    try:
+        yield from stream(db)
+    except Exception as e:
+        logging.error(f"Export failed while streaming: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+def _export_response(query, file_format: str, filename: str) -> StreamingResponse:
+    if file_format == 'ndjson':
+        stream = lambda db: stream_ndjson(db, query)
+    elif file_format == 'csv':
+        stream = lambda db: stream_csv(db, query)
+    else:
+        stream = lambda db: stream_export(db, query, file_format)
+
+    return StreamingResponse(
+        _stream_with_session(stream),
+        media_type=EXPORT_MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{file_format}"'}
+    )
+
+
+@router.get("/transactions", status_code=status.HTTP_200_OK)
+def export_transactions(
+        format: str = Query('arrow', pattern=FORMAT_PATTERN),
+        exec_month: Optional[List[str]] = Query(None),
+        category: Optional[str] = None,
+        mapped_category: Optional[str] = None,
+        receiver: Optional[str] = None,
+        sign: Optional[str] = Query(None, pattern="^(income|expense)$")):
+    """
+    Filtered transactions table as an Arrow IPC stream (default), Parquet, NDJSON
+    or CSV, built from a Core SELECT. Load Arrow with
+    pyarrow.ipc.open_stream(content).read_pandas() and Parquet with pandas.read_parquet.
+    """
+    transactions = models.Transaction.__table__
+
+    try:
+        query = filter_transactions(select(transactions), exec_month, category, mapped_category, receiver, sign)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    query = query.order_by(transactions.c.date, transactions.c.id)
+    return _export_response(query, format, "transactions")
+
+
+@router.get("/tables/{table_name}", status_code=status.HTTP_200_OK)
+def export_table(table_name: str, format: str = Query('ndjson', pattern=FORMAT_PATTERN)):
+    """
+    One ledger table (transactions, a wallet or portfolio) in date order.
+    """
+    try:
+        query = ledger_query(table_name)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+    return _export_response(query, format, table_name)
+
+
+@router.get("/ledger", status_code=status.HTTP_200_OK)
+def export_ledger(table: Optional[List[str]] = Query(None)):
+    """
+    Full ledger as one NDJSON stream: transactions, every wallet history and the
+    portfolio summary (or only the tables given as `table`), each line tagged
+    with its table. Rows are read with a server-side cursor, memory use does not
+    depend on the number of rows.
+    """
+    table_names = table or list(LEDGER_MODELS)
+    unknown = [table_name for table_name in table_names if table_name not in LEDGER_MODELS]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown tables: {unknown}")
+
+    return StreamingResponse(
+        _stream_with_session(lambda db: stream_ledger(db, table_names)),
+        media_type=EXPORT_MEDIA_TYPES['ndjson'],
+        headers={"Content-Disposition": 'attachment; filename="ledger.ndjson"'}
+    )
@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from decimal import Decimal
 
 router = APIRouter(tags=["generali_endpoints"], prefix="/generali")
@@ -14,25 +20,38 @@ router = APIRouter(tags=["generali_endpoints"], prefix="/generali")
 
 @router.put("/update_generali/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_generali(id: int, generali_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_generali/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = generali_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.Generali, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Generali.date).filter(models.Generali.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Generali, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_generali", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_generali(db: Session = Depends(get_sql_db)):
-        generali_entries = db.query(models.Generali).order_by(asc(models.Generali.date)).all()
-        print(generali_entries)
-        return generali_entries
+@router.get("/get_all_generali", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("generali")])
+async def get_all_generali(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_generali(db), response)
+
 
-@router.get("/get_id_generali/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("generali")
+async def read_all_generali(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Generali, schemas.PortfolioTransaction)).order_by(asc(models.Generali.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_generali/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("generali")])
 def get_all_generali(id: int, db: Session = Depends(get_sql_db)):
         id_generali = db.query(models.Generali).filter(models.Generali.id == id).first()
         return id_generali
@@ -45,13 +64,15 @@ def add_many_generali(generali_entries: List[schemas.PortfolioTransaction] ,db:
     generali_dicts = []
     for entity in generali_entries:
             
-            generali_dict = entity.model_dump()
+            generali_dict = entity.model_dump(exclude_none=True)
             generali_dicts.append(generali_dict)
             
     
-    transaction_service.add_transactions(models.Generali, generali_dicts)
+    result = transaction_service.bulk_add_transactions(models.Generali, generali_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in generali_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -77,6 +98,7 @@ def add_generali_transaction(generali: schemas.PortfolioTransaction, db: Session
     
 
     db.add(generali_entry)
+    refresh_portfolio_dates(db, [generali_entry.date])
     db.commit()
     db.refresh(generali_entry)
 
@@ -95,11 +117,14 @@ def delete_ogenerali(transaction_date: str, db: Session = Depends(get_sql_db)):
     print(f'DEBUG: models.Generali.date is type: {type(models.Generali.date)} with value: {generali}')
 
     try:
+        deleted_date = generali.date
         db.delete(generali)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return None
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
 
         
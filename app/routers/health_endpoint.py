@@ -0,0 +1,29 @@
+from fastapi import status, APIRouter
+
+from app.database import engine, async_engine
+from app.db_pool import pool_status, DB_PGBOUNCER
+from app.read_cache import read_cache
+
+
+router = APIRouter(tags=["health"], prefix="/health")
+
+
+@router.get("/cache", status_code=status.HTTP_200_OK)
+def cache_stats():
+    """
+    Hit / miss / eviction counters of the read cache of this worker process.
+    """
+    return read_cache.stats()
+
+
+@router.get("/pool", status_code=status.HTTP_200_OK)
+def pool_stats():
+    """
+    Checked-out, idle and overflow connections and checkout wait times of the
+    sync and async engine pools of this worker process.
+    """
+    return {
+        "pgbouncer": DB_PGBOUNCER,
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool)
+    }
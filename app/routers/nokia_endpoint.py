@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from decimal import Decimal
 
 router = APIRouter(tags=["nokia_endpoints"], prefix="/nokia")
@@ -14,25 +20,38 @@ router = APIRouter(tags=["nokia_endpoints"], prefix="/nokia")
 
 @router.put("/update_nokia/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_nokia(id: int, nokia_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_nokia/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = nokia_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.Nokia, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Nokia.date).filter(models.Nokia.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Nokia, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_nokia", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_nokia(db: Session = Depends(get_sql_db)):
-        nokia_entries = db.query(models.Nokia).order_by(asc(models.Nokia.date)).all()
-        print(nokia_entries)
-        return nokia_entries
+@router.get("/get_all_nokia", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("nokia")])
+async def get_all_nokia(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_nokia(db), response)
+
 
-@router.get("/get_id_nokia/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("nokia")
+async def read_all_nokia(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Nokia, schemas.PortfolioTransaction)).order_by(asc(models.Nokia.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_nokia/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("nokia")])
 def get_all_nokia(id: int, db: Session = Depends(get_sql_db)):
         id_nokia = db.query(models.Nokia).filter(models.Nokia.id == id).first()
         return id_nokia
@@ -45,13 +64,15 @@ def add_many_nokia(nokia_entries: List[schemas.PortfolioTransaction] ,db: Sessio
     nokia_dicts = []
     for entity in nokia_entries:
             
-            nokia_dict = entity.model_dump()
+            nokia_dict = entity.model_dump(exclude_none=True)
             nokia_dicts.append(nokia_dict)
             
     
-    transaction_service.add_transactions(models.Nokia, nokia_dicts)
+    result = transaction_service.bulk_add_transactions(models.Nokia, nokia_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in nokia_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -77,6 +98,7 @@ def add_nokia_transaction(nokia: schemas.PortfolioTransaction, db: Session = Dep
     
 
     db.add(nokia_entry)
+    refresh_portfolio_dates(db, [nokia_entry.date])
     db.commit()
     db.refresh(nokia_entry)
 
@@ -98,11 +120,14 @@ def delete_nokia(transaction_date: str, db: Session = Depends(get_sql_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'nokia with id: {id} has not been found')
       
     try:
+        deleted_date = nokia.date
         db.delete(nokia)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return f'Entry with date: {nokia} deleted succesfully!'
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
 
         
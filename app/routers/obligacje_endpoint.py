@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from decimal import Decimal
 
 router = APIRouter(tags=["obligacje_endpoints"], prefix="/obligacje")
@@ -15,25 +21,38 @@ router = APIRouter(tags=["obligacje_endpoints"], prefix="/obligacje")
 
 @router.put("/update_obligacje/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_obligacje(id: int, obligacje_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_obligacje/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = obligacje_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.obligacje, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Obligacje.date).filter(models.Obligacje.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Obligacje, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_obligacje", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_obligacje(db: Session = Depends(get_sql_db)):
-        obligacje_entries = db.query(models.Obligacje).order_by(asc(models.Obligacje.date)).all()
-        print(obligacje_entries)
-        return obligacje_entries
+@router.get("/get_all_obligacje", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("obligacje")])
+async def get_all_obligacje(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_obligacje(db), response)
+
 
-@router.get("/get_id_obligacje/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("obligacje")
+async def read_all_obligacje(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Obligacje, schemas.PortfolioTransaction)).order_by(asc(models.Obligacje.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_obligacje/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("obligacje")])
 def get_all_obligacje(id: int, db: Session = Depends(get_sql_db)):
         id_obligacje = db.query(models.Obligacje).filter(models.Obligacje.id == id).first()
         return id_obligacje
@@ -46,13 +65,15 @@ def add_many_obligacje(obligacje_entries: List[schemas.PortfolioTransaction] ,db
     obligacje_dicts = []
     for entity in obligacje_entries:
             
-            obligacje_dict = entity.model_dump()
+            obligacje_dict = entity.model_dump(exclude_none=True)
             obligacje_dicts.append(obligacje_dict)
             
     
-    transaction_service.add_transactions(models.Obligacje, obligacje_dicts)
+    result = transaction_service.bulk_add_transactions(models.Obligacje, obligacje_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in obligacje_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -78,6 +99,7 @@ def add_obligacje_transaction(obligacje: schemas.PortfolioTransaction, db: Sessi
     
 
     db.add(obligacje_entry)
+    refresh_portfolio_dates(db, [obligacje_entry.date])
     db.commit()
     db.refresh(obligacje_entry)
 
@@ -99,11 +121,14 @@ def delete_nokia(transaction_date: str, db: Session = Depends(get_sql_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'obligacja with id: {id} has not been found')
       
     try:
+        deleted_date = obligacja.date
         db.delete(obligacja)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return f'Entry with date: {obligacja} deleted succesfully!'
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
 
         
@@ -1,66 +1,53 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import desc, func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response, Query
+from sqlalchemy import desc, func, asc, select
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, dumps, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
-import pandas as pd
-from datetime import datetime
+from app.portfolio_service import WALLET_MODELS, portfolio_series, rebuild_portfolio, aligned_portfolio, latest_snapshots_query, wallet_allocation
+from datetime import date, datetime
 
 router = APIRouter(tags=["portfolio_endpoints"], prefix="/portfolio")
 
-model_classes = {
-    'Etoro': models.Etoro,
-    'Xtb': models.Xtb,
-    'Vienna': models.Vienna,
-    'Revolut': models.Revolut,
-    'Obligacje': models.Obligacje,
-    'Generali': models.Generali,
-    'Nokia': models.Nokia
-}
-
-@router.get("/get_profit",response_model=schemas.ReturnProfit, status_code=status.HTTP_200_OK)
-def get_profit(db: Session = Depends(get_sql_db)):
-    profit_query = db.query(models.PortfolioSummary.Profit).order_by(desc(models.PortfolioSummary.Date)).first()
-    second_profit_query = db.query(models.PortfolioSummary.Profit).order_by(desc(models.PortfolioSummary.Date)).offset(1).first()
-
-    delta = profit_query[0] - second_profit_query[0]
-    delta = float(delta)
-    profit_query = float(profit_query[0])
-
-    print(f'Val: {profit_query} type: {type(profit_query)}')
-    print(f'Val: {delta} type: {type(delta)}')
-
-    return {"profit": profit_query, "profit_delta": delta}
-    
-               
-
-
-@router.get("/calculate_perc/", status_code=status.HTTP_200_OK)
-def calculate_perc(db: Session = Depends(get_sql_db), model_classes=model_classes):
-     
-    wallet_totals = {}
-    total_portfolio_amount = 0.0
-
-    for wallet_name, wallet_model in model_classes.items():
-          total_amount = db.query(wallet_model.total_amount).order_by(desc(wallet_model.date)).first()
-          total_amount = float(total_amount[0])
+model_classes = WALLET_MODELS
+WALLET_TABLES = tuple(model.__tablename__ for model in model_classes.values())
 
-          wallet_totals[wallet_name] = total_amount
-          total_portfolio_amount += total_amount
+@router.get("/get_profit",response_model=schemas.ReturnProfit, status_code=status.HTTP_200_OK, dependencies=[etag_for("portfolio")])
+@cached_read("portfolio")
+async def get_profit(db: AsyncSession = Depends(get_async_db)):
+    """
+    Profit of the latest portfolio snapshot and its change since the one
+    before, 0 when there is only one snapshot.
+    """
+    result = await db.execute(select(models.PortfolioSummary.Profit).order_by(desc(models.PortfolioSummary.Date)).limit(2))
+    profits = [float(profit) for profit in result.scalars()]
 
+    if not profits:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Portfolio has no snapshots yet')
 
+    delta = profits[0] - profits[1] if len(profits) == 2 else 0.0
+    return {"profit": profits[0], "profit_delta": delta}
+    
+               
 
 
-    wallet_percentages = {wallet:(amount / total_portfolio_amount) * 100 for wallet, amount in wallet_totals.items()}
-
-    df = pd.DataFrame(list(wallet_percentages.items()), columns=['Wallet', 'Percentage'])
-    df['Percentage'] = df['Percentage'].round(2)
-
-    return df.to_dict(orient='records')
+@router.get("/calculate_perc/", status_code=status.HTTP_200_OK, dependencies=[etag_for(*WALLET_TABLES)])
+@cached_read(*WALLET_TABLES)
+async def calculate_perc(as_of: Optional[date] = None, db: AsyncSession = Depends(get_async_db), model_classes=model_classes):
+    """
+    Share of every wallet in the portfolio at its latest snapshot, or at its
+    last snapshot on or before `as_of`. All wallets are read with one query.
+    """
+    result = await db.execute(latest_snapshots_query(model_classes, as_of))
+    return wallet_allocation(result.all())
 
 @router.put("/update_portfolio/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_portfolio(id: int, portfolio_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
@@ -76,60 +63,84 @@ def update_portfolio(id: int, portfolio_body: schemas.UpdatePortfolioTransaction
        
        
 
-@router.get("/get_all_portfolio", response_model=List[schemas.PortfolioSummarySchema], status_code=status.HTTP_200_OK)
-def get_all_portfolio(db: Session = Depends(get_sql_db)):
-        portfolio_entries = db.query(models.PortfolioSummary).order_by(asc(models.PortfolioSummary.date)).all()
-        print(portfolio_entries)
-        return portfolio_entries
+@router.get("/get_all_portfolio", response_model=List[schemas.PortfolioSummarySchema], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("portfolio")])
+async def get_all_portfolio(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_portfolio(db), response)
 
-@router.get("/get_id_portfolio/{id}", response_model=schemas.PortfolioSummarySchema, status_code=status.HTTP_200_OK)
-def get_all_portfolio(id: int, db: Session = Depends(get_sql_db)):
-        id_portfolio = db.query(models.PortfolioSummary).filter(models.PortfolioSummary.id == id).first()
-        return id_portfolio
 
+@cached_read("portfolio")
+async def read_all_portfolio(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.PortfolioSummary, schemas.PortfolioSummarySchema)).order_by(asc(models.PortfolioSummary.Date))
+        return await query_json(db, query)
 
 
+@router.get("/summary", response_model=List[schemas.PortfolioSummarySchema], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("portfolio")])
+async def get_portfolio_summary(response: Response, db: AsyncSession = Depends(get_async_db)):
+        """
+        Portfolio time series in date order. Read only: wallet writes keep the
+        portfolio rows of their dates up to date, POST /portfolio/rebuild
+        recomputes the whole table.
+        """
+        return json_response(await read_all_portfolio(db), response)
 
-@router.post("/generate_summary_overall",response_model=List[schemas.PortfolioSummarySchema], status_code=status.HTTP_200_OK)
-def generate_summary_overall(db: Session = Depends(get_sql_db), model_classes = model_classes):
 
-    data_frames = []
+@router.post("/rebuild", status_code=status.HTTP_200_OK)
+def rebuild_portfolio_summary(db: Session = Depends(get_sql_db)):
+    """
+    Recomputes the portfolio table from all wallet tables.
+    """
+    try:
+        rows = rebuild_portfolio(db)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'Portfolio rebuild failed: {str(e)}')
+
+    return {"status": "success", "rows": rows}
+
+
+@router.get("/aligned", response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for(*WALLET_TABLES)])
+def get_aligned_portfolio(
+        response: Response,
+        calendar: str = Query('daily', pattern="^(daily|weekly|monthly)$"),
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        value: str = Query('total_amount', pattern="^(total_amount|deposit_amount)$"),
+        db: Session = Depends(get_sql_db)):
+    """
+    Wallet values on a daily, weekly or monthly calendar, each wallet carried
+    forward from its last snapshot on or before the date, plus their Total.
+    Works when wallets are updated on different days.
+    """
+    try:
+        return json_response(read_aligned_portfolio(db, calendar, start, end, value), response)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    N = db.query(model_classes['Etoro']).count()
 
-    for i in range(N):
-         
-        list_of_totals, list_of_dates, list_of_deposits = [], [], []
+@cached_read(*WALLET_TABLES)
+def read_aligned_portfolio(db: Session, calendar: str, start: Optional[date], end: Optional[date], value: str) -> bytes:
+    return dumps(aligned_portfolio(db, calendar, start, end, value))
 
-        for model_name, model_class in model_classes.items():
-            
-            total = db.query(model_class.total_amount).order_by(asc(model_class.date)).offset(i).first()
-            db_date = db.query(model_class.date).order_by(asc(model_class.date)).offset(i).first()
-            deposit = db.query(model_class.deposit_amount).order_by(asc(model_class.date)).offset(i).first()
+@router.get("/get_id_portfolio/{id}", response_model=schemas.PortfolioSummarySchema, status_code=status.HTTP_200_OK, dependencies=[etag_for("portfolio")])
+async def get_id_portfolio(id: int, db: AsyncSession = Depends(get_async_db)):
+        id_portfolio = await db.get(models.PortfolioSummary, id)
+        return id_portfolio
 
-            if total and db_date and deposit:
-                list_of_totals.append(float(total[0]))
-                list_of_dates.append(db_date[0])
-                list_of_deposits.append(float(deposit[0]))
-    
-        iteration_df = pd.DataFrame({
-            "Total_Value": list_of_totals,
-            "Date": list_of_dates,
-            "Deposits": list_of_deposits
-        })
 
-        data_frames.append(iteration_df)
-    
-    output_df = pd.concat(data_frames, ignore_index=True)
 
-    grouped_df = output_df.groupby('Date').sum().reset_index()
 
-    list_df = grouped_df.to_dict(orient='records')
+@router.post("/generate_summary_overall",response_model=List[schemas.PortfolioSummarySchema], status_code=status.HTTP_200_OK)
+def generate_summary_overall(db: Session = Depends(get_sql_db), model_classes = model_classes):
+    """
+    Sums total and deposit amounts of all wallets per snapshot date with one
+    UNION ALL + GROUP BY query and inserts the dates missing from portfolio.
+    Kept for older clients, use GET /portfolio/summary to read the portfolio.
+    """
+    list_df = portfolio_series(db, model_classes)
 
     transaction_service = TransactionService(db)
-    inserted_data = transaction_service.add_transactions(model_class=models.PortfolioSummary, transaction_data=list_df)
+    # bulk_add_transactions logs the inserted / skipped counts
+    transaction_service.bulk_add_transactions(model_class=models.PortfolioSummary, transaction_data=list_df, conflict_column='Date')
 
-    print(f'OUTPUT: {inserted_data}')
     return list_df
    
 
@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from decimal import Decimal
 
 router = APIRouter(tags=["revolut_endpoints"], prefix="/revolut")
@@ -14,25 +20,38 @@ router = APIRouter(tags=["revolut_endpoints"], prefix="/revolut")
 
 @router.put("/update_revolut/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_revolut(id: int, revolut_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_revolut/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = revolut_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.revolut, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Revolut.date).filter(models.Revolut.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Revolut, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_revolut", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_revolut(db: Session = Depends(get_sql_db)):
-        revolut_entries = db.query(models.Revolut).order_by(asc(models.Revolut.date)).all()
-        print(revolut_entries)
-        return revolut_entries
+@router.get("/get_all_revolut", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("revolut")])
+async def get_all_revolut(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_revolut(db), response)
+
 
-@router.get("/get_id_revolut/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("revolut")
+async def read_all_revolut(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Revolut, schemas.PortfolioTransaction)).order_by(asc(models.Revolut.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_revolut/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("revolut")])
 def get_all_revolut(id: int, db: Session = Depends(get_sql_db)):
         id_revolut = db.query(models.Revolut).filter(models.Revolut.id == id).first()
         return id_revolut
@@ -45,13 +64,15 @@ def add_many_revolut(revolut_entries: List[schemas.PortfolioTransaction] ,db: Se
     revolut_dicts = []
     for entity in revolut_entries:
             
-            revolut_dict = entity.model_dump()
+            revolut_dict = entity.model_dump(exclude_none=True)
             revolut_dicts.append(revolut_dict)
             
     
-    transaction_service.add_transactions(models.Revolut, revolut_dicts)
+    result = transaction_service.bulk_add_transactions(models.Revolut, revolut_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in revolut_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -77,6 +98,7 @@ def add_revolut_transaction(revolut: schemas.PortfolioTransaction, db: Session =
     
 
     db.add(revolut_entry)
+    refresh_portfolio_dates(db, [revolut_entry.date])
     db.commit()
     db.refresh(revolut_entry)
 
@@ -95,9 +117,12 @@ def delete_revolut(transaction_date: str, db: Session = Depends(get_sql_db)):
     print(f'DEBUG: models.Revolut.date is type: {type(models.Revolut.date)} with value: {revolut}')
 
     try:
+        deleted_date = revolut.date
         db.delete(revolut)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return None
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
\ No newline at end of file
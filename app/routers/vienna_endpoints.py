@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from datetime import datetime
 from decimal import Decimal
 
@@ -15,30 +21,43 @@ router = APIRouter(tags=["vienna_endpoints"], prefix="/vienna")
 
 @router.put("/update_vienna/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_vienna(id: int, vienna_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_vienna/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = vienna_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
-
-    updated_transaction = transaction_service.update_transaction(model_class=models.vienna, id=id, transaction_data=update_data)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
+
+    previous_date = db.query(models.Vienna.date).filter(models.Vienna.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Vienna, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
 
-@router.get("/get_all_dates", response_model=List[schemas.ReturnDate], status_code=status.HTTP_200_OK)
+@router.get("/get_all_dates", response_model=List[schemas.ReturnDate], status_code=status.HTTP_200_OK, dependencies=[etag_for("vienna")])
 def get_all_dates(db: Session = Depends(get_sql_db)):
         vienna_entries = db.query(models.Vienna.date).all()
         
         return vienna_entries
 
-@router.get("/get_all_vienna", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_vienna(db: Session = Depends(get_sql_db)):
-        vienna_entries = db.query(models.Vienna).order_by(asc(models.Vienna.date)).all()
-        
-        return vienna_entries
+@router.get("/get_all_vienna", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("vienna")])
+async def get_all_vienna(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_vienna(db), response)
 
-@router.get("/get_id_vienna/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+
+@cached_read("vienna")
+async def read_all_vienna(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Vienna, schemas.PortfolioTransaction)).order_by(asc(models.Vienna.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_vienna/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("vienna")])
 def get_all_vienna(id: int, db: Session = Depends(get_sql_db)):
         id_vienna = db.query(models.Vienna).filter(models.Vienna.id == id).first()
         return id_vienna
@@ -51,13 +70,15 @@ def add_many_vienna(vienna_entries: List[schemas.PortfolioTransaction] ,db: Sess
     vienna_dicts = []
     for entity in vienna_entries:
             
-            vienna_dict = entity.model_dump()
+            vienna_dict = entity.model_dump(exclude_none=True)
             vienna_dicts.append(vienna_dict)
             
     
-    transaction_service.add_transactions(models.Vienna, vienna_dicts)
+    result = transaction_service.bulk_add_transactions(models.Vienna, vienna_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in vienna_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -83,6 +104,7 @@ def add_vienna_transaction(vienna: schemas.PortfolioTransaction, db: Session = D
     
 
     db.add(vienna_entry)
+    refresh_portfolio_dates(db, [vienna_entry.date])
     db.commit()
     db.refresh(vienna_entry)
 
@@ -104,11 +126,14 @@ def delete_vienna_transaction(transaction_date: str, db: Session = Depends(get_s
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'Vienna with date: {transaction_date} has not been found')
       
       try:
+            deleted_date = vienna_entry.date
             db.delete(vienna_entry)
+            refresh_portfolio_dates(db, [deleted_date])
             db.commit()
             return f'Entry with date: {transaction_date} deleted succesfully!'
       
       except Exception as e:
+            db.rollback()
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
             
 
@@ -1,12 +1,18 @@
-from fastapi import status, Depends, Body, HTTPException, Request, APIRouter
-from sqlalchemy import func, asc
+from fastapi import status, Depends, Body, HTTPException, Request, APIRouter, Response
+from sqlalchemy import func, asc, select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. csv_handler import CSVHandler
-from app.database import get_sql_db
+from app.database import get_sql_db, get_async_db
+from app.fast_json import FastJSONResponse, json_response, query_json, schema_columns
+from app.http_cache import etag_for
+from app.read_cache import cached_read
 import app.schemas as schemas
 import app.models as models
 from app.transaction_service import TransactionService
+from app.portfolio_service import refresh_portfolio_dates
 from decimal import Decimal
 
 router = APIRouter(tags=["xtb_endpoints"], prefix="/xtb")
@@ -14,25 +20,38 @@ router = APIRouter(tags=["xtb_endpoints"], prefix="/xtb")
 
 @router.put("/update_xtb/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_202_ACCEPTED)
 def update_xtb(id: int, xtb_body: schemas.UpdatePortfolioTransaction = Body(...), db: Session = Depends(get_sql_db)):
-    print(f'FUNCTION:PUT: /update_xtb/{id} ')
     transaction_service = TransactionService(db)
 
     update_data = xtb_body.model_dump(exclude_unset=True)
     update_data.pop("id", None)
+    # initial_amount is not a wallet column
+    update_data.pop("initial_amount", None)
 
-    updated_transaction = transaction_service.update_transaction(model_class=models.Xtb, id=id, transaction_data=update_data)
+    previous_date = db.query(models.Xtb.date).filter(models.Xtb.id == id).scalar()
+    updated_transaction = transaction_service.update_transaction(model_class=models.Xtb, id=id, transaction_data=update_data, commit=False)
+    try:
+        refresh_portfolio_dates(db, [previous_date, update_data.get("date", previous_date)])
+        db.commit()
+        db.refresh(updated_transaction)
+    except SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with updating the DB: {str(e)}')
     
     return updated_transaction
        
        
 
-@router.get("/get_all_xtb", response_model=List[schemas.PortfolioTransaction], status_code=status.HTTP_200_OK)
-def get_all_xtb(db: Session = Depends(get_sql_db)):
-        xtb_entries = db.query(models.Xtb).order_by(asc(models.Xtb.date)).all()
-        print(xtb_entries)
-        return xtb_entries
+@router.get("/get_all_xtb", response_model=List[schemas.PortfolioTransaction], response_class=FastJSONResponse, status_code=status.HTTP_200_OK, dependencies=[etag_for("xtb")])
+async def get_all_xtb(response: Response, db: AsyncSession = Depends(get_async_db)):
+        return json_response(await read_all_xtb(db), response)
+
 
-@router.get("/get_id_xtb/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK)
+@cached_read("xtb")
+async def read_all_xtb(db: AsyncSession) -> bytes:
+        query = select(*schema_columns(models.Xtb, schemas.PortfolioTransaction)).order_by(asc(models.Xtb.date))
+        return await query_json(db, query)
+
+@router.get("/get_id_xtb/{id}", response_model=schemas.PortfolioTransaction, status_code=status.HTTP_200_OK, dependencies=[etag_for("xtb")])
 def get_all_xtb(id: int, db: Session = Depends(get_sql_db)):
         id_xtb = db.query(models.Xtb).filter(models.Xtb.id == id).first()
         return id_xtb
@@ -45,13 +64,15 @@ def add_many_xtb(xtb_entries: List[schemas.PortfolioTransaction] ,db: Session =
     xtb_dicts = []
     for entity in xtb_entries:
             
-            xtb_dict = entity.model_dump()
+            xtb_dict = entity.model_dump(exclude_none=True)
             xtb_dicts.append(xtb_dict)
             
     
-    transaction_service.add_transactions(models.Xtb, xtb_dicts)
+    result = transaction_service.bulk_add_transactions(models.Xtb, xtb_dicts, commit=False)
+    refresh_portfolio_dates(db, [entity.date for entity in xtb_entries])
+    db.commit()
 
-    return {"status": "success", "message": "Transactions added successfully."}
+    return {"status": "success", "message": "Transactions added successfully.", "inserted": result["inserted"], "skipped": result["skipped"]}
        
     
        
@@ -77,6 +98,7 @@ def add_xtb_transaction(xtb: schemas.PortfolioTransaction, db: Session = Depends
     
 
     db.add(xtb_entry)
+    refresh_portfolio_dates(db, [xtb_entry.date])
     db.commit()
     db.refresh(xtb_entry)
 
@@ -98,9 +120,12 @@ def delete_xtb(transaction_date: str, db: Session = Depends(get_sql_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'obligacja with id: {id} has not been found')
       
     try:
+        deleted_date = xtb.date
         db.delete(xtb)
+        refresh_portfolio_dates(db, [deleted_date])
         db.commit()
         return f'Entry with date: {xtb} deleted succesfully!'
         
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f'There has been a problem with deleting from DB: {str(e)}')
\ No newline at end of file
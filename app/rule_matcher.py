@@ -0,0 +1,77 @@
+import re
+import pandas as pd
+
+
+class RuleMatcher:
+    """
+    Compiled receiver -> category matcher built once from a rules dictionary.
+
+    All patterns are joined into a single regex, so every distinct receiver is
+    scanned once instead of once per category. The result is the same as
+    applying the rules category by category in dict order: the first matching
+    category wins and its name is then passed through the remaining categories.
+    """
+
+    def __init__(self, rules: dict) -> None:
+        self.rules = {category: list(patterns) for category, patterns in rules.items()}
+
+        self._pattern_rank = {}
+        for rank, patterns in enumerate(self.rules.values()):
+            for pattern in patterns:
+                self._pattern_rank.setdefault(pattern, rank)
+
+        self._labels = self._resolve_labels(self.rules)
+
+        # Alternatives are ordered by category rank, so at any position the
+        # regex reports the highest priority pattern starting there.
+        ordered_patterns = sorted(self._pattern_rank, key=self._pattern_rank.get)
+        if ordered_patterns:
+            self._regex = re.compile('(?=(' + '|'.join(re.escape(p) for p in ordered_patterns) + '))')
+        else:
+            self._regex = None
+
+
+    @staticmethod
+    def _resolve_labels(rules):
+        """
+        Resolves the final label of every category, i.e. what the category name
+        turns into when it is checked against the categories that come after it.
+        """
+        categories = list(rules.items())
+        labels = []
+
+        for rank, (category, _) in enumerate(categories):
+            label = category
+            for later_category, later_patterns in categories[rank + 1:]:
+                if any(pattern in label for pattern in later_patterns):
+                    label = later_category
+            labels.append(label)
+
+        return labels
+
+
+    @property
+    def labels(self) -> dict:
+        return dict(zip(self.rules, self._labels))
+
+
+    def match(self, receiver):
+        if self._regex is None or not isinstance(receiver, str):
+            return None
+
+        ranks = [self._pattern_rank[hit] for hit in self._regex.findall(receiver)]
+        if not ranks:
+            return None
+
+        return self._labels[min(ranks)]
+
+
+    def categorize(self, receivers: pd.Series) -> pd.Series:
+        """
+        Maps every receiver to its category, receivers without a matching rule
+        are returned unchanged. Each distinct receiver is matched only once.
+        """
+        mapping = {receiver: self.match(receiver) for receiver in receivers.dropna().unique()}
+        mapped = receivers.map(mapping)
+
+        return mapped.where(mapped.notna(), receivers)
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from app.rule_matcher import RuleMatcher
+
+
+RULES_FILE = 'rules_dict.json'
+
+
+class RuleSet:
+    """
+    Immutable snapshot of the rules at a given version. Updates never modify a
+    RuleSet, they create a new one, so a request can keep using the snapshot it
+    started with. The compiled matcher is built once per version.
+    """
+
+    def __init__(self, version: int, rules: dict) -> None:
+        self.version = version
+        self.rules = rules
+        self._matcher = None
+        self._lock = threading.Lock()
+
+    @property
+    def matcher(self) -> RuleMatcher:
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    self._matcher = RuleMatcher(self.rules)
+        return self._matcher
+
+
+class RuleStore:
+    """
+    Process wide, thread safe store of the receiver rules kept in rules_dict.json.
+    The file is parsed again only when its mtime changes and every change is
+    written atomically (temp file + rename).
+    """
+
+    def __init__(self, path: str = RULES_FILE) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._rule_set = RuleSet(0, {})
+        self._mtime = None
+
+
+    def current(self) -> RuleSet:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError as e:
+            logging.error(f" File not found: {str(e)}")
+            return self._rule_set
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+
+        return self._rule_set
+
+
+    def _reload(self, mtime):
+        # A broken file keeps the previous snapshot, it is retried once the mtime changes again
+        self._mtime = mtime
+        try:
+            with open(self.path, 'r') as file:
+                rules = json.load(file)
+        except json.JSONDecodeError as e:
+            logging.error(f" Error while decoding JSON: {str(e)}")
+            return
+        except Exception as e:
+            logging.error(f" Unexpected error loading rules: {str(e)}")
+            return
+
+        self._rule_set = RuleSet(self._rule_set.version + 1, rules)
+        logging.info(f"Rules loaded from {self.path}, version {self._rule_set.version}")
+
+
+    def add_rule(self, rule_key: str, rule_value: str) -> RuleSet:
+        if not isinstance(rule_value, str):
+            raise ValueError(f"Rule value must be a string. Got  {type(rule_value).__name__} instead")
+
+        self.current()
+
+        with self._lock:
+            rules = {category: list(patterns) for category, patterns in self._rule_set.rules.items()}
+            rules.setdefault(rule_key, []).append(rule_value)
+
+            self._write(rules)
+
+            self._rule_set = RuleSet(self._rule_set.version + 1, rules)
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+        return self._rule_set
+
+
+    def _file_mode(self) -> int:
+        try:
+            return os.stat(self.path).st_mode & 0o777
+        except FileNotFoundError:
+            return 0o644
+
+    def _write(self, rules):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.rules_', suffix='.json')
+
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump(rules, file, indent=2)
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp creates the file as 0600, keep the permissions of the replaced file
+            os.chmod(tmp_path, self._file_mode())
+            os.replace(tmp_path, self.path)
+            logging.info("Rule JSON file saved successfully")
+        except Exception as e:
+            logging.error(f"File I/O error: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+rule_store = RuleStore()
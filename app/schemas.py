@@ -1,6 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from datetime import date
-from typing import Optional
+from typing import Optional, List, Dict
 
 class UpdatePortfolioTransaction(BaseModel):
 
@@ -37,6 +37,7 @@ class TransactionSchema(BaseModel):
     transaction_type: str
     category: str
     exec_month: str
+    mapped_category: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -93,11 +94,90 @@ class PortfolioSummarySchema(BaseModel):
 
 
 
+class AddRuleSchema(BaseModel):
+    rule_key: str
+    rule_value: str
+
+
+class TransactionPage(BaseModel):
+     items: List[TransactionSchema]
+     next_cursor: Optional[str] = None
+
+
+class AggregateGroup(BaseModel):
+     key: str
+     income: float
+     expenses: float
+     income_count: int
+     expense_count: int
+     net: float
+
+
+class TransactionAggregate(BaseModel):
+     group_by: str
+     exec_months: List[str]
+     income: float
+     expenses: float
+     income_count: int
+     expense_count: int
+     net: float
+     groups: List[AggregateGroup]
+     top_expenses: List[AggregateGroup]
+     top_income: List[AggregateGroup]
+
+
+class TimelineMonth(BaseModel):
+     exec_month: str
+     count: int
+
+
+class MonthlyRollupSchema(BaseModel):
+     exec_month: str
+     category: str
+     income: float
+     expenses: float
+     income_count: int
+     expense_count: int
+     count: int
+
+     model_config = ConfigDict(from_attributes=True)
+
+
 class ADDCSVResponse(BaseModel):
      status: str
      records_processed: int
+     records_inserted: int = 0
+     records_skipped: int = 0
 
      model_config = ConfigDict(from_attributes=True)
 
-     
-     
\ No newline at end of file
+
+class FileImportResult(BaseModel):
+     filename: str
+     status: str
+     records_parsed: int = 0
+     duplicates_across_files: int = 0
+     detail: Optional[str] = None
+
+
+class ADDCSVManyResponse(BaseModel):
+     status: str
+     records_processed: int
+     records_inserted: int = 0
+     records_skipped: int = 0
+     files: List[FileImportResult]
+
+
+class IngestJobStatus(BaseModel):
+     id: str
+     status: str
+     filename: Optional[str] = None
+     created_at: str
+     finished_at: Optional[str] = None
+     bytes_total: int
+     progress: float
+     rows_parsed: int
+     inserted: int
+     skipped: int
+     timings: Dict[str, float]
+     errors: List[str]
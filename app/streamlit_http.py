@@ -0,0 +1,27 @@
+import streamlit as st
+import requests
+from urllib.parse import urlencode
+
+
+def conditional_get(url, params=None):
+    """
+    GET that sends back the ETag of the last 200 answer for the same url and params
+    and reuses its body when the API answers 304 Not Modified.
+    Returns (status_code, json body or None), a 304 is reported as 200.
+    """
+    etag_cache = st.session_state.setdefault("etag_cache", {})
+    key = f"{url}?{urlencode(params or {}, doseq=True)}"
+
+    headers = {"If-None-Match": etag_cache[key][0]} if key in etag_cache else {}
+    response = requests.get(url, params=params, headers=headers)
+
+    if response.status_code == 304 and key in etag_cache:
+        return 200, etag_cache[key][1]
+
+    if response.status_code != 200:
+        return response.status_code, None
+
+    body = response.json()
+    if "ETag" in response.headers:
+        etag_cache[key] = (response.headers["ETag"], body)
+    return 200, body
@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from streamlit_http import conditional_get
 import pandas as pd
 
 import plotly.express as px
@@ -9,36 +10,36 @@ import plotly.graph_objects as go
 FASTAPI_URL = 'http://127.0.0.1:8000'
 
 def get_profit():
-    response = requests.get(f"{FASTAPI_URL}/portfolio/get_profit")
-    if response.status_code == 200:
-        return response.json()
+    status_code, data = conditional_get(f"{FASTAPI_URL}/portfolio/get_profit")
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
 
 
-def generate_summary_overall():
-    response = requests.post(f"{FASTAPI_URL}/portfolio/generate_summary_overall")
-    if response.status_code == 200:
-        return response.json()
+def get_portfolio_summary():
+    status_code, data = conditional_get(f"{FASTAPI_URL}/portfolio/summary")
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
 
 def fetch_portfolio_summary():
-    response = requests.get(f"{FASTAPI_URL}/portfolio/get_all_portfolio")
-    if response.status_code == 200:
-        return response.json()
+    status_code, data = conditional_get(f"{FASTAPI_URL}/portfolio/get_all_portfolio")
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
     
 def get_portfolio_perc():
-    response = requests.get(f"{FASTAPI_URL}/portfolio/calculate_perc/")
-    if response.status_code == 200:
-        return response.json()
+    status_code, data = conditional_get(f"{FASTAPI_URL}/portfolio/calculate_perc/")
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch response data: {response.status_code}")
+        st.error(f"Failed to fetch response data: {status_code}")
         return []
     
 def add_portfolio_entry():
@@ -123,7 +124,7 @@ def create_portfolio_summary_chart(df):
 
 def render_summary_section():
 
-    portfolio_summary = generate_summary_overall()
+    portfolio_summary = get_portfolio_summary()
     st.markdown("<h1 style='text-align: center;'>Portfolio summary</h1>", unsafe_allow_html=True)
     
 
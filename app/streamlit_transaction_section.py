@@ -1,8 +1,9 @@
 import streamlit as st
 import requests
+from streamlit_http import conditional_get
 import pandas as pd
+import pyarrow as pa
 import matplotlib.pyplot as plt
-from csv_handler import CSVHandler
 
 FASTAPI_URL = 'http://127.0.0.1:8000'
 
@@ -10,30 +11,91 @@ FASTAPI_URL = 'http://127.0.0.1:8000'
 def add_csv_to_db(file):
 
     files = {"file": (file.name, file, "text/csv")}
-    response = requests.post(f"{FASTAPI_URL}/transactions/add_csv", files=files)
-    if response.status_code == 201:
+    response = requests.post(f"{FASTAPI_URL}/transactions/add_csv_async", files=files)
+    if response.status_code == 202:
         return response.json()
     else:
         st.error(f"Failed to process the POST request: {response.status_code} \n with details: {response.json().get('detail', 'Unknown error')}")
         return None
-    
-def get_all_transactions():
-    response = requests.get(f"{FASTAPI_URL}/transactions/get_transactions/")
+
+def get_import_job(job_id):
+    response = requests.get(f"{FASTAPI_URL}/transactions/jobs/{job_id}")
     if response.status_code == 200:
         return response.json()
     else:
+        st.error(f"Failed to fetch import job: {response.status_code}")
+        return None
+
+def show_import_job(uploaded_file):
+    # The uploader keeps the file between reruns, post it only once and follow the job afterwards
+    import_jobs = st.session_state.setdefault("import_jobs", {})
+    upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+
+    if upload_key not in import_jobs:
+        job = add_csv_to_db(uploaded_file)
+        if job is None:
+            return None
+        import_jobs[upload_key] = job["id"]
+
+    job = get_import_job(import_jobs[upload_key])
+    if job is None:
+        return None
+
+    if job["status"] in ("queued", "running"):
+        st.progress(job["progress"], text=f"Importing {job['filename']}: {job['rows_parsed']} rows parsed")
+        st.button("Refresh import status")
+    elif job["status"] == "finished":
+        st.success(f"Imported {job['filename']}: {job['inserted']} new, {job['skipped']} already in DB")
+    else:
+        st.error(f"Import of {job['filename']} failed: {job['errors']}")
+
+    return job
+    
+def get_transactions_df(exec_months=None):
+    # Arrow IPC export, loaded column-wise into pandas without a JSON round trip
+    response = requests.get(f"{FASTAPI_URL}/export/transactions", params={"exec_month": exec_months or []})
+    if response.status_code != 200:
         st.error(f"Failed to fetch response data: {response.status_code}")
+        return pd.DataFrame()
 
-def get_timeline():
-    response = requests.get(f"{FASTAPI_URL}/transactions/get_timeline/")
-    if response.status_code == 200:
+    df = pa.ipc.open_stream(response.content).read_pandas()
+    df['amount'] = df['amount'].astype(float)
+    return df.drop(columns=['id', 'title', 'ref_number'])
+
+def get_aggregate(exec_months, group_by="mapped_category"):
+    params = {"exec_month": exec_months, "group_by": group_by}
+    status_code, data = conditional_get(f"{FASTAPI_URL}/transactions/aggregate", params=params)
+    if status_code == 200:
+        return data
+    else:
+        st.error(f"Failed to fetch aggregate: {status_code}")
+        return None
+
+def add_rule(rule_key, rule_value):
+    payload = {"rule_key": rule_key, "rule_value": rule_value}
+    response = requests.post(f"{FASTAPI_URL}/transactions/add_rule", json=payload)
+    if response.status_code == 201:
         return response.json()
     else:
-        st.error(f"Failed to fetch response data: {response.status_code}")
+        st.error(f"Failed to add rule: {response.status_code} \n with details: {response.json().get('detail', 'Unknown error')}")
+        return None
+
+def apply_mapped_category(df):
+    # mapped_category is computed by the API at ingest, rows without it keep their receiver
+    if 'mapped_category' in df.columns:
+        df['receiver'] = df['mapped_category'].fillna(df['receiver'])
+    return df
+
+def get_timeline():
+    # [{exec_month, count}] sorted by month
+    status_code, data = conditional_get(f"{FASTAPI_URL}/transactions/get_timeline")
+    if status_code == 200:
+        return data
+    else:
+        st.error(f"Failed to fetch response data: {status_code}")
 
 
 def render_transaction_section():
-    csv_handler = CSVHandler()
     df_tr = None
     tr_tab1, tr_tab2, tr_tab3 = st.tabs(["Load CSV", "Details of transactions", "Summary"])
 
@@ -44,32 +106,32 @@ def render_transaction_section():
         print(f'Uploaded file is: {uploaded_file}')
         print(f'2/2::: Code after file uploading')
 
-        all_transactions = get_all_transactions()
+        all_transactions = get_transactions_df()
         
 
         if uploaded_file is not None:
-            response = add_csv_to_db(uploaded_file)
-            if response is not None:
-                st.success(response)
-                all_transactions = get_all_transactions()
-                if all_transactions:
-                    df_tr = pd.DataFrame(all_transactions)
+            job = show_import_job(uploaded_file)
+            if job is not None:
+                all_transactions = get_transactions_df()
+                if not all_transactions.empty:
+                    df_tr = all_transactions
                     print("DataFrame created after file upload.")
 
         elif len(all_transactions) > 0:
-            df_tr = pd.DataFrame(all_transactions)
+            df_tr = all_transactions
 
         else:
             st.info("Please upload a CSV file")
 
         if df_tr is not None and not df_tr.empty:
-            df_tr = csv_handler.remove_dupl(df=df_tr)
-            time_lines = get_timeline()
-            # timelines = list(time_lines.values())
+            df_tr = apply_mapped_category(df_tr)
+            month_counts = {month["exec_month"]: month["count"] for month in get_timeline() or []}
+            time_lines = list(month_counts)
 
             timeline_selection = st.multiselect(
                 "Select timeline to display:",
                 time_lines,
+                format_func=lambda month: f"{month} ({month_counts[month]})",
                 key=f"transaction_timelines"
             )
 
@@ -77,7 +139,7 @@ def render_transaction_section():
 
             if timeline_selection:
                 print(f'Timeline selection is: {timeline_selection}')
-                filtered_df = df_tr[df_tr['exec_month'].isin(timeline_selection)]
+                filtered_df = apply_mapped_category(get_transactions_df(timeline_selection))
                 st.dataframe(filtered_df)
             else:
                 st.warning("No timeline selected. Showing all data.")
@@ -93,15 +155,16 @@ def render_transaction_section():
             timeline_selection_details = st.multiselect(
                 "Select timeline to display:",
                 time_lines,
+                format_func=lambda month: f"{month} ({month_counts[month]})",
                 key=f"timeline_selection_details"
             )
 
-            filtered_df_summary = df_tr[df_tr['exec_month'].isin(timeline_selection_details)]
+            aggregate = get_aggregate(timeline_selection_details) if timeline_selection_details else None
+            groups_df = pd.DataFrame(aggregate["groups"] if aggregate else [], columns=['key', 'income', 'expenses'])
 
             with tr_col1:
                 st.title(f'Expenses')
-                grouped_df = filtered_df_summary.groupby('receiver')['amount'].sum().reset_index()
-                grouped_df_exp = grouped_df[grouped_df['amount'] < 0]
+                grouped_df_exp = groups_df[groups_df['expenses'] < 0][['key', 'expenses']]
                 grouped_df_exp.columns = ['Reciever', 'Value']
 
                 # Reseting index
@@ -113,8 +176,7 @@ def render_transaction_section():
 
             with tr_col2:
                 st.title(f'Income')
-                grouped_df = filtered_df_summary.groupby('receiver')['amount'].sum().reset_index()
-                grouped_df_inc = grouped_df[grouped_df['amount'] > 0]
+                grouped_df_inc = groups_df[groups_df['income'] > 0][['key', 'income']]
                 grouped_df_inc.columns = ['Reciever', 'Value']
 
                 # Reseting index
@@ -125,14 +187,12 @@ def render_transaction_section():
                 st.dataframe(grouped_df_inc)
 
             with met_col1:
-                if timeline_selection_details:
-                    sum_of_exp = round(grouped_df_exp['Value'].sum(), 2)
-                    st.metric(label='Expenses', value=sum_of_exp)
+                if aggregate:
+                    st.metric(label='Expenses', value=round(aggregate["expenses"], 2))
 
             with met_col2:
-                if timeline_selection_details:
-                    sum_of_inc = round(grouped_df_inc['Value'].sum(), 2)
-                    st.metric(label='Income', value=sum_of_inc)
+                if aggregate:
+                    st.metric(label='Income', value=round(aggregate["income"], 2))
 
             with met_col3:
                 st.write("Savings")
@@ -144,7 +204,7 @@ def render_transaction_section():
 
             if add_right.button("Add Rule", use_container_width=True):
                 print(f"Pressing add rule button adding following key:{rule_key} and val:{rule_val}")
-                csv_handler.add_rule(rule_key=rule_key, rule_value=rule_val)
+                add_rule(rule_key=rule_key, rule_value=rule_val)
                 st.rerun()
 
     with tr_tab3:
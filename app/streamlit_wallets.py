@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+from streamlit_http import conditional_get
 import pandas as pd
 
 import plotly.express as px
@@ -49,23 +50,23 @@ delete_transaction_endpoints = {
 
 def get_wallet_all(tab):
     endpoint = wallet_endpoints[tab]
-    response = requests.get(f"{FASTAPI_URL}{endpoint}")
+    status_code, data = conditional_get(f"{FASTAPI_URL}{endpoint}")
 
-    if response.status_code == 200:
-        return response.json()
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
 
 def get_wallet_dates(tab):
 
     endpoint = date_wallet_endpoints[tab]
-    response = requests.get(f"{FASTAPI_URL}{endpoint}")
+    status_code, data = conditional_get(f"{FASTAPI_URL}{endpoint}")
 
-    if response.status_code == 200:
-        return response.json()
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
     
 
@@ -73,11 +74,11 @@ def fetch_wallet_totals(tab):
 
     endpoint = wallet_endpoints[tab]
 
-    response = requests.get(f"{FASTAPI_URL}{endpoint}")
-    if response.status_code == 200:
-        return response.json()
+    status_code, data = conditional_get(f"{FASTAPI_URL}{endpoint}")
+    if status_code == 200:
+        return data
     else:
-        st.error(f"Failed to fetch data: {response.status_code}")
+        st.error(f"Failed to fetch data: {status_code}")
         return []
     
 def add_transcation(tab, data):
@@ -1,29 +1,101 @@
+from sqlalchemy import select, tuple_, func, Select
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from app import models
-from typing import Type, List, Dict, Any, TypeVar
-from app.database import Base
+from typing import Type, List, Dict, Any, TypeVar, Optional, Tuple
+from app.database import Base, dialect_insert
+from app.rollup import apply_rollup_delta
+from app.arrow_export import table_to_arrow
+from app.bloom_filter import BloomFilter
 from fastapi import HTTPException, status
+from decimal import Decimal
+from datetime import date
+import base64
+import json
 import pandas as pd
+import logging
+import os
+import threading
 
 
 SQLAlchemyModel = TypeVar('SQLAlchemyModel', bound=Base)
 
+BULK_BATCH_SIZE = 1000
+
+USE_REF_BLOOM_FILTER = os.environ.get("USE_REF_BLOOM_FILTER", "0") == "1"
+REF_BLOOM_CAPACITY = int(os.environ.get("REF_BLOOM_CAPACITY", 1_000_000))
+
+_ref_bloom = None
+_ref_bloom_lock = threading.Lock()
+
+TRANSACTION_SIGNS = ('income', 'expense')
+
+def filter_transactions(query: Select, exec_months: Optional[List[str]] = None, category: Optional[str] = None,
+                        mapped_category: Optional[str] = None, receiver: Optional[str] = None, sign: Optional[str] = None) -> Select:
+    """
+    Adds the transaction list filters (all optional) to a SELECT over transactions.
+    """
+    if sign is not None and sign not in TRANSACTION_SIGNS:
+        raise ValueError(f"Unknown sign: {sign}, expected one of {TRANSACTION_SIGNS}")
+
+    transaction = models.Transaction.__table__
+
+    if exec_months:
+        query = query.where(transaction.c.exec_month.in_(exec_months))
+    if category is not None:
+        query = query.where(transaction.c.category == category)
+    if mapped_category is not None:
+        query = query.where(transaction.c.mapped_category == mapped_category)
+    if receiver is not None:
+        query = query.where(transaction.c.receiver == receiver)
+    if sign == 'income':
+        query = query.where(transaction.c.amount > 0)
+    elif sign == 'expense':
+        query = query.where(transaction.c.amount < 0)
+
+    return query
+
+
+# group_by dimensions of aggregate_transactions, mapped_category falls back to
+# the receiver like in the Streamlit tables
+AGGREGATE_DIMENSIONS = {
+    'receiver': models.Transaction.receiver,
+    'mapped_category': func.coalesce(models.Transaction.mapped_category, models.Transaction.receiver),
+    'category': models.Transaction.category,
+    'transaction_type': models.Transaction.transaction_type,
+}
+
+
+def encode_cursor(last_date: date, last_id: int) -> str:
+    payload = json.dumps({"date": last_date.isoformat(), "id": last_id})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    """
+    Opaque page token -> (date, id) of the last row of the previous page.
+    Raises ValueError for tokens that were not produced by encode_cursor.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return date.fromisoformat(payload["date"]), int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
 class TransactionService:
     def __init__(self, db: Session) -> None:
         self.db = db
 
 
     def create_df_from_table(self, db: Session,  model_class: Type[SQLAlchemyModel]) -> pd.DataFrame:
-        query = db.query(model_class).all()
-        data = [row.__dict__ for row in query]
-
-        for item in data:
-            item.pop('_sa_instance_state', None)
-
-        df = pd.DataFrame(data)
-        print(df)
-        return df    
+        """
+        Whole table as a DataFrame, built column-wise through Arrow from a Core SELECT.
+        """
+        table = table_to_arrow(db, select(model_class.__table__))
+        df = table.to_pandas()
+        logging.debug(f"create_df_from_table {model_class.__tablename__}: {len(df)} rows")
+        return df
    
     def add_transactions(self, model_class: Type[SQLAlchemyModel], transaction_data: List[Dict[str, Any]]) -> List[SQLAlchemyModel]:
 
@@ -46,9 +118,235 @@ class TransactionService:
                     raise
         
         return successfully_added
+
+    def _insert_rows(self, model_class: Type[SQLAlchemyModel], transaction_data: List[Dict[str, Any]], conflict_column: str = None,
+                     batch_size: int = BULK_BATCH_SIZE, returning: Optional[List[Any]] = None) -> List[Any]:
+        """
+        INSERT ... ON CONFLICT DO NOTHING RETURNING in batches, without committing.
+        Returns the `returning` columns (default: id) of the rows actually inserted.
+        """
+        insert = dialect_insert(self.db)
+        returning = returning or [model_class.id]
+        inserted_rows = []
+
+        # A multi-row VALUES needs the same keys in every row, rows with another
+        # key set (e.g. with and without id) are inserted by their own statements
+        key_groups = {}
+        for row in transaction_data:
+            key_groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        for rows in key_groups.values():
+            for start in range(0, len(rows), batch_size):
+                stmt = insert(model_class).values(rows[start:start + batch_size])
+                if conflict_column:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=[conflict_column])
+                else:
+                    stmt = stmt.on_conflict_do_nothing()
+
+                inserted_rows.extend(self.db.execute(stmt.returning(*returning)).fetchall())
+
+        return inserted_rows
+
+
+    def bulk_add_transactions(self, model_class: Type[SQLAlchemyModel], transaction_data: List[Dict[str, Any]], conflict_column: str = None, batch_size: int = BULK_BATCH_SIZE,
+                              commit: bool = True) -> Dict[str, int]:
+        """
+        Inserts all rows in one transaction using INSERT ... ON CONFLICT DO NOTHING RETURNING.
+        Rows hitting the unique constraint on conflict_column are skipped instead of being
+        rolled back one by one. Returns the number of inserted and skipped rows.
+        commit=False leaves the commit to the caller, for writes that must land together.
+        """
+        if not transaction_data:
+            return {"inserted": 0, "skipped": 0}
+
+        try:
+            inserted = len(self._insert_rows(model_class, transaction_data, conflict_column, batch_size))
+            if commit:
+                self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logging.error(f"Bulk insert into {model_class.__tablename__} failed: {str(e)}")
+            raise
+
+        skipped = len(transaction_data) - inserted
+        logging.info(f"Bulk insert into {model_class.__tablename__}: {inserted} inserted, {skipped} skipped")
+        return {"inserted": inserted, "skipped": skipped}
     
     
 
+    def _known_ref_numbers(self) -> BloomFilter:
+        """
+        Process wide Bloom filter of ref_numbers already in the DB, loaded once on
+        first use. It can miss rows inserted by other processes, which only means
+        they are skipped by ON CONFLICT instead of by the pre-insert dedup.
+        """
+        global _ref_bloom
+        if _ref_bloom is None:
+            with _ref_bloom_lock:
+                if _ref_bloom is None:
+                    bloom = BloomFilter(REF_BLOOM_CAPACITY)
+                    query = select(models.Transaction.ref_number).execution_options(yield_per=10000)
+                    bloom.add_many(self.db.execute(query).scalars())
+                    _ref_bloom = bloom
+                    logging.info(f"Loaded {bloom.count} known ref_numbers into Bloom filter")
+        return _ref_bloom
+
+
+    def filter_existing(self, df: pd.DataFrame, use_bloom: bool = USE_REF_BLOOM_FILTER) -> pd.DataFrame:
+        """
+        Anti-joins a parsed statement against the transactions table. Existing
+        ref_numbers are fetched for the statement's date range with one indexed
+        query and removed with a vectorized isin. When no ref_number hits the
+        Bloom filter the statement is new and the query is skipped.
+        """
+        if df.empty:
+            return df
+
+        if use_bloom:
+            bloom = self._known_ref_numbers()
+            if not any(ref_number in bloom for ref_number in df['ref_number']):
+                return df
+
+        dates = pd.to_datetime(df['date'], errors='coerce')
+        if dates.isna().all():
+            return df
+
+        query = select(models.Transaction.ref_number).where(
+            models.Transaction.date.between(dates.min().date(), dates.max().date())
+        )
+        existing = self.db.execute(query).scalars().all()
+
+        return df[~df['ref_number'].isin(existing)]
+
+
+    @staticmethod
+    def _statement_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        Converts a parsed statement (see CSVHandler.iter_chunks) to insert parameters:
+        datetime64 date -> date, int64 grosze amount -> Decimal with 2 places.
+        """
+        return df.assign(
+            date=pd.to_datetime(df['date']).dt.date,
+            amount=[Decimal(int(grosze)).scaleb(-2) for grosze in df['amount']]
+        ).to_dict(orient='records')
+
+
+    def ingest_transactions(self, df: pd.DataFrame, use_bloom: bool = USE_REF_BLOOM_FILTER) -> Dict[str, int]:
+        """
+        Inserts a parsed statement chunk: rows already in the DB are dropped up front
+        by filter_existing, the rest is inserted together with its monthly rollup
+        delta in one transaction. Rows without a valid date can not be stored and
+        are counted as skipped.
+        """
+        invalid_dates = df['date'].isna()
+        if invalid_dates.any():
+            logging.error(f"Skipping {int(invalid_dates.sum())} rows without a valid date: {list(df.loc[invalid_dates, 'ref_number'])}")
+
+        new_df = self.filter_existing(df[~invalid_dates], use_bloom=use_bloom)
+        transaction = models.Transaction
+
+        try:
+            inserted_rows = self._insert_rows(
+                transaction, self._statement_records(new_df), conflict_column='ref_number',
+                returning=[transaction.exec_month, transaction.category, transaction.amount]
+            )
+            apply_rollup_delta(self.db, added=inserted_rows)
+            self.db.commit()
+        except SQLAlchemyError as e:
+            self.db.rollback()
+            logging.error(f"Ingest into transactions failed: {str(e)}")
+            raise
+
+        if use_bloom:
+            self._known_ref_numbers().add_many(new_df['ref_number'])
+
+        inserted = len(inserted_rows)
+        logging.info(f"Ingested {len(df)} rows: {len(df) - len(new_df)} already in DB, {inserted} inserted")
+        return {"inserted": inserted, "skipped": len(df) - inserted}
+
+
+    def get_transactions_page(self, limit: int, cursor: Optional[str] = None, exec_months: Optional[List[str]] = None,
+                              category: Optional[str] = None, mapped_category: Optional[str] = None,
+                              receiver: Optional[str] = None, sign: Optional[str] = None,
+                              columns: Optional[List] = None) -> Tuple[List[Any], Optional[str]]:
+        """
+        One page of transactions, newest first, ordered by (date, id). The cursor is
+        the position of the last row of the previous page, so every page is an index
+        range scan no matter how deep it is. Returns the rows and the next cursor
+        (None on the last page).
+
+        With `columns` the rows are Core tuples of those columns followed by date
+        and id instead of Transaction objects.
+        """
+        transaction = models.Transaction
+        selected = select(transaction) if columns is None else select(*columns, transaction.date, transaction.id)
+        query = filter_transactions(selected, exec_months, category, mapped_category, receiver, sign)
+
+        if cursor is not None:
+            query = query.where(tuple_(transaction.date, transaction.id) < tuple_(*decode_cursor(cursor)))
+
+        query = query.order_by(transaction.date.desc(), transaction.id.desc()).limit(limit + 1)
+        result = self.db.execute(query)
+        rows = result.scalars().all() if columns is None else result.all()
+
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last.date, last.id) if columns is None else encode_cursor(*last[-2:])
+
+
+    def aggregate_transactions(self, group_by: str, exec_months: Optional[List[str]] = None, top_n: int = 10) -> Dict[str, Any]:
+        """
+        Income / expense totals and counts per `group_by` value, computed by a single
+        GROUP BY query with FILTER aggregates. Overall totals and the top_n groups by
+        expenses and by income are derived from the grouped rows.
+        """
+        if group_by not in AGGREGATE_DIMENSIONS:
+            raise ValueError(f"Unknown group_by: {group_by}, expected one of {list(AGGREGATE_DIMENSIONS)}")
+
+        amount = models.Transaction.amount
+        key = AGGREGATE_DIMENSIONS[group_by].label('key')
+
+        query = select(
+            key,
+            func.coalesce(func.sum(amount).filter(amount > 0), 0).label('income'),
+            func.coalesce(func.sum(amount).filter(amount < 0), 0).label('expenses'),
+            func.count().filter(amount > 0).label('income_count'),
+            func.count().filter(amount < 0).label('expense_count'),
+        ).group_by(key)
+
+        if exec_months:
+            query = query.where(models.Transaction.exec_month.in_(exec_months))
+
+        groups = [
+            {
+                "key": row.key,
+                "income": row.income,
+                "expenses": row.expenses,
+                "income_count": row.income_count,
+                "expense_count": row.expense_count,
+                "net": row.income + row.expenses
+            }
+            for row in self.db.execute(query)
+        ]
+
+        totals = {
+            field: sum(group[field] for group in groups)
+            for field in ("income", "expenses", "income_count", "expense_count", "net")
+        }
+
+        return {
+            "group_by": group_by,
+            "exec_months": exec_months or [],
+            **totals,
+            "groups": sorted(groups, key=lambda group: group["key"]),
+            "top_expenses": sorted((g for g in groups if g["expense_count"]), key=lambda group: group["expenses"])[:top_n],
+            "top_income": sorted((g for g in groups if g["income_count"]), key=lambda group: group["income"], reverse=True)[:top_n]
+        }
+
+
     def add_transaction(self, model_class: Type[SQLAlchemyModel], transaction_data: Dict[str, Any]) -> SQLAlchemyModel:
         new_transaction = model_class(**transaction_data)
         self.db.add(new_transaction)
@@ -57,7 +355,10 @@ class TransactionService:
 
         return new_transaction
     
-    def update_transaction(self, model_class: Type[SQLAlchemyModel], id: int, transaction_data: Dict[str, Any]) -> SQLAlchemyModel:
+    def update_transaction(self, model_class: Type[SQLAlchemyModel], id: int, transaction_data: Dict[str, Any], commit: bool = True) -> SQLAlchemyModel:
+        """
+        commit=False leaves the commit (and the refresh of the returned row) to the caller.
+        """
         transaction_query = self.db.query(model_class).filter(model_class.id == id)
         transaction_value = transaction_query.first()
 
@@ -66,9 +367,11 @@ class TransactionService:
         
         try:
             transaction_query.update(transaction_data, synchronize_session=False)
-            self.db.commit()
-            self.db.refresh(transaction_value)
+            if commit:
+                self.db.commit()
+                self.db.refresh(transaction_value)
         except Exception as e:
+            self.db.rollback()
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Following error occured {str(e)}')
        
         return transaction_value
@@ -0,0 +1,58 @@
+"""
+Throughput of the read endpoints of a running API under 50 and 200 concurrent
+clients. Run it against the same database before and after switching the
+endpoints between the sync session and the async (asyncpg) one.
+
+ETags are not sent, every request is a full read. Set READ_CACHE_SIZE=0 on the
+server to measure the database path instead of the read cache.
+
+Usage (from the repo root, API started with uvicorn app.main:app):
+    python -m benchmarks.bench_concurrency http://localhost:8000 50 200
+"""
+import asyncio
+import sys
+from statistics import quantiles
+from time import perf_counter
+
+import httpx
+
+
+PATHS = [
+    "/transactions/get_transactions_page?limit=100",
+    "/transactions/get_summary",
+    "/portfolio/get_all_portfolio",
+    "/portfolio/calculate_perc/",
+    "/xtb/get_all_xtb",
+    "/etoro/get_all_etoro",
+]
+REQUESTS_PER_CLIENT = 20
+
+
+async def client_loop(client: httpx.AsyncClient, latencies: list, errors: list) -> None:
+    for i in range(REQUESTS_PER_CLIENT):
+        path = PATHS[i % len(PATHS)]
+        start = perf_counter()
+        response = await client.get(path)
+        latencies.append(perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def run(base_url: str, concurrency: int) -> None:
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        start = perf_counter()
+        await asyncio.gather(*(client_loop(client, latencies, errors) for _ in range(concurrency)))
+        elapsed = perf_counter() - start
+
+    cuts = quantiles(latencies, n=100)
+    print(f"{concurrency:>4} clients  {len(latencies) / elapsed:8.0f} req/s  "
+          f"p50 {cuts[49] * 1000:7.1f} ms  p95 {cuts[94] * 1000:7.1f} ms  errors {len(errors)}")
+
+
+if __name__ == '__main__':
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+    for concurrency in [int(arg) for arg in sys.argv[2:]] or [50, 200]:
+        asyncio.run(run(base_url, concurrency))
@@ -0,0 +1,33 @@
+"""
+CSVHandler pipeline with the pandas C parser vs the pyarrow reader on the
+same synthetic statements.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_csv_engines 10000 100000 1000000
+"""
+import sys
+from io import BytesIO
+from time import perf_counter
+
+from app.csv_handler import CSVHandler, CSV_ENGINES
+from benchmarks.bench_csv_pipeline import synthetic_statement
+
+
+def run(rows: int) -> None:
+    content = synthetic_statement(rows)
+    print(f"{rows:>9} rows ({len(content) / 2**20:.1f} MiB)")
+
+    for engine in CSV_ENGINES:
+        handler = CSVHandler()
+
+        started = perf_counter()
+        parsed = sum(len(chunk) for chunk in handler.iter_chunks(BytesIO(content), engine=engine))
+        elapsed = perf_counter() - started
+
+        stages = "  ".join(f"{stage} {seconds:.3f}s" for stage, seconds in handler.timings.items())
+        print(f"{engine:>16}: {elapsed:7.3f}s  {parsed / elapsed:>12,.0f} rows/s  [{stages}]")
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]:
+        run(rows)
@@ -0,0 +1,50 @@
+"""
+Throughput of the CSVHandler statement pipeline on synthetic bank statements.
+
+Usage (from the repo root):
+    python -m benchmarks.bench_csv_pipeline 10000 100000
+"""
+import random
+import sys
+from io import BytesIO
+from time import perf_counter
+
+from app.csv_handler import CSVHandler
+
+
+HEADER = "Data księgowania;Data waluty;Nadawca / Odbiorca;Adres nadawcy / odbiorcy;Rachunek źródłowy;Rachunek docelowy;Tytułem;Kwota operacji;Waluta;Numer referencyjny;Typ operacji;Kategoria\n"
+RECEIVERS = ["ZABKA Z7582 K.1 WROCLAW", "AUCHAN POLSKA SP. Z  0 WROCLAW BIEL", "IKEA RETAIL SP. Z O. 0 KOBIERZYCE",
+             "BETCLIC                BORDEAUX", "Pekao", "LIDL SP. Z O.O.", "BOLT.EU/O/2408", "PRACODAWCA SP. Z O.O."]
+
+
+def synthetic_statement(rows: int, seed: int = 42) -> bytes:
+    random.seed(seed)
+    lines = [HEADER]
+    for i in range(rows):
+        day, month, year = random.randint(1, 28), random.randint(1, 12), random.randint(2019, 2024)
+        amount = random.randint(-500000, 500000)
+        złote, grosze = divmod(abs(amount), 100)
+        amount_text = f"{'-' if amount < 0 else ''}{złote:,}".replace(',', ' ') + f",{grosze:02d}"
+        lines.append(
+            f"{day:02d}.{month:02d}.{year};{day:02d}.{month:02d}.{year};{random.choice(RECEIVERS)};;"
+            f"'26124067681111001068644063;;*********3066106;{amount_text};PLN;'C{i:015d};TRANSAKCJA KARTĄ PŁATNICZĄ;Bez kategorii\n"
+        )
+    return "".join(lines).encode('utf-8')
+
+
+def run(rows: int) -> None:
+    content = synthetic_statement(rows)
+    handler = CSVHandler()
+
+    started = perf_counter()
+    parsed = sum(len(chunk) for chunk in handler.iter_chunks(BytesIO(content)))
+    elapsed = perf_counter() - started
+
+    print(f"{rows:>9} rows: {elapsed:7.3f}s  {parsed / elapsed:>12,.0f} rows/s")
+    for stage, seconds in handler.timings.items():
+        print(f"{'':>16}{stage:<18}{seconds:7.3f}s  {parsed / seconds if seconds else float('inf'):>12,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]:
+        run(rows)
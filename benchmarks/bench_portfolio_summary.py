@@ -0,0 +1,90 @@
+"""
+Portfolio time series over 10 years of wallet snapshots: the former per-row
+OFFSET loop of /portfolio/generate_summary_overall (3 queries per wallet and
+row) vs the single UNION ALL + GROUP BY query of portfolio_series, plus the
+as-of alignment of the wallets on a daily calendar (aligned_portfolio).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_portfolio_summary            # monthly and daily
+    python -m benchmarks.bench_portfolio_summary monthly
+"""
+import random
+import sys
+from datetime import date, timedelta
+from time import perf_counter
+
+import pandas as pd
+from sqlalchemy import create_engine, insert, asc
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.portfolio_service import WALLET_MODELS, portfolio_series, wallet_snapshot_frame, align_wallets
+
+
+CALENDARS = {
+    'monthly': [d.date() for d in pd.date_range("2015-01-31", periods=120, freq="ME")],
+    'daily': [date(2015, 1, 1) + timedelta(days=i) for i in range(3650)],
+}
+# The OFFSET loop is quadratic, above this many snapshots it is not run
+LEGACY_LIMIT = 1000
+
+
+def seed(session: Session, dates) -> None:
+    random.seed(42)
+    for model in WALLET_MODELS.values():
+        session.execute(insert(model), [
+            {"date": day, "total_amount": random.randint(1000, 100000) / 100, "deposit_amount": random.randint(1000, 100000) / 100}
+            for day in dates
+        ])
+    session.commit()
+
+
+def legacy_series(db: Session):
+    data_frames = []
+    N = db.query(WALLET_MODELS['Etoro']).count()
+
+    for i in range(N):
+        list_of_totals, list_of_dates, list_of_deposits = [], [], []
+        for model_class in WALLET_MODELS.values():
+            total = db.query(model_class.total_amount).order_by(asc(model_class.date)).offset(i).first()
+            db_date = db.query(model_class.date).order_by(asc(model_class.date)).offset(i).first()
+            deposit = db.query(model_class.deposit_amount).order_by(asc(model_class.date)).offset(i).first()
+            if total and db_date and deposit:
+                list_of_totals.append(float(total[0]))
+                list_of_dates.append(db_date[0])
+                list_of_deposits.append(float(deposit[0]))
+        data_frames.append(pd.DataFrame({"Total_Value": list_of_totals, "Date": list_of_dates, "Deposits": list_of_deposits}))
+
+    return pd.concat(data_frames, ignore_index=True).groupby('Date').sum().reset_index().to_dict(orient='records')
+
+
+def run(calendar: str) -> None:
+    dates = CALENDARS[calendar]
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+
+    with Session(engine) as session:
+        seed(session, dates)
+        print(f"{calendar}: {len(dates)} snapshots x {len(WALLET_MODELS)} wallets")
+
+        started = perf_counter()
+        series = portfolio_series(session)
+        print(f"  union all + group by  {perf_counter() - started:8.3f} s  {len(series)} dates")
+
+        frame = wallet_snapshot_frame(session)
+        started = perf_counter()
+        matrix = align_wallets(frame, 'daily')
+        print(f"  as-of align (daily)   {perf_counter() - started:8.3f} s  {matrix.shape[0]} x {matrix.shape[1]} matrix")
+
+        if len(dates) > LEGACY_LIMIT:
+            print(f"  offset loop           skipped (> {LEGACY_LIMIT} snapshots, {21 * len(dates)} queries)")
+            return
+
+        started = perf_counter()
+        legacy = legacy_series(session)
+        print(f"  offset loop           {perf_counter() - started:8.3f} s  {len(legacy)} dates")
+
+
+if __name__ == '__main__':
+    for calendar in sys.argv[1:] or list(CALENDARS):
+        run(calendar)
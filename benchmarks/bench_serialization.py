@@ -0,0 +1,71 @@
+"""
+Serializing a page of transactions: ORM objects validated through the
+TransactionPage response_model (what FastAPI does for a returned list) vs Core
+tuples encoded by orjson (the fast path of GET /transactions/get_transactions_page).
+
+Usage (from the repo root):
+    python -m benchmarks.bench_serialization 100000
+"""
+import random
+import sys
+from datetime import date, timedelta
+from time import perf_counter
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.fast_json import dumps, schema_columns
+import app.models as models
+import app.schemas as schemas
+
+
+def seed(session: Session, rows: int) -> None:
+    random.seed(42)
+    start = date(2015, 1, 1)
+    data = []
+    for i in range(rows):
+        day = start + timedelta(days=random.randint(0, 3650))
+        data.append({
+            "date": day, "receiver": f"Receiver {i % 500}", "title": "Zakup", "amount": random.randint(-50000, 50000) / 100,
+            "transaction_type": "Płatność kartą", "category": "Bez kategorii", "ref_number": f"REF{i:09d}",
+            "exec_month": day.strftime("%Y-%m"), "mapped_category": None
+        })
+    session.execute(insert(models.Transaction), data)
+    session.commit()
+
+
+def orm_page(session: Session, adapter: TypeAdapter) -> bytes:
+    transactions = session.execute(select(models.Transaction)).scalars().all()
+    page = adapter.validate_python({"items": transactions, "next_cursor": None}, from_attributes=True)
+    return adapter.dump_json(page)
+
+
+def core_page(session: Session) -> bytes:
+    columns = schema_columns(models.Transaction, schemas.TransactionSchema)
+    keys = [column.name for column in columns]
+    rows = session.execute(select(*columns)).all()
+    return dumps({"items": [dict(zip(keys, row)) for row in rows], "next_cursor": None})
+
+
+def run(rows: int) -> None:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    adapter = TypeAdapter(schemas.TransactionPage)
+
+    with Session(engine) as session:
+        seed(session, rows)
+        print(f"{rows:>9} transactions")
+
+        for name, page in (("orm + response_model", lambda: orm_page(session, adapter)), ("core + orjson", lambda: core_page(session))):
+            session.expunge_all()
+            started = perf_counter()
+            body = page()
+            elapsed = perf_counter() - started
+            print(f"  {name:<22} {elapsed:7.3f} s  {rows / elapsed:10.0f} rows/s  {len(body) / 2**20:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    for rows in [int(arg) for arg in sys.argv[1:]] or [100_000]:
+        run(rows)
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import data_versions, http_cache
+from app.data_versions import SharedVersionStore
+from app.database import Base
+import app.models as models
+
+
+@pytest.fixture
+def db_session():
+    # One shared in-memory connection, so a TestClient thread sees the same DB
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def shared_versions(monkeypatch):
+    # HTTP ETags on, versions in the data_versions table of a DB of their own
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    store = SharedVersionStore(engine, models.DataVersion.__table__)
+    monkeypatch.setattr(http_cache, "HTTP_ETAGS", True)
+    monkeypatch.setattr(http_cache, "ETAG_VERSIONS", "shared")
+    monkeypatch.setattr(http_cache, "shared_versions", store)
+    data_versions.share_versions(store)
+    try:
+        yield store
+    finally:
+        data_versions.share_versions(None)
+        engine.dispose()
@@ -0,0 +1,243 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.csv_handler import CSVHandler, DEFAULT_CSV_ENGINE
+from app.database import get_sql_db
+from app.read_cache import read_cache
+from app.rollup import rebuild_rollup
+from app.routers import db_operations, portfolio_endpoint, xtb_endpoints, etoro_endpoint
+from app.portfolio_service import WALLET_MODELS
+import app.models as models
+
+
+@pytest.fixture
+def client(db_session):
+    read_cache.clear()
+    app = FastAPI()
+    for module in (db_operations, portfolio_endpoint, xtb_endpoints, etoro_endpoint):
+        app.include_router(module.router)
+
+    def override_get_sql_db():
+        yield db_session
+
+    app.dependency_overrides[get_sql_db] = override_get_sql_db
+    yield TestClient(app)
+    read_cache.clear()
+
+
+def test_add_many_wallet_rows_with_and_without_id(client, db_session):
+
+    response = client.post("/xtb/add_many_xtb", json=[
+        {"id": 50, "date": "2024-01-31", "deposit_amount": 100, "total_amount": 110},
+        {"date": "2024-02-29", "deposit_amount": 100, "total_amount": 120},
+    ])
+    assert response.status_code == 201
+    assert response.json()["inserted"] == 2
+
+    response = client.post("/xtb/add_many_xtb", json=[
+        {"date": "2024-03-31", "deposit_amount": 100, "total_amount": 130},
+        {"id": 60, "date": "2024-04-30", "deposit_amount": 100, "total_amount": 140},
+    ])
+    assert response.status_code == 201
+
+    rows = db_session.query(models.Xtb).order_by(models.Xtb.date).all()
+    assert [row.date for row in rows] == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert rows[0].id == 50 and rows[3].id == 60
+
+
+def portfolio_rows(session):
+    return [(row.Date, float(row.Total_Value)) for row in session.query(models.PortfolioSummary).order_by(models.PortfolioSummary.Date)]
+
+
+def test_wallet_writes_refresh_the_portfolio_in_their_transaction(client, db_session):
+
+    client.post("/xtb/add_many_xtb", json=[{"date": "2024-01-31", "deposit_amount": 100, "total_amount": 110}])
+    client.post("/etoro/add_many_etoro", json=[{"date": "2024-01-31", "deposit_amount": 50, "total_amount": 40}])
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), 150.0)]
+
+    response = client.post("/xtb/add_xtb_transaction", json={"date": "2024-02-29", "deposit_amount": 10, "total_amount": 125})
+    assert response.status_code == 201
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), 150.0), (date(2024, 2, 29), 125.0)]
+
+    assert client.delete("/xtb/delete_xtb/2024-02-29").status_code == 200
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), 150.0)]
+
+
+def test_failed_portfolio_refresh_rolls_back_the_wallet_delete(client, db_session, monkeypatch):
+
+    client.post("/xtb/add_many_xtb", json=[{"date": "2024-01-31", "deposit_amount": 100, "total_amount": 110}])
+
+    def failing_refresh(db, dates):
+        raise SQLAlchemyError("portfolio unavailable")
+
+    monkeypatch.setattr(xtb_endpoints, "refresh_portfolio_dates", failing_refresh)
+    assert client.delete("/xtb/delete_xtb/2024-01-31").status_code == 500
+
+    assert db_session.query(models.Xtb).count() == 1
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), 110.0)]
+
+
+def test_wallet_update_moves_the_portfolio_date(client, db_session):
+
+    client.post("/xtb/add_many_xtb", json=[{"id": 7, "date": "2024-01-31", "deposit_amount": 100, "total_amount": 110}])
+
+    response = client.put("/xtb/update_xtb/7", json={"date": "2024-02-29", "initial_amount": None, "deposit_amount": 100, "total_amount": 130})
+    assert response.status_code == 202
+    assert response.json()["total_amount"] == 130.0
+    assert portfolio_rows(db_session) == [(date(2024, 2, 29), 130.0)]
+
+
+def test_failed_portfolio_refresh_rolls_back_the_wallet_update(client, db_session, monkeypatch):
+
+    client.post("/xtb/add_many_xtb", json=[{"id": 7, "date": "2024-01-31", "deposit_amount": 100, "total_amount": 110}])
+
+    def failing_refresh(db, dates):
+        raise SQLAlchemyError("portfolio unavailable")
+
+    monkeypatch.setattr(xtb_endpoints, "refresh_portfolio_dates", failing_refresh)
+    response = client.put("/xtb/update_xtb/7", json={"date": "2024-01-31", "initial_amount": None, "deposit_amount": 100, "total_amount": 500})
+    assert response.status_code == 500
+
+    db_session.expire_all()
+    assert float(db_session.get(models.Xtb, 7).total_amount) == 110.0
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), 110.0)]
+
+def test_aligned_portfolio_endpoint(client):
+
+    assert client.get("/portfolio/aligned").json() == []
+    empty = client.get("/portfolio/aligned", params={"calendar": "monthly", "start": "2024-01-01", "end": "2024-01-31"})
+    assert empty.status_code == 200
+    assert empty.json() == [{"date": "2024-01-31", **{wallet: None for wallet in WALLET_MODELS}, "Total": None}]
+
+    client.post("/xtb/add_many_xtb", json=[{"date": "2024-01-01", "deposit_amount": 100, "total_amount": 110}])
+    client.post("/etoro/add_many_etoro", json=[{"date": "2024-01-02", "deposit_amount": 50, "total_amount": 40}])
+
+    rows = client.get("/portfolio/aligned", params={"calendar": "daily", "end": "2024-01-03"}).json()
+    assert [(row["date"], row["Xtb"], row["Etoro"], row["Total"]) for row in rows] == [
+        ("2024-01-01", 110.0, None, 110.0), ("2024-01-02", 110.0, 40.0, 150.0), ("2024-01-03", 110.0, 40.0, 150.0)]
+
+    bad = client.get("/portfolio/aligned", params={"start": "2024-02-01", "end": "2024-01-01"})
+    assert bad.status_code == 400
+
+
+def test_add_csv_repeat_upload_skips_every_row(client, db_session):
+
+    with open("August.csv", "rb") as statement:
+        content = statement.read()
+
+    first = client.post("/transactions/add_csv", files={"file": ("August.csv", content, "text/csv")})
+    assert first.status_code == 201
+    assert first.json()["records_inserted"] == first.json()["records_processed"] == 146
+
+    repeat = client.post("/transactions/add_csv", files={"file": ("August.csv", content, "text/csv")})
+    assert repeat.status_code == 201
+    assert repeat.json()["records_inserted"] == 0 and repeat.json()["records_skipped"] == 146
+
+    assert db_session.query(models.Transaction).count() == 146
+    assert sum(row.count for row in db_session.query(models.TransactionMonthlyRollup)) == 146
+
+
+def test_add_csv_reports_repeated_ref_numbers_and_partial_imports(client, db_session, monkeypatch):
+
+    with open("August.csv", "rb") as statement:
+        header, *rows = statement.read().splitlines(keepends=True)
+
+    repeated = client.post("/transactions/add_csv", files={"file": ("August.csv", b"".join([header, *rows[:3], rows[0]]), "text/csv")})
+    assert repeated.status_code == 201
+    assert (repeated.json()["records_processed"], repeated.json()["records_inserted"], repeated.json()["records_skipped"]) == (4, 3, 1)
+
+    # chunks of 5 rows, the invalid amount is in the second one
+    monkeypatch.setattr(CSVHandler.iter_chunks, "__defaults__", (5, DEFAULT_CSV_ENGINE))
+    bad_row = rows[10].split(b";")
+    bad_row[7] = b"abc"
+    failed = client.post("/transactions/add_csv", files={"file": ("August.csv", b"".join([header, *rows[3:10], b";".join(bad_row)]), "text/csv")})
+    assert failed.status_code == 400
+    assert "5 rows of earlier chunks were imported" in failed.json()["detail"]
+    assert db_session.query(models.Transaction).count() == 8
+
+
+def test_add_csv_many_dedups_across_files(client, db_session):
+
+    with open("August.csv", "rb") as statement:
+        header, *rows = statement.read().splitlines(keepends=True)
+    first = b"".join([header, *rows[:100]])
+    second = b"".join([header, *rows[50:]])
+    malformed = "a;b\n1;2\n".encode("utf-8")
+
+    response = client.post("/transactions/add_csv_many", files=[
+        ("files", ("first.csv", first, "text/csv")),
+        ("files", ("second.csv", second, "text/csv")),
+        ("files", ("broken.csv", malformed, "text/csv")),
+    ])
+    assert response.status_code == 201
+    body = response.json()
+    assert body["status"] == "partial"
+    assert (body["records_processed"], body["records_inserted"], body["records_skipped"]) == (196, 146, 50)
+    assert [(file["status"], file["records_parsed"], file["duplicates_across_files"]) for file in body["files"][:2]] == [
+        ("success", 100, 0), ("success", 96, 50)]
+    assert body["files"][2]["status"] == "error"
+    assert db_session.query(models.Transaction).count() == 146
+
+    failed = client.post("/transactions/add_csv_many", files=[("files", ("broken.csv", malformed, "text/csv"))])
+    assert failed.status_code == 400
+    assert failed.json()["detail"][0]["status"] == "error"
+
+
+def add_transactions(session, rows):
+    session.add_all([
+        models.Transaction(date=date(2024, int(month[5:]), 1), receiver=receiver, title="Zakup", amount=Decimal(amount),
+                           transaction_type="Płatność kartą", category=category, ref_number=f"REF{index}", exec_month=month,
+                           mapped_category=category)
+        for index, (month, receiver, category, amount) in enumerate(rows)
+    ])
+    session.commit()
+
+
+def test_aggregate_endpoint(client, db_session):
+
+    add_transactions(db_session, [
+        ("2024-01", "Biedronka", "Food", "-30.00"),
+        ("2024-01", "Lidl", "Food", "-20.00"),
+        ("2024-01", "Employer", "Salary", "1000.00"),
+        ("2024-02", "Biedronka", "Food", "-5.00"),
+    ])
+
+    response = client.get("/transactions/aggregate", params={"group_by": "category", "exec_month": ["2024-01"], "top_n": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["income"], body["expenses"], body["net"]) == (1000.0, -50.0, 950.0)
+    assert [(group["key"], group["expense_count"]) for group in body["groups"]] == [("Food", 2), ("Salary", 0)]
+    assert [group["key"] for group in body["top_expenses"]] == ["Food"]
+
+    assert client.get("/transactions/aggregate", params={"group_by": "amount"}).status_code == 422
+
+
+def rollup_rows(session):
+    return [(row.exec_month, row.category, float(row.income), float(row.expenses), row.count)
+            for row in session.query(models.TransactionMonthlyRollup).order_by(models.TransactionMonthlyRollup.exec_month, models.TransactionMonthlyRollup.category)]
+
+
+def test_transaction_writes_keep_the_rollup(client, db_session):
+
+    add_transactions(db_session, [("2024-01", "Biedronka", "Food", "-30.00"), ("2024-01", "Employer", "Salary", "1000.00")])
+    rebuild_rollup(db_session)
+    food, salary = db_session.query(models.Transaction).order_by(models.Transaction.id).all()
+
+    response = client.put(f"/transactions/update_transaction/{food.id}", json={
+        "date": "2024-02-01", "receiver": "Biedronka", "amount": -40.0, "transaction_type": "Płatność kartą",
+        "category": "Food", "exec_month": "2024-02"
+    })
+    assert response.status_code == 200
+    assert rollup_rows(db_session) == [("2024-01", "Salary", 1000.0, 0.0, 1), ("2024-02", "Food", 0.0, -40.0, 1)]
+
+    assert client.patch(f"/transactions/partialupdate_transaction/{salary.id}", json={"amount": 1200.0}).status_code == 200
+    assert client.delete(f"/transactions/delete_transaction/{food.id}").status_code == 200
+
+    db_session.expire_all()
+    maintained = rollup_rows(db_session)
+    rebuild_rollup(db_session)
+    assert maintained == rollup_rows(db_session) == [("2024-01", "Salary", 1200.0, 0.0, 1)]
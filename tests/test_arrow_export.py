@@ -0,0 +1,103 @@
+import io
+import json
+import pytest
+import pandas as pd
+import pyarrow as pa
+from datetime import date
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.arrow_export import stream_export, arrow_schema
+from app.database import Base
+from app.routers import export_endpoint
+from app.transaction_service import TransactionService
+import app.models as models
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    session = factory()
+    TransactionService(session).bulk_add_transactions(models.Transaction, [
+        {
+            'date': date(2024, month, 1), 'receiver': 'ZABKA', 'title': 'Zakupy', 'amount': amount,
+            'transaction_type': 'KARTA', 'category': 'Jedzenie', 'ref_number': f"'C{month}",
+            'exec_month': f"2024-{month:02d}", 'mapped_category': None
+        }
+        for month, amount in [(6, -10.5), (7, 2500.0), (8, -0.01)]
+    ])
+    session.close()
+
+    yield factory
+    engine.dispose()
+
+
+def test_stream_export_arrow_round_trip(session_factory):
+
+    db = session_factory()
+    query = select(models.Transaction.__table__).order_by(models.Transaction.id)
+
+    content = b"".join(stream_export(db, query, 'arrow', batch_size=2))
+    df = pa.ipc.open_stream(content).read_pandas()
+
+    assert arrow_schema(query).field('amount').type == pa.decimal128(10, 2)
+    assert list(df['amount']) == [Decimal('-10.50'), Decimal('2500.00'), Decimal('-0.01')]
+    assert list(df['date']) == [date(2024, 6, 1), date(2024, 7, 1), date(2024, 8, 1)]
+    db.close()
+
+
+def test_create_df_from_table_uses_arrow(session_factory):
+
+    db = session_factory()
+    df = TransactionService(db).create_df_from_table(db, models.Transaction)
+
+    assert len(df) == 3
+    assert df['mapped_category'].isna().all()
+    db.close()
+
+
+def test_export_endpoint_filters_and_parquet(session_factory, monkeypatch):
+
+    monkeypatch.setattr(export_endpoint, 'SessionLocal', session_factory)
+    app = FastAPI()
+    app.include_router(export_endpoint.router)
+    client = TestClient(app)
+
+    response = client.get("/export/transactions", params={"format": "parquet", "sign": "expense", "exec_month": ["2024-06", "2024-07"]})
+
+    assert response.status_code == 200
+    df = pd.read_parquet(io.BytesIO(response.content))
+    assert list(df['ref_number']) == ["'C6"]
+
+    assert client.get("/export/transactions", params={"format": "xlsx"}).status_code == 422
+
+
+def test_ledger_export_ndjson_and_csv(session_factory, monkeypatch):
+
+    db = session_factory()
+    db.add(models.Xtb(date=date(2024, 7, 1), deposit_amount=100, total_amount=110.5))
+    db.commit()
+    db.close()
+
+    monkeypatch.setattr(export_endpoint, 'SessionLocal', session_factory)
+    app = FastAPI()
+    app.include_router(export_endpoint.router)
+    client = TestClient(app)
+
+    lines = [json.loads(line) for line in client.get("/export/ledger", params={"table": ["transactions", "xtb"]}).text.splitlines()]
+    assert [line["table"] for line in lines] == ["transactions"] * 3 + ["xtb"]
+    assert lines[0]["amount"] == "-10.50" and lines[0]["date"] == "2024-06-01"
+    assert lines[-1]["total_amount"] == "110.50"
+
+    csv_lines = client.get("/export/tables/xtb", params={"format": "csv"}).text.splitlines()
+    assert csv_lines == ["id;date;deposit_amount;total_amount", "1;2024-07-01;100.00;110.50"]
+
+    assert client.get("/export/tables/users").status_code == 404
+    assert client.get("/export/ledger", params={"table": "users"}).status_code == 400
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from datetime import date
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+pytest.importorskip("aiosqlite")
+
+from app.database import Base, get_async_db
+from app.read_cache import cached_read, read_cache
+from app.routers import xtb_endpoints, db_operations, portfolio_endpoint
+import app.models as models
+
+
+@pytest.fixture
+def client():
+    read_cache.clear()
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    AsyncTestSession = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with AsyncTestSession() as session:
+            session.add_all([
+                models.Xtb(date=date(2024, 2, 1), deposit_amount=Decimal("100.00"), total_amount=Decimal("120.00")),
+                models.Xtb(date=date(2024, 1, 1), deposit_amount=Decimal("100.00"), total_amount=Decimal("110.00")),
+                *[models.Transaction(date=date(2024, 1, day), receiver=f"Shop {day}", title="Zakup", amount=Decimal("-10.50"),
+                                     transaction_type="Płatność kartą", category="Bank", ref_number=f"REF{day}", exec_month="2024-01")
+                  for day in range(1, 4)],
+                models.TransactionMonthlyRollup(exec_month="2024-01", category="Bank", income=Decimal("50.00"),
+                                                expenses=Decimal("-20.00"), income_count=1, expense_count=1, count=2),
+            ])
+            await session.commit()
+
+    asyncio.run(setup())
+
+    async def override_get_async_db():
+        async with AsyncTestSession() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(xtb_endpoints.router)
+    app.include_router(db_operations.router)
+    app.include_router(portfolio_endpoint.router)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+
+    yield TestClient(app)
+    asyncio.run(engine.dispose())
+    read_cache.clear()
+
+
+def test_async_wallet_and_summary_endpoints(client, shared_versions):
+
+    wallet = client.get("/xtb/get_all_xtb")
+    assert wallet.status_code == 200
+    assert [row["date"] for row in wallet.json()] == ["2024-01-01", "2024-02-01"]
+    assert wallet.json()[0] == {"id": 2, "date": "2024-01-01", "deposit_amount": 100.0, "total_amount": 110.0}
+    assert client.get("/xtb/get_all_xtb", headers={"If-None-Match": wallet.headers["ETag"]}).status_code == 304
+
+    summary = client.get("/transactions/get_summary", params={"exec_month": "2024-01"})
+    assert summary.status_code == 200
+    assert summary.json() == {"income": 50.0, "expenses": -20.0}
+
+
+def test_cached_read_wraps_coroutines():
+
+    calls = []
+
+    @cached_read("xtb")
+    async def read_wallet(limit: int, db: AsyncSession = None):
+        calls.append(limit)
+        return [limit]
+
+    assert asyncio.run(read_wallet(limit=2)) == [2]
+    assert asyncio.run(read_wallet(limit=2)) == [2]
+    assert calls == [2]
+
+
+def test_get_transactions_fast_path_pages(client, shared_versions):
+
+    first = client.get("/transactions/get_transactions_page", params={"limit": 2})
+    assert first.status_code == 200 and "ETag" in first.headers
+    page = first.json()
+    assert page["items"][0] == {"date": "2024-01-03", "receiver": "Shop 3", "amount": -10.5, "transaction_type": "Płatność kartą",
+                                "category": "Bank", "exec_month": "2024-01", "mapped_category": None}
+
+    last = client.get("/transactions/get_transactions_page", params={"limit": 2, "cursor": page["next_cursor"]}).json()
+    assert [item["receiver"] for item in last["items"]] == ["Shop 1"]
+    assert last["next_cursor"] is None
+
+
+def test_get_transactions_keeps_the_bare_list(client):
+
+    response = client.get("/transactions/get_transactions")
+    assert response.status_code == 200
+    assert [item["receiver"] for item in response.json()] == ["Shop 3", "Shop 2", "Shop 1"]
+    assert response.json()[0]["mapped_category"] is None and "id" not in response.json()[0]
+
+
+def add_portfolio_row(client, day, total, deposits):
+    async def add():
+        async for session in client.app.dependency_overrides[get_async_db]():
+            session.add(models.PortfolioSummary(Date=day, Total_Value=Decimal(total), Deposits=Decimal(deposits)))
+            await session.commit()
+
+    asyncio.run(add())
+
+
+def test_get_profit_with_fewer_than_two_snapshots(client):
+
+    assert client.get("/portfolio/get_profit").status_code == 404
+
+    add_portfolio_row(client, date(2024, 1, 31), "120.00", "100.00")
+    assert client.get("/portfolio/get_profit").json() == {"profit": 20.0, "profit_delta": 0.0}
+
+    add_portfolio_row(client, date(2024, 2, 29), "150.00", "110.00")
+    assert client.get("/portfolio/get_profit").json() == {"profit": 40.0, "profit_delta": 20.0}
@@ -0,0 +1,79 @@
+import json
+import pytest
+from datetime import date
+from sqlalchemy import event
+
+from app.categorization import changed_patterns, recategorize_transactions
+from app.rule_store import RuleSet, RuleStore
+import app.models as models
+
+
+def add_transaction(db, ref_number, receiver, mapped_category=None):
+    db.add(models.Transaction(
+        date=date(2024, 8, 1), receiver=receiver, title='title', amount=-10,
+        transaction_type='KARTA', category='Bez kategorii', ref_number=ref_number,
+        exec_month='2024-08', mapped_category=mapped_category
+    ))
+    db.commit()
+
+
+def mapped_categories(db):
+    rows = db.query(models.Transaction).order_by(models.Transaction.ref_number).all()
+    return [row.mapped_category for row in rows]
+
+
+def test_recategorize_all(db_session):
+
+    add_transaction(db_session, 'TXN001', 'LIDL WROCLAW')
+    add_transaction(db_session, 'TXN002', 'ZABKA')
+
+    rule_set = RuleSet(1, {"Zakupy": ["LIDL"]})
+    recategorize_transactions(db_session, rule_set)
+
+    assert mapped_categories(db_session) == ["Zakupy", "ZABKA"]
+
+
+def test_recategorize_only_matching_patterns(db_session):
+
+    add_transaction(db_session, 'TXN001', 'LIDL WROCLAW', mapped_category='LIDL WROCLAW')
+    add_transaction(db_session, 'TXN002', 'ZABKA', mapped_category='stale')
+
+    rule_set = RuleSet(2, {"Zakupy": ["LIDL"]})
+    updated = recategorize_transactions(db_session, rule_set, patterns=["LIDL"])
+
+    assert updated == 1
+    assert mapped_categories(db_session) == ["Zakupy", "stale"]
+
+
+def test_recategorize_sends_one_update(db_session):
+
+    for i, receiver in enumerate(['LIDL WROCLAW', 'LIDL KRAKOW', 'ZABKA', 'AUCHAN']):
+        add_transaction(db_session, f'TXN{i:03d}', receiver)
+
+    updates = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE'):
+            updates.append(executemany)
+
+    engine = db_session.get_bind()
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert recategorize_transactions(db_session, RuleSet(2, {"Zakupy": ["LIDL", "AUCHAN"]})) == 4
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert updates == [False]
+    assert mapped_categories(db_session) == ["Zakupy", "Zakupy", "ZABKA", "Zakupy"]
+
+
+def test_changed_patterns_includes_relabelled_categories(tmp_path):
+
+    rules_path = tmp_path / 'rules_dict.json'
+    rules_path.write_text(json.dumps({"Rata kredytu APPLE": ["ALIOR"], "Zakupy": ["LIDL"]}))
+    store = RuleStore(str(rules_path))
+
+    old_rule_set = store.current()
+    new_rule_set = store.add_rule("Apple", "APPLE")
+
+    assert changed_patterns(old_rule_set, new_rule_set) == ["ALIOR", "APPLE"]
@@ -1,13 +1,19 @@
 import pandas as pd
 import json
+from io import BytesIO
+import os
 import pytest
-from unittest.mock import mock_open, patch, call
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import patch, call
 
-from app.csv_handler import CSVHandler
+from app.csv_handler import CSVHandler, parse_statement, parse_statements, get_statement_pool
+from app.rule_store import RuleStore
 
 @pytest.fixture(autouse=True)
-def reset_dict_of_rules():
-    CSVHandler.dict_of_rules = {}
+def rules_file(tmp_path, monkeypatch):
+    rules_path = tmp_path / 'rules_dict.json'
+    monkeypatch.setattr('app.csv_handler.rule_store', RuleStore(str(rules_path)))
+    return rules_path
 
 
 @pytest.fixture
@@ -26,8 +32,8 @@ def clean_format_expected():
 
     
     expected_data = {
-        'date': ["2024-01-01", "2022-05-15", "2021-06-03"],
-        'amount': [1000.50, 2500.00, 300.75],  # Cleaned amounts as floats
+        'date': pd.to_datetime(["2024-01-01", "2022-05-15", "2021-06-03"]),
+        'amount': [100050, 250000, 30075],  # Cleaned amounts as integer grosze
         'exec_month': ["2024-01", "2022-05", "2021-06"],
         'ref_number': ["TXN001", "TXN002", "TXN003"]
     }
@@ -96,55 +102,53 @@ def test_init_with_valid_arguments():
     assert isinstance(handler.df, pd.DataFrame)
     assert handler.df.equals(test_df)
 
-def test_load_rules_success():
-    # Simulate the file content with valid JSON
-
-    mock_file_content = json.dumps({"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]})
+def test_load_rules_success(rules_file):
+    
+    rules_file.write_text(json.dumps({"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}))
 
-    with patch("builtins.open", mock_open(read_data=mock_file_content)):
-        handler = CSVHandler()
+    handler = CSVHandler()
 
-        # Assert that dict_of_rules has been loaded correctly
-        assert CSVHandler.dict_of_rules == {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
+    assert handler.dict_of_rules == {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
 
-def test_load_rules_JSONDecode_error():
+def test_load_rules_JSONDecode_error(rules_file):
     
-    invalid_json = "{'key': 'value'}"
+    rules_file.write_text("{'key': 'value'}")
 
-    with patch("builtins.open", mock_open(read_data=invalid_json)):
-        
-        with patch("json.load", side_effect=json.JSONDecodeError("Expecting value", "", 0)):
-            handler = CSVHandler()
+    with patch("logging.error") as mock_log_error:
+        handler = CSVHandler()
+
+        assert mock_log_error.call_args[0][0].startswith(" Error while decoding JSON")
     
-    assert CSVHandler.dict_of_rules == {}
+    assert handler.dict_of_rules == {}
 
 
-def test_save_rules_success():
+def test_add_rule_saves_rules(rules_file):
 
-    CSVHandler.dict_of_rules = {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
-    
-    with patch.object(CSVHandler, '_load_rules', return_value=None):
-        with patch("builtins.open", mock_open()) as mocked_file:
-            with patch("json.dump") as mocked_json_dump:
-                handler = CSVHandler()
-                handler.save_rules()
+    rules_file.write_text(json.dumps({"Wycieczki/Hotel": ["BOOKING"]}))
 
-                mocked_file.assert_called_once_with('rules_dict.json', 'w')
-                mocked_json_dump.assert_called_once_with(CSVHandler.dict_of_rules, mocked_file())
+    handler = CSVHandler()
+    handler.add_rule(rule_key="Wycieczki/Hotel", rule_value="PARKHOTEL")
 
+    assert json.loads(rules_file.read_text()) == {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
+    assert handler.dict_of_rules == {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
+    assert [path.name for path in rules_file.parent.iterdir()] == ['rules_dict.json']
 
-def test_save_rules_ioerror():
 
-    CSVHandler.dict_of_rules = {"Wycieczki/Hotel": ["BOOKING", "PARKHOTEL"]}
-    with patch("builtins.open", mock_open()) as mocked_file:
-        mocked_file.side_effect = IOError("Unable to write to file")
+def test_add_rule_ioerror(rules_file):
 
-        handler = CSVHandler()
+    rules_file.write_text(json.dumps({"Wycieczki/Hotel": ["BOOKING"]}))
+    handler = CSVHandler()
 
+    with patch("os.replace", side_effect=IOError("Unable to write to file")):
         with patch("logging.error") as mock_log_error:
-            handler.save_rules()
+            with pytest.raises(IOError):
+                handler.add_rule(rule_key="Wycieczki/Hotel", rule_value="PARKHOTEL")
+
+            mock_log_error.assert_any_call("File I/O error: Unable to write to file")
 
-            mock_log_error.assert_called_once_with("File I/O error: Unable to write to file")
+    assert json.loads(rules_file.read_text()) == {"Wycieczki/Hotel": ["BOOKING"]}
+    assert CSVHandler().dict_of_rules == {"Wycieczki/Hotel": ["BOOKING"]}
+    assert [path.name for path in rules_file.parent.iterdir()] == ['rules_dict.json']
 
 def test_load_csv_isnone():
 
@@ -292,7 +296,9 @@ def test_clean_and_format_df_date_parsing(clean_format_expected, clean_format_sa
     handler = CSVHandler()
     output_df = handler.clean_and_format_df(last_df)
 
-    assert list(output_df['date']) == ["2024-01-01", "2022-05-15", "2021-06-03"]
+    assert pd.api.types.is_datetime64_any_dtype(output_df['date'])
+    assert list(output_df['date']) == list(expected_df['date'])
+    assert list(output_df['exec_month']) == ["2024-01", "2022-05", "2021-06"]
 
 
 def test_clean_and_format_df_amount_parsing(clean_format_sample, clean_format_expected):
@@ -303,7 +309,32 @@ def test_clean_and_format_df_amount_parsing(clean_format_sample, clean_format_ex
     handler = CSVHandler()
     output_df = handler.clean_and_format_df(last_df)
 
-    assert list(output_df['amount']) == [1000.50, 2500.00, 300.75]
+    assert output_df['amount'].dtype == 'int64'
+    assert list(output_df['amount']) == list(expected_df['amount'])
+
+
+def test_clean_and_format_df_amount_edge_cases():
+
+    last_df = pd.DataFrame({
+        'date': ["01.01.2024"] * 5,
+        'amount': ["-0,82", "4,28", "12", "-1 234 567,5", "+0,01"],
+        'ref_number': ["TXN001", "TXN002", "TXN003", "TXN004", "TXN005"]
+    })
+
+    handler = CSVHandler()
+    output_df = handler.clean_and_format_df(last_df)
+
+    assert list(output_df['amount']) == [-82, 428, 1200, -123456750, 1]
+
+
+def test_clean_and_format_df_invalid_amount():
+
+    last_df = pd.DataFrame({'date': ["01.01.2024"], 'amount': ["12,345"], 'ref_number': ["TXN001"]})
+
+    handler = CSVHandler()
+
+    with pytest.raises(ValueError, match="The column amount contains invalid values"):
+        handler.clean_and_format_df(last_df)
 
 
 
@@ -319,11 +350,28 @@ def test_clean_and_format_df_duplicates():
 
     last_df = pd.DataFrame(sample_data)
     handler = CSVHandler()
-    
 
-    with pytest.raises(ValueError, match="The column ref_number contains duplicate values"):
-        print(last_df['date'])
-        handler.clean_and_format_df(last_df)
+    cleaned = handler.clean_and_format_df(last_df)
+
+    assert list(cleaned['ref_number']) == ["TXN001", "TXN003"]
+    assert handler.duplicates_dropped == 1
+
+
+def test_iter_chunks_drops_duplicates_in_any_chunk():
+
+    content = (
+        "Data księgowania;Nadawca / Odbiorca;Tytułem;Kwota operacji;Typ operacji;Kategoria;Numer referencyjny\n"
+        "29.08.2024;ZABKA;*3066106;-6,99;KARTA;Spożywcze;'C001\n"
+        "29.08.2024;ZABKA;*3066106;-6,99;KARTA;Spożywcze;'C001\n"
+        "28.08.2024;BIEDRONKA;*3066106;-10,50;KARTA;Spożywcze;'C002\n"
+        "27.07.2024;PRACODAWCA;Pensja;1 000,00;PRZELEW;Wynagrodzenie;'C001\n"
+    ).encode('utf-8')
+
+    for chunksize in (1, 2, 10):
+        handler = CSVHandler()
+        chunks = list(handler.iter_chunks(BytesIO(content), chunksize=chunksize))
+        assert [ref for chunk in chunks for ref in chunk['ref_number']] == ["'C001", "'C002"]
+        assert handler.duplicates_dropped == 2
 
 
 def test_clean_and_format_df_missing_dates():
@@ -339,7 +387,7 @@ def test_clean_and_format_df_missing_dates():
         handler = CSVHandler()
         output_df = handler.clean_and_format_df(last_df)
 
-        expected_dates = ['2024-01-01', None, '2022-05-15']
+        expected_dates = [pd.Timestamp('2024-01-01'), None, pd.Timestamp('2022-05-15')]
 
         for i, date in enumerate(output_df['date']):
             if pd.isna(date):
@@ -347,9 +395,99 @@ def test_clean_and_format_df_missing_dates():
             else:
                 assert date == expected_dates[i]
 
+        assert list(output_df['exec_month']) == ["2024-01", "Unknown", "2022-05"]
+
 def test_clean_and_format_df_remove_dupl(clean_format_sample):
     handler = CSVHandler()
     handler.remove_dupl(clean_format_sample)
 
         
         
+
+
+def test_iter_chunks_streams_statement_in_chunks():
+
+    content = (
+        "Data księgowania;Nadawca / Odbiorca;Tytułem;Kwota operacji;Typ operacji;Kategoria;Numer referencyjny\n"
+        "29.08.2024;ZABKA;*3066106;-6,99;KARTA;Spożywcze;'C001\n"
+        "28.08.2024;BIEDRONKA;*3066106;-10,50;KARTA;Spożywcze;'C002\n"
+        "27.07.2024;PRACODAWCA;Pensja;1 000,00;PRZELEW;Wynagrodzenie;'C003\n"
+    )
+
+    handler = CSVHandler()
+    chunks = list(handler.iter_chunks(BytesIO(content.encode('utf-8')), chunksize=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0]['ref_number']) == ["'C001", "'C002"]
+    assert list(chunks[1]['amount']) == [100000]
+    assert list(chunks[1]['exec_month']) == ["2024-07"]
+    assert handler.rows_processed == 3
+    assert {'read', 'select_columns', 'rename', 'parse_dates', 'parse_amounts', 'check_ref_numbers', 'map_categories'} <= set(handler.timings)
+
+
+def test_parse_statement_in_statement_pool():
+
+    with open('August.csv', 'rb') as file:
+        content = file.read()
+
+    df = get_statement_pool().submit(parse_statement, content).result(timeout=60)
+
+    assert len(df) == 146
+    assert df['ref_number'].is_unique
+    assert {'date', 'receiver', 'amount', 'exec_month', 'mapped_category'} <= set(df.columns)
+
+
+def test_parse_statements_replaces_a_broken_pool():
+
+    with open('August.csv', 'rb') as file:
+        content = file.read()
+
+    # A worker dying breaks the whole pool, like an OOM kill would
+    broken = get_statement_pool()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result(timeout=60)
+
+    statement, malformed = parse_statements([content, "a;b\n1;2\n".encode('utf-8')])
+
+    assert len(statement) == 146
+    assert isinstance(malformed, ValueError)
+    assert get_statement_pool() is not broken
+
+
+def test_parse_statement_missing_columns():
+
+    with pytest.raises(ValueError):
+        parse_statement("a;b\n1;2\n".encode('utf-8'))
+
+
+def test_parse_statement_pyarrow_engine_matches_c_engine():
+
+    with open('August.csv', 'rb') as file:
+        content = file.read()
+
+    c_df = parse_statement(content, engine='c')
+    arrow_df = parse_statement(content, engine='pyarrow')
+
+    assert isinstance(arrow_df['receiver'].dtype, pd.ArrowDtype)
+    assert arrow_df['amount'].dtype == 'int64'
+    assert pd.api.types.is_datetime64_any_dtype(arrow_df['date'])
+    pd.testing.assert_frame_equal(c_df, arrow_df.astype({column: object for column in arrow_df.select_dtypes('string').columns}))
+
+
+def test_iter_chunks_pyarrow_engine_invalid_amount():
+
+    content = (
+        "Data księgowania;Nadawca / Odbiorca;Tytułem;Kwota operacji;Typ operacji;Kategoria;Numer referencyjny\n"
+        "25.07.2024;ZABKA;Zakupy;-4,28;KARTA;Jedzenie;'C001\n"
+        "26.07.2024;ZABKA;Zakupy;abc;KARTA;Jedzenie;'C002\n"
+    )
+
+    with pytest.raises(ValueError, match="invalid values"):
+        list(CSVHandler().iter_chunks(BytesIO(content.encode('utf-8')), engine='pyarrow'))
+
+
+@pytest.mark.parametrize("engine", ["pyarrow", "python"])
+def test_parse_statement_pyarrow_engine_errors(engine):
+
+    with pytest.raises(ValueError):
+        parse_statement("a;b\n1;2\n".encode('utf-8'), engine=engine)
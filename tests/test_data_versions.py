@@ -0,0 +1,31 @@
+import pytest
+from datetime import date
+from sqlalchemy import update
+
+import app.data_versions as data_versions
+import app.models as models
+
+
+def test_commit_bumps_written_tables(db_session):
+
+    before = data_versions.versions('xtb', 'vienna')
+
+    db_session.add(models.Xtb(date=date(2024, 7, 1), deposit_amount=100, total_amount=110))
+    assert data_versions.versions('xtb', 'vienna') == before
+
+    db_session.commit()
+    assert data_versions.versions('xtb', 'vienna') == (before[0] + 1, before[1])
+
+
+def test_core_statements_and_rollback(db_session):
+
+    before = data_versions.version('transactions')
+    statement = update(models.Transaction.__table__).values(mapped_category='x')
+
+    db_session.execute(statement)
+    db_session.rollback()
+    assert data_versions.version('transactions') == before
+
+    db_session.execute(statement)
+    db_session.commit()
+    assert data_versions.version('transactions') == before + 1
@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app import db_pool
+from app.db_pool import TimedQueuePool, engine_options, pool_status
+
+
+def test_pool_status_reports_checkouts_and_waits(tmp_path):
+
+    TimedQueuePool.wait_stats.reset()
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.sqlite'}", poolclass=TimedQueuePool, pool_size=1, max_overflow=1)
+
+    with engine.connect() as first, engine.connect() as second:
+        first.execute(text("SELECT 1"))
+        second.execute(text("SELECT 1"))
+        status = pool_status(engine.pool)
+        assert status["checked_out"] == 2
+        assert status["overflow"] == 1
+
+    status = pool_status(engine.pool)
+    assert status["checked_out"] == 0
+    assert status["idle"] == 1
+    assert status["wait"]["checkouts"] == 2
+    assert status["wait"]["timeouts"] == 0
+    engine.dispose()
+
+
+def test_pgbouncer_mode_disables_pool_and_statement_cache(monkeypatch):
+
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", True)
+    assert engine_options() == {"poolclass": NullPool}
+    assert engine_options(is_async=True)["connect_args"]["statement_cache_size"] == 0
+
+    monkeypatch.setattr(db_pool, "DB_PGBOUNCER", False)
+    assert engine_options()["pool_pre_ping"] is db_pool.DB_POOL_PRE_PING
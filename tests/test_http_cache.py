@@ -0,0 +1,91 @@
+import pytest
+from datetime import date
+from decimal import Decimal
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app import data_versions, http_cache
+from app.data_versions import SharedVersionStore
+from app.http_cache import current_etag, etag_for, etag_versions_source
+import app.models as models
+
+
+def make_client(calls):
+    app = FastAPI()
+
+    @app.get("/wallet", dependencies=[etag_for("xtb")])
+    def read_wallet():
+        calls.append(1)
+        return [{"total_amount": 110.0}]
+
+    return TestClient(app)
+
+
+def add_xtb_row(engine):
+    with Session(engine) as session:
+        session.add(models.Xtb(date=date(2024, 1, 31), deposit_amount=Decimal("100.00"), total_amount=Decimal("110.00")))
+        session.commit()
+
+
+def test_if_none_match_returns_304_until_table_changes(shared_versions):
+
+    calls = []
+    client = make_client(calls)
+
+    first = client.get("/wallet")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and etag == 'W/"0"'
+
+    not_modified = client.get("/wallet", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert len(calls) == 1
+
+    add_xtb_row(shared_versions.engine)
+    changed = client.get("/wallet", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] == 'W/"1"'
+    assert len(calls) == 2
+
+
+def test_write_through_one_store_changes_etag_of_another(shared_versions):
+
+    # Two workers: each has its own store over the same data_versions table
+    other_worker = SharedVersionStore(shared_versions.engine, models.DataVersion.__table__)
+    etag = current_etag("xtb", "etoro", store=other_worker)
+
+    add_xtb_row(shared_versions.engine)
+    assert current_etag("xtb", "etoro", store=other_worker) != etag
+    assert other_worker.versions("xtb", "etoro") == (1, 0)
+
+
+def test_single_process_etags_use_in_process_versions(monkeypatch):
+
+    monkeypatch.setattr(http_cache, "ETAG_VERSIONS", "process")
+    # Any DB lookup would fail, the app DB is not reachable in the tests
+    monkeypatch.setattr(http_cache, "shared_versions", None)
+    calls = []
+    client = make_client(calls)
+
+    etag = client.get("/wallet").headers["ETag"]
+    assert etag.startswith(f'W/"{http_cache.BOOT_ID}-')
+    assert client.get("/wallet", headers={"If-None-Match": etag}).status_code == 304
+
+    data_versions.bump("xtb")
+    assert client.get("/wallet", headers={"If-None-Match": etag}).status_code == 200
+    assert len(calls) == 2
+
+
+def test_etag_versions_source(monkeypatch):
+
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    assert etag_versions_source() == "process"
+    assert etag_versions_source("shared") == "shared"
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert etag_versions_source() == "shared"
+    assert etag_versions_source("process") == "process"
+
+    with pytest.raises(ValueError):
+        etag_versions_source("redis")
@@ -0,0 +1,82 @@
+import pytest
+import shutil
+from unittest.mock import MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import app.ingest_jobs as ingest_jobs
+import app.transaction_service as transaction_service
+import app.models as models
+from app.database import Base
+from app.ingest_jobs import InMemoryJobStore, SQLiteJobStore, new_job, run_ingest_job
+
+
+@pytest.fixture
+def memory_store(monkeypatch):
+    store = InMemoryJobStore()
+    monkeypatch.setattr(ingest_jobs, 'job_store', store)
+    return store
+
+
+def test_sqlite_job_store_roundtrip(tmp_path):
+
+    store = SQLiteJobStore(str(tmp_path / 'jobs.sqlite'))
+    job = new_job('August.csv', 100)
+
+    store.save(job)
+    job["rows_parsed"] = 10
+    store.save(job)
+
+    assert store.get(job["id"])["rows_parsed"] == 10
+    assert store.get("missing") is None
+
+
+def test_in_memory_job_store_keeps_last_jobs(monkeypatch):
+
+    monkeypatch.setattr(ingest_jobs, 'MAX_JOBS', 2)
+    store = InMemoryJobStore()
+    jobs = [new_job(f'{i}.csv', 1) for i in range(3)]
+
+    for job in jobs:
+        store.save(job)
+
+    assert store.get(jobs[0]["id"]) is None
+    assert store.get(jobs[2]["id"])["filename"] == '2.csv'
+
+
+def test_run_ingest_job_failure_is_reported(tmp_path, monkeypatch, memory_store):
+
+    monkeypatch.setattr(ingest_jobs, 'SessionLocal', MagicMock())
+    spooled = tmp_path / 'statement.csv'
+    spooled.write_text("a;b\n1;2\n")
+    job = new_job('statement.csv', spooled.stat().st_size)
+
+    run_ingest_job(job, str(spooled))
+
+    saved = memory_store.get(job["id"])
+    assert saved["status"] == "failed"
+    assert saved["errors"] == ["Error processing DataFrame in create_df_for_db"]
+    assert saved["finished_at"] is not None
+    assert not spooled.exists()
+
+
+def test_run_ingest_job_success(tmp_path, monkeypatch, memory_store):
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(ingest_jobs, 'SessionLocal', session_factory)
+    monkeypatch.setattr(transaction_service, '_ref_bloom', None)
+
+    spooled = tmp_path / 'August.csv'
+    shutil.copy('August.csv', spooled)
+    job = new_job('August.csv', spooled.stat().st_size)
+
+    run_ingest_job(job, str(spooled))
+
+    saved = memory_store.get(job["id"])
+    assert saved["status"] == "finished"
+    assert saved["progress"] == 1.0
+    assert saved["rows_parsed"] == saved["inserted"] == 146
+    assert set(saved["timings"]) == {"parse", "insert", "total"}
+    assert session_factory().query(models.Transaction).count() == 146
@@ -0,0 +1,144 @@
+import pytest
+import numpy as np
+import pandas as pd
+from datetime import date
+from decimal import Decimal
+
+from app.portfolio_service import portfolio_series, refresh_portfolio_dates, rebuild_portfolio, align_wallets, aligned_portfolio, latest_snapshots_query, wallet_allocation
+import app.models as models
+
+
+def add_snapshots(session, model, rows):
+    session.add_all([model(date=day, total_amount=Decimal(total), deposit_amount=Decimal(deposit)) for day, total, deposit in rows])
+    session.commit()
+
+
+def test_portfolio_series_sums_wallets_per_date(db_session):
+
+    add_snapshots(db_session, models.Etoro, [(date(2024, 1, 31), "100.00", "90.00"), (date(2024, 2, 29), "120.00", "95.00")])
+    add_snapshots(db_session, models.Xtb, [(date(2024, 2, 29), "50.50", "40.00"), (date(2024, 1, 31), "45.25", "40.00")])
+    add_snapshots(db_session, models.Nokia, [(date(2024, 3, 31), "10.00", "10.00")])
+
+    assert portfolio_series(db_session) == [
+        {"Date": date(2024, 1, 31), "Total_Value": 145.25, "Deposits": 130.0},
+        {"Date": date(2024, 2, 29), "Total_Value": 170.5, "Deposits": 135.0},
+        {"Date": date(2024, 3, 31), "Total_Value": 10.0, "Deposits": 10.0},
+    ]
+
+
+def test_portfolio_series_empty(db_session):
+
+    assert portfolio_series(db_session) == []
+
+
+def portfolio_rows(session):
+    return [(row.Date, row.Total_Value, row.Deposits) for row in session.query(models.PortfolioSummary).order_by(models.PortfolioSummary.Date)]
+
+
+def test_refresh_portfolio_dates_upserts_and_deletes(db_session):
+
+    add_snapshots(db_session, models.Etoro, [(date(2024, 1, 31), "100.00", "90.00"), (date(2024, 2, 29), "120.00", "95.00")])
+    refresh_portfolio_dates(db_session, [date(2024, 1, 31)])
+    db_session.commit()
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), Decimal("100.00"), Decimal("90.00"))]
+
+    add_snapshots(db_session, models.Xtb, [(date(2024, 1, 31), "10.00", "5.00")])
+    refresh_portfolio_dates(db_session, [date(2024, 1, 31), date(2024, 2, 29)])
+    db_session.commit()
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), Decimal("110.00"), Decimal("95.00")),
+                                          (date(2024, 2, 29), Decimal("120.00"), Decimal("95.00"))]
+
+    db_session.query(models.Etoro).filter(models.Etoro.date == date(2024, 2, 29)).delete()
+    refresh_portfolio_dates(db_session, [date(2024, 2, 29)])
+    db_session.commit()
+    assert [row[0] for row in portfolio_rows(db_session)] == [date(2024, 1, 31)]
+
+
+def test_refresh_portfolio_dates_leaves_the_commit_to_the_caller(db_session):
+
+    db_session.add(models.Etoro(date=date(2024, 1, 31), total_amount=Decimal("100.00"), deposit_amount=Decimal("90.00")))
+    refresh_portfolio_dates(db_session, [date(2024, 1, 31)])
+    db_session.rollback()
+
+    assert db_session.query(models.Etoro).count() == 0
+    assert portfolio_rows(db_session) == []
+
+
+def test_rebuild_portfolio_matches_series(db_session):
+
+    add_snapshots(db_session, models.Etoro, [(date(2024, 1, 31), "100.00", "90.00")])
+    add_snapshots(db_session, models.Vienna, [(date(2024, 1, 31), "1.00", "1.00"), (date(2024, 2, 29), "2.00", "2.00")])
+    db_session.add(models.PortfolioSummary(Date=date(2023, 12, 31), Total_Value=Decimal("5.00"), Deposits=Decimal("5.00")))
+    db_session.commit()
+
+    assert rebuild_portfolio(db_session) == 2
+    assert portfolio_rows(db_session) == [(date(2024, 1, 31), Decimal("101.00"), Decimal("91.00")),
+                                          (date(2024, 2, 29), Decimal("2.00"), Decimal("2.00"))]
+
+
+def snapshot_frame(rows):
+    frame = pd.DataFrame(rows, columns=['wallet', 'date', 'total_amount'])
+    frame['date'] = pd.to_datetime(frame['date'])
+    frame['deposit_amount'] = 0.0
+    return frame
+
+
+def test_align_wallets_carries_last_snapshot_forward():
+
+    frame = snapshot_frame([('Etoro', '2024-01-01', 100.0), ('Etoro', '2024-01-04', 110.0), ('Xtb', '2024-01-03', 50.0)])
+
+    daily = align_wallets(frame, 'daily')
+    assert list(daily.index.strftime('%Y-%m-%d')) == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']
+    assert daily['Etoro'].tolist() == [100.0, 100.0, 100.0, 110.0]
+    assert np.isnan(daily['Xtb'].iloc[1]) and daily['Xtb'].iloc[2:].tolist() == [50.0, 50.0]
+
+
+def test_align_wallets_weekly_and_monthly_calendars():
+
+    frame = snapshot_frame([('Etoro', '2024-01-10', 1.0), ('Etoro', '2024-02-20', 2.0), ('Xtb', '2024-01-31', 5.0)])
+
+    monthly = align_wallets(frame, 'monthly')
+    assert list(monthly.index.strftime('%Y-%m-%d')) == ['2024-01-31', '2024-02-20']
+    assert monthly.to_dict(orient='list') == {'Etoro': [1.0, 2.0], 'Xtb': [5.0, 5.0]}
+
+    weekly = align_wallets(frame, 'weekly', start='2024-02-01')
+    assert weekly.index[0] == pd.Timestamp('2024-02-04') and weekly.index[-1] == pd.Timestamp('2024-02-20')
+    assert weekly['Etoro'].tolist() == [1.0, 1.0, 1.0, 2.0]
+
+    with pytest.raises(ValueError):
+        align_wallets(frame, 'yearly')
+
+
+def test_aligned_portfolio_totals(db_session):
+
+    add_snapshots(db_session, models.Etoro, [(date(2024, 1, 1), "100.00", "90.00"), (date(2024, 1, 3), "120.00", "90.00")])
+    add_snapshots(db_session, models.Xtb, [(date(2024, 1, 2), "10.00", "10.00")])
+
+    rows = aligned_portfolio(db_session, 'daily')
+    assert [row['Total'] for row in rows] == [100.0, 110.0, 130.0]
+    assert rows[0]['date'] == date(2024, 1, 1)
+    assert rows[0]['Xtb'] is None and rows[0]['Nokia'] is None
+
+
+def test_aligned_portfolio_on_empty_db(db_session):
+
+    assert aligned_portfolio(db_session, 'daily') == []
+    assert aligned_portfolio(db_session, 'daily', start=date(2024, 1, 1)) == []
+
+    rows = aligned_portfolio(db_session, 'monthly', start=date(2024, 1, 1), end=date(2024, 2, 29))
+    assert [row['date'] for row in rows] == [date(2024, 1, 31), date(2024, 2, 29)]
+    assert rows[0]['Total'] is None and rows[0]['Etoro'] is None
+
+
+def test_latest_snapshots_in_one_query_and_as_of(db_session):
+
+    add_snapshots(db_session, models.Etoro, [(date(2024, 1, 31), "100.00", "90.00"), (date(2024, 2, 29), "300.00", "90.00")])
+    add_snapshots(db_session, models.Xtb, [(date(2024, 1, 15), "100.00", "40.00")])
+
+    latest = db_session.execute(latest_snapshots_query()).all()
+    assert sorted(latest) == [("Etoro", date(2024, 2, 29), Decimal("300.00")), ("Xtb", date(2024, 1, 15), Decimal("100.00"))]
+    assert wallet_allocation(latest) == [{"Wallet": "Etoro", "Percentage": 75.0}, {"Wallet": "Xtb", "Percentage": 25.0}]
+
+    as_of = db_session.execute(latest_snapshots_query(as_of=date(2024, 2, 1))).all()
+    assert wallet_allocation(as_of) == [{"Wallet": "Etoro", "Percentage": 50.0}, {"Wallet": "Xtb", "Percentage": 50.0}]
+    assert wallet_allocation(db_session.execute(latest_snapshots_query(as_of=date(2023, 1, 1))).all()) == []
@@ -0,0 +1,79 @@
+import pytest
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import data_versions
+from app.database import Base
+from app.read_cache import ReadCache, cached_read, read_cache, _MISSING
+import app.models as models
+
+
+@pytest.fixture(autouse=True)
+def clear_read_cache():
+    read_cache.clear()
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+
+    cache = ReadCache(maxsize=2, ttl=10)
+    cache.set('a', 1, ['xtb'])
+    cache.set('b', 2, ['xtb'])
+    assert cache.get('a') == 1
+    cache.set('c', 3, ['nokia'])
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get('b') is _MISSING
+
+    monkeypatch.setattr('app.read_cache.monotonic', lambda: 10 ** 9)
+    assert cache.get('a') is _MISSING
+    assert cache.stats()["hits"] == 1
+
+
+def test_invalidate_drops_only_tagged_entries():
+
+    cache = ReadCache()
+    cache.set('xtb', 1, ['xtb'])
+    cache.set('perc', 2, ['xtb', 'nokia'])
+    cache.set('nokia', 3, ['nokia'])
+
+    cache.invalidate_tables(('xtb',))
+
+    assert cache.stats()["entries"] == 1
+    assert cache.get('nokia') == 3
+
+
+def test_set_with_versions_skips_stale_results():
+
+    cache = ReadCache()
+    versions = data_versions.versions('xtb')
+    assert cache.set('fresh', 1, ['xtb'], versions)
+
+    data_versions.bump('xtb')
+    assert not cache.set('stale', 2, ['xtb'], versions)
+    assert cache.get('stale') is _MISSING
+
+
+def test_cached_read_is_invalidated_by_commit():
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    calls = []
+
+    @cached_read("xtb")
+    def get_all_xtb(db):
+        calls.append(1)
+        return db.query(models.Xtb).count()
+
+    assert get_all_xtb(db=session) == 0
+    assert get_all_xtb(db=session) == 0
+    assert len(calls) == 1
+
+    session.add(models.Xtb(date=date(2024, 7, 1), deposit_amount=100, total_amount=110))
+    session.commit()
+
+    assert get_all_xtb(db=session) == 1
+    assert len(calls) == 2
+    session.close()
+    engine.dispose()
@@ -0,0 +1,94 @@
+import pytest
+import pandas as pd
+from datetime import date
+from decimal import Decimal
+
+from app.rollup import apply_rollup_delta, rebuild_rollup, read_rollup, read_summary, read_timeline, rollup_deltas
+from app.transaction_service import TransactionService
+import app.transaction_service as transaction_service
+import app.models as models
+
+
+@pytest.fixture(autouse=True)
+def reset_ref_bloom(monkeypatch):
+    monkeypatch.setattr(transaction_service, '_ref_bloom', None)
+
+
+def make_transaction(ref_number, amount, exec_month='2024-08', category='Artykuły spożywcze'):
+    return {
+        'date': date.fromisoformat(f"{exec_month}-01"),
+        'receiver': 'ZABKA Z7582 K.1 WROCLAW',
+        'title': '*********3066106',
+        'amount': amount,
+        'transaction_type': 'TRANSAKCJA KARTĄ PŁATNICZĄ',
+        'category': category,
+        'ref_number': ref_number,
+        'exec_month': exec_month
+    }
+
+
+def rollup_rows(db_session):
+    return [
+        (row.exec_month, row.category, row.income, row.expenses, row.income_count, row.expense_count, row.count)
+        for row in read_rollup(db_session)
+    ]
+
+
+def test_rollup_deltas_merge_added_and_removed():
+
+    deltas = rollup_deltas(
+        added=[('2024-08', 'Paliwo', -10.5), ('2024-08', 'Paliwo', 100)],
+        removed=[('2024-08', 'Paliwo', -10.5)]
+    )
+
+    assert deltas == [{'exec_month': '2024-08', 'category': 'Paliwo', 'income': Decimal('100'),
+                       'expenses': Decimal('0.0'), 'income_count': 1, 'expense_count': 0, 'count': 1}]
+
+
+def test_ingest_updates_rollup_in_same_transaction(db_session):
+
+    service = TransactionService(db_session)
+    df = pd.DataFrame([make_transaction("TXN001", -1050), make_transaction("TXN002", 250000), make_transaction("TXN003", -50, '2024-07')])
+    df['date'] = pd.to_datetime(df['date'])
+
+    service.ingest_transactions(df)
+    service.ingest_transactions(df)
+
+    assert rollup_rows(db_session) == [
+        ('2024-07', 'Artykuły spożywcze', Decimal('0'), Decimal('-0.50'), 0, 1, 1),
+        ('2024-08', 'Artykuły spożywcze', Decimal('2500.00'), Decimal('-10.50'), 1, 1, 2),
+    ]
+    assert read_summary(db_session, exec_months=['2024-08']) == {"income": Decimal('2500.00'), "expenses": Decimal('-10.50')}
+
+
+def test_removed_rows_drop_empty_rollup_entries(db_session):
+
+    apply_rollup_delta(db_session, added=[('2024-08', 'Paliwo', -10), ('2024-08', 'Jedzenie', -5)])
+    apply_rollup_delta(db_session, added=[('2024-08', 'Jedzenie', 7)], removed=[('2024-08', 'Paliwo', -10)])
+    db_session.commit()
+
+    assert rollup_rows(db_session) == [('2024-08', 'Jedzenie', Decimal('7.00'), Decimal('-5.00'), 1, 1, 2)]
+
+
+def test_rebuild_rollup_fixes_drift(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [
+        make_transaction("TXN001", -10.5), make_transaction("TXN002", 20.0, category='Wpływy'), make_transaction("TXN003", -1.0)
+    ])
+    apply_rollup_delta(db_session, added=[('2023-01', 'Stale', -999)])
+    db_session.commit()
+
+    assert rebuild_rollup(db_session) == 2
+    assert rollup_rows(db_session) == [
+        ('2024-08', 'Artykuły spożywcze', Decimal('0.00'), Decimal('-11.50'), 0, 2, 2),
+        ('2024-08', 'Wpływy', Decimal('20.00'), Decimal('0.00'), 1, 0, 1),
+    ]
+
+
+def test_read_timeline_sorted_with_counts(db_session):
+
+    apply_rollup_delta(db_session, added=[('2024-08', 'Paliwo', -10), ('2024-07', 'Paliwo', -5), ('2024-08', 'Jedzenie', 7)])
+    db_session.commit()
+
+    assert read_timeline(db_session) == [{"exec_month": "2024-07", "count": 1}, {"exec_month": "2024-08", "count": 2}]
@@ -0,0 +1,65 @@
+import json
+import random
+import pandas as pd
+import pytest
+
+from app.rule_matcher import RuleMatcher
+
+
+def legacy_remove_dupl(df, rules):
+    # Category-by-category replacement used before RuleMatcher, kept as the reference behaviour
+    for category, patterns in rules.items():
+        df['receiver'] = df['receiver'].apply(
+            lambda x: category if any(pattern in x for pattern in patterns) else x
+        )
+    return df
+
+
+@pytest.fixture
+def rules():
+    with open('rules_dict.json', 'r') as file:
+        return json.load(file)
+
+
+def test_first_matching_category_wins():
+
+    matcher = RuleMatcher({"Zakupy": ["LIDL"], "Inne": ["WROCLAW"]})
+
+    assert matcher.match("LIDL WROCLAW") == "Zakupy"
+    assert matcher.match("ZABKA WROCLAW") == "Inne"
+    assert matcher.match("ZABKA") is None
+
+
+def test_category_name_passes_through_later_rules():
+
+    matcher = RuleMatcher({"Rata kredytu APPLE": ["ALIOR"], "Apple": ["APPLE"]})
+
+    assert matcher.match("ALIOR BANK") == "Apple"
+
+
+def test_categorize_keeps_unmatched_receivers():
+
+    matcher = RuleMatcher({"Zakupy": ["LIDL"]})
+    receivers = pd.Series(["LIDL SP. Z O.O.", "ZABKA", "LIDL SP. Z O.O."])
+
+    assert list(matcher.categorize(receivers)) == ["Zakupy", "ZABKA", "Zakupy"]
+
+
+def test_empty_rules():
+
+    matcher = RuleMatcher({})
+
+    assert list(matcher.categorize(pd.Series(["ZABKA"]))) == ["ZABKA"]
+
+
+def test_matches_legacy_remove_dupl(rules):
+
+    random.seed(7)
+    patterns = [pattern for values in rules.values() for pattern in values]
+    words = patterns + ["ZABKA", "Pekao", "WROCLAW", "SP. Z O.O.", "ALIOR BANK", "BP-STACJA 12"]
+    receivers = [" ".join(random.sample(words, random.randint(1, 3))) for _ in range(500)]
+
+    expected = legacy_remove_dupl(pd.DataFrame({'receiver': receivers}), rules)
+    output = RuleMatcher(rules).categorize(pd.Series(receivers))
+
+    assert list(output) == list(expected['receiver'])
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+import pytest
+from unittest.mock import patch
+
+from app.rule_store import RuleStore
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    rules_path = tmp_path / 'rules_dict.json'
+    rules_path.write_text(json.dumps({"Zakupy": ["LIDL"]}))
+    return rules_path
+
+
+def test_current_reloads_only_when_mtime_changes(rules_file):
+
+    store = RuleStore(str(rules_file))
+
+    with patch("json.load", wraps=json.load) as mocked_json_load:
+        first = store.current()
+        second = store.current()
+
+        assert first is second
+        assert mocked_json_load.call_count == 1
+
+        rules_file.write_text(json.dumps({"Zakupy": ["LIDL", "AUCHAN"]}))
+        stat = os.stat(rules_file)
+        os.utime(rules_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        third = store.current()
+
+        assert mocked_json_load.call_count == 2
+        assert third.version == first.version + 1
+        assert third.rules == {"Zakupy": ["LIDL", "AUCHAN"]}
+
+
+def test_add_rule_is_copy_on_write(rules_file):
+
+    store = RuleStore(str(rules_file))
+    before = store.current()
+
+    after = store.add_rule("Zakupy", "AUCHAN")
+
+    assert before.rules == {"Zakupy": ["LIDL"]}
+    assert after.rules == {"Zakupy": ["LIDL", "AUCHAN"]}
+    assert after.version == before.version + 1
+    assert store.current() is after
+
+
+def test_matcher_is_compiled_once_per_version(rules_file):
+
+    store = RuleStore(str(rules_file))
+    rule_set = store.current()
+
+    assert rule_set.matcher is rule_set.matcher
+    assert store.add_rule("Zakupy", "AUCHAN").matcher is not rule_set.matcher
+
+
+def test_add_rule_rejects_non_string(rules_file):
+
+    store = RuleStore(str(rules_file))
+
+    with pytest.raises(ValueError, match="Rule value must be a string"):
+        store.add_rule("Zakupy", 123)
+
+
+def test_concurrent_add_rule_keeps_every_rule(rules_file):
+
+    store = RuleStore(str(rules_file))
+    threads = [threading.Thread(target=store.add_rule, args=("Zakupy", f"SKLEP {i}")) for i in range(20)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    saved = json.loads(rules_file.read_text())
+    assert len(saved["Zakupy"]) == 21
+    assert store.current().rules == saved
+
+
+def test_add_rule_keeps_file_mode(rules_file):
+
+    os.chmod(rules_file, 0o644)
+    RuleStore(str(rules_file)).add_rule("Zakupy", "AUCHAN")
+
+    assert os.stat(rules_file).st_mode & 0o777 == 0o644
@@ -0,0 +1,224 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+from app.transaction_service import TransactionService
+from app.bloom_filter import BloomFilter
+import app.transaction_service as transaction_service
+import app.models as models
+
+
+@pytest.fixture(autouse=True)
+def reset_ref_bloom(monkeypatch):
+    monkeypatch.setattr(transaction_service, '_ref_bloom', None)
+
+
+def make_transaction(ref_number, amount=-10.0, day=1):
+    return {
+        'date': date(2024, 8, day),
+        'receiver': 'ZABKA Z7582 K.1 WROCLAW',
+        'title': '*********3066106',
+        'amount': amount,
+        'transaction_type': 'TRANSAKCJA KARTĄ PŁATNICZĄ',
+        'category': 'Artykuły spożywcze',
+        'ref_number': ref_number,
+        'exec_month': '2024-08'
+    }
+
+
+def test_bulk_add_transactions_inserts_all(db_session):
+
+    service = TransactionService(db_session)
+    rows = [make_transaction(f"TXN00{i}", day=i) for i in range(1, 4)]
+
+    result = service.bulk_add_transactions(models.Transaction, rows, conflict_column='ref_number')
+
+    assert result == {"inserted": 3, "skipped": 0}
+    assert db_session.query(models.Transaction).count() == 3
+
+
+def test_bulk_add_transactions_skips_duplicates(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [make_transaction("TXN001")], conflict_column='ref_number')
+
+    rows = [make_transaction("TXN001"), make_transaction("TXN002"), make_transaction("TXN002")]
+    result = service.bulk_add_transactions(models.Transaction, rows, conflict_column='ref_number', batch_size=2)
+
+    assert result == {"inserted": 1, "skipped": 2}
+    assert db_session.query(models.Transaction).count() == 2
+
+
+def test_bulk_add_transactions_empty(db_session):
+
+    service = TransactionService(db_session)
+
+    assert service.bulk_add_transactions(models.Transaction, []) == {"inserted": 0, "skipped": 0}
+
+
+def test_bulk_add_transactions_wallet_without_unique_column(db_session):
+
+    service = TransactionService(db_session)
+    rows = [
+        {'date': date(2024, 7, 1), 'deposit_amount': 100.0, 'total_amount': 110.0},
+        {'date': date(2024, 7, 1), 'deposit_amount': 100.0, 'total_amount': 110.0},
+    ]
+
+    result = service.bulk_add_transactions(models.Xtb, rows)
+
+    assert result == {"inserted": 2, "skipped": 0}
+
+
+def test_filter_existing_drops_known_ref_numbers(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [make_transaction("TXN001", day=1), make_transaction("TXN002", day=20)])
+
+    df = pd.DataFrame([make_transaction(ref, day=day) for ref, day in [("TXN001", 1), ("TXN002", 20), ("TXN003", 2)]])
+    df['date'] = df['date'].astype(str)
+
+    output_df = service.filter_existing(df, use_bloom=False)
+
+    assert list(output_df['ref_number']) == ["TXN003"]
+
+
+def test_filter_existing_skips_query_for_new_statement(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [make_transaction("TXN001")])
+
+    df = pd.DataFrame([make_transaction("TXN100"), make_transaction("TXN101")])
+
+    service._known_ref_numbers()
+    with patch.object(db_session, 'execute', wraps=db_session.execute) as mocked_execute:
+        output_df = service.filter_existing(df, use_bloom=True)
+
+        mocked_execute.assert_not_called()
+
+    assert len(output_df) == 2
+
+
+def make_statement(ref_numbers, amount=-1050):
+    # Parsed statement as produced by CSVHandler.iter_chunks: datetime64 dates and grosze amounts
+    df = pd.DataFrame([make_transaction(ref_number) for ref_number in ref_numbers])
+    df['date'] = pd.to_datetime(df['date'])
+    df['amount'] = amount
+    return df
+
+
+def test_ingest_transactions_counts_existing_as_skipped(db_session):
+
+    service = TransactionService(db_session)
+    service.ingest_transactions(make_statement(["TXN001"]))
+
+    result = service.ingest_transactions(make_statement(["TXN001", "TXN002"]))
+
+    assert result == {"inserted": 1, "skipped": 1}
+    assert "TXN002" in service._known_ref_numbers()
+
+
+def test_ingest_transactions_stores_exact_amounts(db_session):
+
+    service = TransactionService(db_session)
+    df = make_statement(["TXN001", "TXN002"])
+    df.loc[1, 'date'] = pd.NaT
+
+    result = service.ingest_transactions(df)
+
+    stored = db_session.query(models.Transaction).one()
+    assert result == {"inserted": 1, "skipped": 1}
+    assert stored.amount == Decimal('-10.50')
+    assert stored.date == date(2024, 8, 1)
+
+
+def test_bloom_filter_has_no_false_negatives():
+
+    bloom = BloomFilter(capacity=1000)
+    keys = [f"'C99242420{i:07d}" for i in range(1000)]
+    bloom.add_many(keys)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"'X{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_bloom_filter_concurrent_adds():
+
+    bloom = BloomFilter(capacity=8000)
+    batches = [[f"'C{worker}-{i}" for i in range(2000)] for worker in range(4)]
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda batch: [bloom.add(key) for key in batch], batches))
+
+    assert bloom.count == 8000
+    assert all(key in bloom for batch in batches for key in batch)
+
+
+def test_get_transactions_page_walks_all_rows_with_cursor(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [make_transaction(f"TXN{i:03d}", day=i % 5 + 1) for i in range(12)])
+
+    seen, cursor = [], None
+    while True:
+        rows, cursor = service.get_transactions_page(limit=5, cursor=cursor)
+        assert len(rows) <= 5
+        seen.extend((row.date, row.id) for row in rows)
+        if cursor is None:
+            break
+
+    assert len(seen) == 12
+    assert seen == sorted(seen, reverse=True)
+
+
+def test_get_transactions_page_filters(db_session):
+
+    service = TransactionService(db_session)
+    july = dict(make_transaction("TXN004", amount=25.0), exec_month='2024-07', date=date(2024, 7, 3))
+    service.bulk_add_transactions(models.Transaction, [
+        make_transaction("TXN001"), make_transaction("TXN002", amount=3000.0),
+        dict(make_transaction("TXN003"), category='Paliwo'), july
+    ])
+
+    rows, cursor = service.get_transactions_page(limit=10, exec_months=['2024-08'], category='Artykuły spożywcze', sign='expense')
+    assert [row.ref_number for row in rows] == ["TXN001"]
+    assert cursor is None
+
+    rows, _ = service.get_transactions_page(limit=10, exec_months=['2024-07', '2024-08'], sign='income')
+    assert sorted(row.ref_number for row in rows) == ["TXN002", "TXN004"]
+
+
+def test_get_transactions_page_invalid_cursor(db_session):
+
+    with pytest.raises(ValueError):
+        TransactionService(db_session).get_transactions_page(limit=10, cursor="not-a-cursor")
+
+
+def test_aggregate_transactions_groups_income_and_expenses(db_session):
+
+    service = TransactionService(db_session)
+    service.bulk_add_transactions(models.Transaction, [
+        dict(make_transaction("TXN001", amount=-10.5), mapped_category='Zabka'),
+        dict(make_transaction("TXN002", amount=-4.5), mapped_category='Zabka'),
+        dict(make_transaction("TXN003", amount=2.0), mapped_category='Zabka'),
+        dict(make_transaction("TXN004", amount=5000.0), receiver='PRACODAWCA', mapped_category=None),
+        dict(make_transaction("TXN005", amount=-99.0), exec_month='2024-07', mapped_category=None),
+    ])
+
+    result = service.aggregate_transactions('mapped_category', exec_months=['2024-08'], top_n=1)
+
+    assert [group["key"] for group in result["groups"]] == ['PRACODAWCA', 'Zabka']
+    zabka = result["groups"][1]
+    assert (zabka["income"], zabka["expenses"], zabka["income_count"], zabka["expense_count"]) == (2, Decimal('-15.00'), 1, 2)
+    assert (result["income"], result["expenses"], result["net"]) == (Decimal('5002.00'), Decimal('-15.00'), Decimal('4987.00'))
+    assert [group["key"] for group in result["top_expenses"]] == ['Zabka']
+    assert [group["key"] for group in result["top_income"]] == ['PRACODAWCA']
+
+
+def test_aggregate_transactions_unknown_dimension(db_session):
+
+    with pytest.raises(ValueError):
+        TransactionService(db_session).aggregate_transactions('title')